@@ -0,0 +1,523 @@
+import operator
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from metrics import timed
+from models import User, Review, Spot, Database, RatingStats
+from sessions import SessionLog, epoch_of, hour_of_day, weekday_of
+
+# --- 50 SUCCÈS GAMIFIÉS (LISTE ÉTENDUE) ---
+ACHIEVEMENTS_DEF = [
+    # --- 1. DÉMARRAGE (2) ---
+    {"id": "welcome", "name": "Bienvenue", "desc": "Créer son compte", "points": 10, "icon": "waving_hand"},
+    {"id": "first_step", "name": "Premier Pas", "desc": "Terminer une première session", "points": 20, "icon": "footprint"},
+    
+    # --- 2. ENDURANCE (TEMPS) (5) ---
+    {"id": "time_1h", "name": "Débutant", "desc": "1 heure cumulée", "points": 30, "icon": "hourglass_bottom"},
+    {"id": "time_5h", "name": "Habitué", "desc": "5 heures cumulées", "points": 60, "icon": "hourglass_empty"},
+    {"id": "time_10h", "name": "Pro de la rue", "desc": "10 heures cumulées", "points": 120, "icon": "hourglass_full"},
+    {"id": "time_24h", "name": "Légende", "desc": "24 heures cumulées", "points": 300, "icon": "history"},
+    {"id": "time_100h", "name": "Immortel", "desc": "100 heures cumulées", "points": 1000, "icon": "infinity"},
+    
+    # --- 3. EXPLORATION (QUANTITÉ) (5) ---
+    {"id": "explorer_3", "name": "Curieux", "desc": "3 spots différents visités", "points": 50, "icon": "compass"},
+    {"id": "explorer_10", "name": "Nomade", "desc": "10 spots différents visités", "points": 150, "icon": "map"},
+    {"id": "explorer_15", "name": "Explorateur Ultime", "desc": "15 spots différents visités", "points": 250, "icon": "explore"}, # NEW
+    {"id": "explorer_20", "name": "Vagabond", "desc": "20 spots différents visités", "points": 300, "icon": "public"},
+    {"id": "jack_of_all", "name": "Polyvalent", "desc": "Visiter 1 spot de chaque catégorie", "points": 200, "icon": "category"},
+
+    # --- 4. SPÉCIALISTE (CATÉGORIES) (9) ---
+    {"id": "biz_man", "name": "Business Man", "desc": "3 spots Business visités", "points": 75, "icon": "business_center"},
+    {"id": "tourist", "name": "Touriste", "desc": "3 spots Tourisme visités", "points": 75, "icon": "camera_alt"},
+    {"id": "party_animal", "name": "Fêtard", "desc": "3 spots Nightlife visités", "points": 75, "icon": "celebration"},
+    {"id": "shopper", "name": "Panier Percé", "desc": "3 spots Shopping visités", "points": 75, "icon": "shopping_bag"},
+    {"id": "commuter", "name": "Voyageur", "desc": "3 spots Transport visités", "points": 75, "icon": "train"},
+    {"id": "culture_fan", "name": "Intellectuel", "desc": "3 spots Culture visités", "points": 75, "icon": "school"}, # NEW
+    {"id": "nature_lover", "name": "Écureuil", "desc": "3 spots Nature/Parc visités", "points": 75, "icon": "park"}, # NEW
+    {"id": "market_trader", "name": "Négociant", "desc": "3 spots Marché visités", "points": 75, "icon": "storefront"}, # NEW
+    {"id": "festival_goer", "name": "Festivalier", "desc": "3 spots Event visités", "points": 75, "icon": "local_activity"}, # NEW
+
+    # --- 5. CONTEXTE (HORAIRES) (6) ---
+    {"id": "early_bird", "name": "Lève-tôt", "desc": "Mendier entre 5h et 8h du matin", "points": 50, "icon": "wb_sunny"},
+    {"id": "lunch_time", "name": "Pause Déj", "desc": "Mendier entre 12h et 14h", "points": 50, "icon": "restaurant"},
+    {"id": "afterwork", "name": "Afterwork", "desc": "5 sessions entre 17h et 20h", "points": 60, "icon": "local_bar"}, # NEW
+    {"id": "night_owl", "name": "Oiseau de Nuit", "desc": "Mendier entre 2h et 5h du matin", "points": 100, "icon": "bedtime"},
+    {"id": "insomniac", "name": "Insomniaque", "desc": "5 sessions de nuit (00h-04h)", "points": 150, "icon": "nights_stay"}, # NEW
+    {"id": "weekender", "name": "Du Dimanche", "desc": "Mendier un Samedi ou Dimanche", "points": 40, "icon": "weekend"},
+
+    # --- 6. CONTRIBUTION (CRÉATION/AVIS) (6) ---
+    {"id": "creator_1", "name": "Pionnier", "desc": "Créer 1 nouveau spot", "points": 100, "icon": "add_location"},
+    {"id": "creator_5", "name": "Architecte", "desc": "Créer 5 spots", "points": 400, "icon": "domain"},
+    {"id": "urban_planner", "name": "Urbaniste", "desc": "Créer 10 spots", "points": 800, "icon": "city"}, # NEW
+    {"id": "reviewer_1", "name": "Critique", "desc": "Laisser 1 avis", "points": 30, "icon": "rate_review"},
+    {"id": "reviewer_5", "name": "Influenceur", "desc": "Laisser 5 avis", "points": 150, "icon": "campaign"},
+    {"id": "reviewer_20", "name": "Guide Local", "desc": "Laisser 20 avis", "points": 500, "icon": "map"}, # NEW
+
+    # --- 7. STYLE DE JEU (STATS) (10) ---
+    {"id": "loyal_5", "name": "Squatteur", "desc": "Revenir 5 fois au même spot", "points": 80, "icon": "home"},
+    {"id": "loyal_10", "name": "Fidèle", "desc": "Revenir 10 fois au même spot", "points": 150, "icon": "lock"}, # NEW
+    {"id": "marathon", "name": "Marathon", "desc": "Rester + de 3h d'affilée", "points": 150, "icon": "timer"},
+    {"id": "camping", "name": "Camping", "desc": "Rester + de 5h d'affilée", "points": 300, "icon": "tent"}, # NEW
+    {"id": "sprint", "name": "Sprint", "desc": "Rester moins de 5 min", "points": 10, "icon": "bolt"},
+    {"id": "flash", "name": "Flash", "desc": "10 sessions de moins de 5 min", "points": 100, "icon": "flash_on"}, # NEW
+    {"id": "rich_zone", "name": "Zone Riche", "desc": "Visiter un spot noté 5/5 en revenu", "points": 50, "icon": "attach_money"},
+    {"id": "safe_zone", "name": "Zone Sûre", "desc": "Visiter un spot noté 5/5 en sécurité", "points": 50, "icon": "shield"},
+    {"id": "busy_zone", "name": "Bain de foule", "desc": "Visiter un spot noté 5/5 en passage", "points": 50, "icon": "groups"},
+    {"id": "star", "name": "La Star", "desc": "Visiter un spot noté >4 en Revenu ET Passage", "points": 100, "icon": "star"}, # NEW
+
+    # --- 8. RISQUE & STRATÉGIE (7) ---
+    {"id": "risk_taker", "name": "Téméraire", "desc": "Visiter un spot mal famé (Sécu < 2.5)", "points": 100, "icon": "warning"}, # NEW
+    {"id": "survivor", "name": "Survivant", "desc": "5 sessions dans des spots mal famés", "points": 300, "icon": "skull"}, # NEW
+    {"id": "ghost", "name": "Fantôme", "desc": "Visiter un spot désert (Passage < 1.5)", "points": 60, "icon": "visibility_off"}, # NEW
+    {"id": "hermit", "name": "Ermite", "desc": "5 sessions dans des spots déserts", "points": 150, "icon": "nature_people"}, # NEW
+    {"id": "gourmet", "name": "Gourmet", "desc": "5 sessions dans des spots à haut revenu (>4.5)", "points": 200, "icon": "diamond"}, # NEW
+    {"id": "penny_pincher", "name": "Dèche", "desc": "5 sessions dans des spots à faible revenu (<2.0)", "points": 50, "icon": "money_off"}, # NEW
+    {"id": "kamikaze", "name": "Kamikaze", "desc": "Spot bondé (>4) mais dangereux (<1.5)", "points": 500, "icon": "local_fire_department"}, # NEW
+]
+
+ACHIEVEMENTS_BY_ID: Dict[str, dict] = {d["id"]: d for d in ACHIEVEMENTS_DEF}
+
+# --- RÈGLES DE DÉBLOCAGE (DONNÉES) ---
+# id -> (portée, [(métrique, opérateur, seuil), ...]), toutes les conditions
+# devant être vraies. Portée "lifetime" : agrégats de l'utilisateur ;
+# "session" : dernière session close. Un nouveau badge = sa définition
+# ci-dessus + une ligne ici (métriques disponibles : METRICS plus bas).
+# "cat:A+B" = nombre de spots distincts visités dans les catégories A et B.
+# L'ordre de la table est celui des déblocages renvoyés (et ajoutés au profil).
+MAIN_CATEGORIES = ["Tourisme", "Business", "Nightlife", "Shopping", "Transport"]
+
+RULES = {
+    # 1. Démarrage
+    "welcome": ("lifetime", []),
+    "first_step": ("lifetime", [("sessions", ">=", 1)]),
+
+    # 2. Temps
+    "time_1h": ("lifetime", [("total_seconds", ">=", 3600)]),
+    "time_5h": ("lifetime", [("total_seconds", ">=", 18000)]),
+    "time_10h": ("lifetime", [("total_seconds", ">=", 36000)]),
+    "time_24h": ("lifetime", [("total_seconds", ">=", 86400)]),
+    "time_100h": ("lifetime", [("total_seconds", ">=", 360000)]),
+
+    # 3. Exploration
+    "explorer_3": ("lifetime", [("distinct_spots", ">=", 3)]),
+    "explorer_10": ("lifetime", [("distinct_spots", ">=", 10)]),
+    "explorer_15": ("lifetime", [("distinct_spots", ">=", 15)]),
+    "explorer_20": ("lifetime", [("distinct_spots", ">=", 20)]),
+
+    # 4. Catégories
+    "jack_of_all": ("lifetime", [("main_categories", ">=", 1)]),  # Au moins 1 spot dans chaque MAIN_CATEGORIES
+    "biz_man": ("lifetime", [("cat:Business", ">=", 3)]),
+    "tourist": ("lifetime", [("cat:Tourisme", ">=", 3)]),
+    "party_animal": ("lifetime", [("cat:Nightlife", ">=", 3)]),
+    "shopper": ("lifetime", [("cat:Shopping", ">=", 3)]),
+    "commuter": ("lifetime", [("cat:Transport", ">=", 3)]),
+    "culture_fan": ("lifetime", [("cat:Culture", ">=", 3)]),
+    "market_trader": ("lifetime", [("cat:Market", ">=", 3)]),
+    "festival_goer": ("lifetime", [("cat:Event", ">=", 3)]),
+    "nature_lover": ("lifetime", [("cat:Nature+Parc", ">=", 3)]),
+
+    # 5. Contribution
+    "creator_1": ("lifetime", [("created", ">=", 1)]),
+    "creator_5": ("lifetime", [("created", ">=", 5)]),
+    "urban_planner": ("lifetime", [("created", ">=", 10)]),
+    "reviewer_1": ("lifetime", [("reviewed", ">=", 1)]),
+    "reviewer_5": ("lifetime", [("reviewed", ">=", 5)]),
+    "reviewer_20": ("lifetime", [("reviewed", ">=", 20)]),
+
+    # 6. Fidélité / Style (compteurs globaux)
+    "loyal_5": ("lifetime", [("max_visits", ">=", 5)]),
+    "loyal_10": ("lifetime", [("max_visits", ">=", 10)]),
+    "flash": ("lifetime", [("flash_count", ">=", 10)]),
+    "afterwork": ("lifetime", [("afterwork_count", ">=", 5)]),
+    "insomniac": ("lifetime", [("insomnia_count", ">=", 5)]),
+    "gourmet": ("lifetime", [("high_rev_count", ">=", 5)]),
+    "penny_pincher": ("lifetime", [("low_rev_count", ">=", 5)]),
+    "survivor": ("lifetime", [("low_sec_count", ">=", 5)]),
+    "hermit": ("lifetime", [("low_traf_count", ">=", 5)]),
+
+    # 7. Dernière session
+    "marathon": ("session", [("duration", ">=", 10800)]),
+    "camping": ("session", [("duration", ">=", 18000)]),
+    "sprint": ("session", [("duration", "<", 300)]),
+    "early_bird": ("session", [("hour", ">=", 5), ("hour", "<", 8)]),
+    "lunch_time": ("session", [("hour", ">=", 12), ("hour", "<", 14)]),
+    "night_owl": ("session", [("hour", ">=", 2), ("hour", "<", 5)]),
+    "weekender": ("session", [("weekday", ">=", 5)]),
+    "rich_zone": ("session", [("spot_revenue", ">=", 4.8)]),
+    "safe_zone": ("session", [("spot_security", ">=", 4.8)]),
+    "busy_zone": ("session", [("spot_traffic", ">=", 4.8)]),
+    "risk_taker": ("session", [("spot_security", "<", 2.5)]),
+    "ghost": ("session", [("spot_traffic", "<", 1.5)]),
+    "star": ("session", [("spot_revenue", ">", 4.0), ("spot_traffic", ">", 4.0)]),
+    "kamikaze": ("session", [("spot_security", "<", 1.5), ("spot_traffic", ">", 4.0)]),
+}
+
+# --- MÉTRIQUES ---
+# nom -> (portée, fn(moteur, stats, user)). None = indisponible (pas de session,
+# timestamp illisible, spot sans avis) : la condition est alors fausse.
+def _last_start(fn):
+    return lambda e, st, u: fn(st.last[1]) if st.last and st.last[1] == st.last[1] else None
+
+def _last_spot(attr):
+    def get(e, st, u):
+        ss = e.spots.get(st.last[0]) if st.last else None
+        return getattr(ss.ratings, attr) if ss and ss.ratings.count else None
+    return get
+
+FLAG_COUNTS = ("high_rev_count", "low_rev_count", "low_sec_count", "low_traf_count")  # Ordre de SpotStats.flags()
+
+METRICS = {
+    "sessions": ("lifetime", lambda e, st, u: st.sessions),
+    "total_seconds": ("lifetime", lambda e, st, u: st.total_seconds),
+    "distinct_spots": ("lifetime", lambda e, st, u: len(st.spot_visits)),
+    "main_categories": ("lifetime", lambda e, st, u: min(len(st.cat_visits.get(c, ())) for c in MAIN_CATEGORIES)),
+    "max_visits": ("lifetime", lambda e, st, u: st.max_visits),
+    "flash_count": ("lifetime", lambda e, st, u: st.flash_count),
+    "afterwork_count": ("lifetime", lambda e, st, u: st.afterwork_count),
+    "insomnia_count": ("lifetime", lambda e, st, u: st.insomnia_count),
+    "created": ("lifetime", lambda e, st, u: e.created[u.id]),
+    "reviewed": ("lifetime", lambda e, st, u: e.reviewed[u.name]),
+    "duration": ("session", lambda e, st, u: st.last[2] if st.last else None),
+    "hour": ("session", _last_start(hour_of_day)),
+    "weekday": ("session", _last_start(weekday_of)),
+    "spot_revenue": ("session", _last_spot("avgRevenue")),
+    "spot_security": ("session", _last_spot("avgSecurity")),
+    "spot_traffic": ("session", _last_spot("avgTraffic")),
+}
+METRICS.update({name: ("lifetime", lambda e, st, u, name=name: getattr(st, name)) for name in FLAG_COUNTS})
+
+OPERATORS = {">=": operator.ge, ">": operator.gt, "<": operator.lt, "<=": operator.le}
+MISSING = object()
+
+# --- COMPILATION DES RÈGLES ---
+# Au chargement : règles validées, regroupées par (métrique, opérateur) de leur
+# première condition et triées par seuil. Dans un groupe, dès qu'un seuil
+# n'est pas atteint les suivants non plus : on s'arrête là. Chaque groupe est
+# indexé par les entrées dont il dépend (UserStats.touch) : une session close
+# ne réévalue que les groupes dont une entrée a bougé. Les succès déjà obtenus
+# sont sautés par un test d'appartenance à un set.
+# Entrées : le nom de la métrique, "cat:<catégorie>" pour les catégories,
+# "session" pour toute la portée "session". "reviewed" (compté par pseudo,
+# hors sessions) et les règles sans condition sont toujours évalués.
+class Rule:
+    __slots__ = ("id", "definition", "order", "threshold", "rest")
+
+    def __init__(self, aid, definition, order, threshold, rest):
+        self.id = aid
+        self.definition = definition
+        self.order = order
+        self.threshold = threshold  # Seuil de la première condition (celle du groupe)
+        self.rest = rest            # Autres conditions : [(métrique, fn opérateur, seuil)]
+
+PLAN_CACHE = 4096
+
+class RuleBook:
+    def __init__(self, definitions: List[dict], rules: Dict[str, tuple]):
+        self.by_id = {d["id"]: d for d in definitions}
+        self.metrics: Dict[str, Callable] = {}
+        self.always: List[Rule] = []
+        groups: Dict[Tuple[str, str], List[Rule]] = {}
+        for order, (aid, (scope, conditions)) in enumerate(rules.items()):
+            if aid not in self.by_id: raise ValueError(f"Règle sans définition : {aid}")
+            compiled = []
+            for metric, op, threshold in conditions:
+                if op not in OPERATORS: raise ValueError(f"{aid} : opérateur inconnu {op}")
+                if self._metric(metric) != scope: raise ValueError(f"{aid} : {metric} hors de la portée {scope}")
+                compiled.append((metric, OPERATORS[op], threshold))
+            rule = Rule(aid, self.by_id[aid], order, conditions[0][2] if conditions else None, compiled[1:])
+            if not conditions: self.always.append(rule)
+            else: groups.setdefault((conditions[0][0], conditions[0][1]), []).append(rule)
+        # Groupe : (métrique, fn opérateur, règles triées par seuil)
+        self.groups = []
+        self.triggers: Dict[str, List[int]] = {}  # entrée -> groupes qui en dépendent
+        self.always_groups: List[int] = []
+        for (metric, op), group in groups.items():
+            group.sort(key=lambda r: r.threshold, reverse=op in ("<", "<="))
+            inputs = self._inputs(metric)
+            if inputs is None: self.always_groups.append(len(self.groups))
+            for key in inputs or (): self.triggers.setdefault(key, []).append(len(self.groups))
+            self.groups.append((metric, OPERATORS[op], group))
+        self.plans: Dict[frozenset, list] = {}  # entrées modifiées -> groupes à évaluer
+
+    # Compile la métrique, renvoie sa portée
+    def _metric(self, name) -> str:
+        if name.startswith("cat:"):
+            cats = name[4:].split("+")
+            if len(cats) == 1: self.metrics[name] = lambda e, st, u: len(st.cat_visits.get(cats[0], ()))
+            else: self.metrics[name] = lambda e, st, u: sum(len(st.cat_visits.get(c, ())) for c in cats)
+            return "lifetime"
+        if name not in METRICS: raise ValueError(f"Métrique inconnue : {name}")
+        scope, fn = METRICS[name]
+        self.metrics[name] = fn
+        return scope
+
+    def _inputs(self, metric) -> Optional[List[str]]:
+        if metric == "reviewed": return None
+        if metric.startswith("cat:"): return ["cat:" + c for c in metric[4:].split("+")]
+        if metric == "main_categories": return ["cat:" + c for c in MAIN_CATEGORIES]
+        return ["session"] if METRICS[metric][0] == "session" else [metric]
+
+    # Les combinaisons d'entrées modifiées se répètent (une session close touche
+    # presque toujours les mêmes) : la liste de groupes est calculée une fois
+    def _plan(self, changed) -> list:
+        key = frozenset(changed)
+        plan = self.plans.get(key)
+        if plan is None:
+            ids = set(self.always_groups).union(*(self.triggers.get(k, ()) for k in key))
+            plan = [self.groups[i] for i in sorted(ids)]
+            if len(self.plans) < PLAN_CACHE: self.plans[key] = plan
+        return plan
+
+    # changed : entrées modifiées depuis la dernière évaluation (None : tout évaluer)
+    def evaluate(self, engine, st, user: User, changed: Optional[Set[str]] = None) -> List[dict]:
+        plan = self.groups if changed is None else self._plan(changed)
+        unlocked = set(user.achievements)
+        metrics, values = self.metrics, {}
+        found = [r for r in self.always if r.id not in unlocked]
+        for metric, op, group in plan:
+            v = MISSING
+            for rule in group:
+                if rule.id in unlocked: continue
+                if v is MISSING:
+                    v = values.get(metric, MISSING)
+                    if v is MISSING: v = values[metric] = metrics[metric](engine, st, user)
+                if v is None or not op(v, rule.threshold): break
+                if rule.rest and not all(self._holds(m, o, t, values, engine, st, user) for m, o, t in rule.rest): continue
+                found.append(rule)
+        if len(found) > 1: found.sort(key=lambda r: r.order)
+        return [r.definition for r in found]
+
+    def _holds(self, metric, op, threshold, values, engine, st, user) -> bool:
+        v = values.get(metric, MISSING)
+        if v is MISSING: v = values[metric] = self.metrics[metric](engine, st, user)
+        return v is not None and op(v, threshold)
+
+RULEBOOK = RuleBook(ACHIEVEMENTS_DEF, RULES)
+
+# --- AGRÉGATS INCRÉMENTAUX ---
+# Au lieu de reparcourir tout l'historique à chaque release, on tient à jour
+# des compteurs par utilisateur : une session fermée coûte O(1).
+# Les notes des spots viennent de Spot.ratings (copie tenue à jour ici via
+# RatingStats.add), jamais d'une nouvelle moyenne sur la liste des avis.
+# Les compteurs "qualité de spot" (gourmet, survivor...) dépendent des notes
+# ACTUELLES du spot : quand un avis fait basculer un seuil, on corrige les
+# visiteurs de ce spot (rare) plutôt que de tout recalculer à chaque release.
+
+class SpotStats:
+    def __init__(self, category: str, ratings: RatingStats):
+        self.category = category
+        self.ratings = ratings
+
+    # (high_rev, low_rev, low_sec, low_traf) pour une visite de ce spot
+    def flags(self):
+        r = self.ratings
+        if not r.count: return (0, 0, 0, 0)
+        return (int(r.avgRevenue > 4.5), int(r.avgRevenue < 2.0), int(r.avgSecurity < 2.0), int(r.avgTraffic < 2.0))
+
+class UserStats:
+    def __init__(self):
+        self.sessions = 0
+        self.total_seconds = 0
+        self.spot_visits: Counter = Counter()
+        self.cat_visits: Dict[str, Set[str]] = {}
+        self.max_visits = 0
+        self.flash_count = 0
+        self.afterwork_count = 0
+        self.insomnia_count = 0
+        self.high_rev_count = 0
+        self.low_rev_count = 0
+        self.low_sec_count = 0
+        self.low_traf_count = 0
+        self.last: Optional[Tuple[str, float, int]] = None  # (spot, début, durée) de la dernière session
+        self.changed: Optional[Set[str]] = None  # Entrées des règles modifiées depuis la dernière évaluation (None : toutes)
+
+    def touch(self, *keys):
+        if self.changed is not None: self.changed.update(keys)
+
+    def add_flags(self, flags, n=1):
+        for name, flag in zip(FLAG_COUNTS, flags):
+            if flag:
+                setattr(self, name, getattr(self, name) + flag * n)
+                self.touch(name)
+
+class AchievementEngine:
+    def __init__(self):
+        self.users: Dict[str, UserStats] = {}
+        self.spots: Dict[str, SpotStats] = {}
+        self.visitors: Dict[str, Counter] = {}   # spot -> {user_id: nb visites}
+        self.last_on: Dict[str, Set[str]] = {}   # spot -> utilisateurs dont c'est le spot de la dernière session
+        self.created: Counter = Counter()         # createdBy -> nb spots
+        self.reviewed: Counter = Counter()        # authorName -> nb avis
+
+    # --- CONSTRUCTION ---
+    def build(self, db, sessions: Optional[SessionLog] = None):
+        self.__init__()
+        for s in db.spots: self.add_spot(s)
+        # Journal en colonnes : chronologique par utilisateur, timestamps déjà convertis
+        for uid, spot_id, start, secs in (sessions or SessionLog().build(db)).rows(): self.close_session(uid, spot_id, start, secs)
+        return self
+
+    def add_history(self, user: User):
+        # Historique chronologique : rejoué dans l'ordre
+        for log in user.history: self.close_session(user.id, log.spotId, epoch_of(log.timestamp), log.durationSeconds)
+
+    def stats(self, user_id) -> UserStats:
+        st = self.users.get(user_id)
+        if st is None: st = self.users[user_id] = UserStats()
+        return st
+
+    # --- ÉVÉNEMENTS ---
+    def on_event(self, op, d):
+        if op == "close_log": self.close_session(d["userId"], d["spotId"], epoch_of(d["timestamp"]), d["durationSeconds"])
+        elif op == "add_spot": self.add_spot(Spot(**d))
+        elif op == "add_review": self.add_review(d["spotId"], Review(**d["review"]))
+
+    def add_spot(self, spot: Spot):
+        ss = self.spots[spot.id] = SpotStats(spot.category, spot.ratings.model_copy(deep=True))
+        self.created[spot.createdBy] += 1
+        if spot.createdBy in self.users: self.users[spot.createdBy].touch("created")
+        for r in spot.reviews: self.reviewed[r.authorName] += 1
+        # Spot déjà visité avant d'être connu (historique orphelin)
+        for user_id, n in self.visitors.get(spot.id, {}).items():
+            st = self.users[user_id]
+            st.cat_visits.setdefault(spot.category, set()).add(spot.id)
+            st.touch("cat:" + spot.category)
+            st.add_flags(ss.flags(), n)
+        self._touch_last(spot.id)
+
+    def add_review(self, spot_id, review: Review):
+        self.reviewed[review.authorName] += 1
+        ss = self.spots.get(spot_id)
+        if ss is None: return
+        before = ss.flags()
+        ss.ratings.add(review)
+        self._touch_last(spot_id)
+        after = ss.flags()
+        if before == after: return
+        delta = tuple(a - b for a, b in zip(after, before))
+        for user_id, n in self.visitors.get(spot_id, {}).items(): self.users[user_id].add_flags(delta, n)
+
+    # start : secondes depuis 1970 (sessions.epoch_of), NaN si timestamp illisible
+    def close_session(self, user_id, spot_id, start: float, duration):
+        if not duration or duration <= 0: return
+        st = self.stats(user_id)
+        st.sessions += 1
+        st.total_seconds += duration
+        st.touch("sessions", "total_seconds", "session")
+        visits = st.spot_visits[spot_id] = st.spot_visits[spot_id] + 1
+        if visits == 1: st.touch("distinct_spots")
+        if visits > st.max_visits:
+            st.max_visits = visits
+            st.touch("max_visits")
+        self.visitors.setdefault(spot_id, Counter())[user_id] += 1
+
+        # Check durée courte
+        if duration < 300:
+            st.flash_count += 1
+            st.touch("flash_count")
+
+        # Check horaire
+        if start == start:
+            hour = hour_of_day(start)
+            if 17 <= hour < 20:
+                st.afterwork_count += 1
+                st.touch("afterwork_count")
+            if 0 <= hour < 4:
+                st.insomnia_count += 1
+                st.touch("insomnia_count")
+
+        ss = self.spots.get(spot_id)
+        if ss:
+            if visits == 1:
+                st.cat_visits.setdefault(ss.category, set()).add(spot_id)
+                st.touch("cat:" + ss.category)
+            st.add_flags(ss.flags())
+
+        # Les sessions arrivent dans l'ordre chronologique : "last" est la plus récente
+        if st.last and st.last[0] != spot_id: self.last_on[st.last[0]].discard(user_id)
+        self.last_on.setdefault(spot_id, set()).add(user_id)
+        st.last = (spot_id, start, duration)
+
+    # Notes (ou spot) de la dernière session changées : ses règles sont à revoir
+    def _touch_last(self, spot_id):
+        for user_id in self.last_on.get(spot_id, ()): self.users[user_id].touch("session")
+
+    # --- LOGIQUE DE DÉBLOCAGE ---
+    # Règles compilées (RULEBOOK) ; après une première évaluation complète, seuls
+    # les groupes dont une entrée a bougé depuis la précédente sont réévalués.
+    # Les règles "session" portent sur la dernière session close : un avis (ou
+    # l'arrivée) de son spot les remet en jeu, comme un release sans durée les revoyait.
+    @timed("achievements.evaluate")
+    def evaluate(self, user: User) -> List[dict]:
+        st = self.users.get(user.id)
+        if st is None: return RULEBOOK.evaluate(self, UserStats(), user)
+        changed, st.changed = st.changed, set()
+        return RULEBOOK.evaluate(self, st, user, changed)
+
+# Version autonome (scripts hors-ligne) : agrégats construits pour ce seul
+# utilisateur, ou moteur déjà construit pour toute la base (engine)
+def find_new_achievements(user: User, db: Database, engine: Optional[AchievementEngine] = None):
+    if engine is None:
+        engine = AchievementEngine()
+        for s in db.spots: engine.add_spot(s)
+        engine.add_history(user)
+    return engine.evaluate(user)
+
+@timed("achievements.check")
+def check_new_achievements(user: User, db: Database, engine: Optional[AchievementEngine] = None):
+    # Appliquer changements
+    result = find_new_achievements(user, db, engine)
+    for defi in result:
+        user.achievements.append(defi["id"])
+        user.points += defi["points"]
+    return result
+
+# --- RECALCUL EN LOT (scripts hors-ligne) ---
+# Les agrégats partagés (notes des spots, créateurs, auteurs d'avis) sont
+# construits une fois et envoyés une fois à chaque processus. Les utilisateurs
+# partent ensuite par paquets, chacun avec ses seules sessions.
+BATCH_CHUNK = 500
+
+_batch_engine: Optional[AchievementEngine] = None
+
+def _init_batch(engine: AchievementEngine):
+    global _batch_engine
+    _batch_engine = engine
+
+def _evaluate_chunk(chunk):
+    engine, results = _batch_engine, []
+    for user, rows in chunk:
+        engine.users.clear()
+        engine.visitors.clear()
+        for spot_id, start, secs in rows: engine.close_session(user.id, spot_id, start, secs)
+        results.append((user.id, [d["id"] for d in engine.evaluate(user)]))
+    return results
+
+# user_id -> ids des succès à débloquer ; progress(faits, total) après chaque paquet
+def batch_new_achievements(db: Database, sessions: SessionLog, workers: Optional[int] = None,
+                           chunk_size: int = BATCH_CHUNK, progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, List[str]]:
+    shared = AchievementEngine()
+    for s in db.spots: shared.add_spot(s)
+    rows_by_user: Dict[str, list] = {}
+    for uid, spot_id, start, secs in sessions.rows():
+        if secs and secs > 0: rows_by_user.setdefault(uid, []).append((spot_id, start, secs))
+    # Utilisateurs allégés : evaluate n'a besoin que de l'id, du nom et des succès
+    items = [(User.model_construct(id=u.id, name=u.name, achievements=list(u.achievements)), rows_by_user.get(u.id, [])) for u in db.users]
+    chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+
+    found, done = {}, 0
+    def collect(results):
+        nonlocal done
+        for uid, ids in results:
+            if ids: found[uid] = ids
+        done += len(results)
+        if progress: progress(done, len(items))
+
+    if workers == 1 or len(chunks) <= 1:
+        _init_batch(shared)
+        for chunk in chunks: collect(_evaluate_chunk(chunk))
+        return found
+    with ProcessPoolExecutor(workers, initializer=_init_batch, initargs=(shared,)) as pool:
+        for fut in as_completed([pool.submit(_evaluate_chunk, c) for c in chunks]): collect(fut.result())
+    return found
@@ -0,0 +1,83 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Optional
+
+# --- MOTS DE PASSE ---
+# Nouveaux comptes : PBKDF2-SHA256 salé ("pbkdf2_sha256$itérations$sel$hash").
+# Les comptes existants (sha256 nu en hexadécimal) restent vérifiables.
+# Le calcul part dans un pool de threads (hashlib relâche le GIL) : une rafale
+# de connexions ne bloque pas la boucle.
+PBKDF2_ITERATIONS = 100_000
+PBKDF2_PREFIX = "pbkdf2_sha256"
+
+def hash_password(p: str) -> str:
+    salt = secrets.token_bytes(16)
+    digest = hashlib.pbkdf2_hmac("sha256", p.encode(), salt, PBKDF2_ITERATIONS)
+    return f"{PBKDF2_PREFIX}${PBKDF2_ITERATIONS}${salt.hex()}${digest.hex()}"
+
+def verify_password(p: str, stored: str) -> bool:
+    if stored.startswith(PBKDF2_PREFIX + "$"):
+        try:
+            _, iterations, salt, digest = stored.split("$")
+            computed = hashlib.pbkdf2_hmac("sha256", p.encode(), bytes.fromhex(salt), int(iterations)).hex()
+        except ValueError: return False
+        return hmac.compare_digest(computed, digest)
+    return hmac.compare_digest(hashlib.sha256(p.encode()).hexdigest(), stored)  # Ancien format
+
+class PasswordPool:
+    def __init__(self, workers: Optional[int] = None):
+        self.executor = ThreadPoolExecutor(max_workers=workers or min(8, os.cpu_count() or 1), thread_name_prefix="pbkdf2")
+
+    async def hash(self, p: str) -> str:
+        return await asyncio.get_running_loop().run_in_executor(self.executor, hash_password, p)
+
+    async def verify(self, p: str, stored: str) -> bool:
+        return await asyncio.get_running_loop().run_in_executor(self.executor, verify_password, p, stored)
+
+    def close(self): self.executor.shutdown(wait=False, cancel_futures=True)
+
+# --- JETONS DE SESSION ---
+# Jeton signé (HMAC) "user_id.expiration.signature", sans état côté serveur :
+# rien à stocker ni à relire en base. La vérification (décodage + HMAC) est
+# mise en cache LRU par jeton ; seule l'expiration est revérifiée à chaque appel.
+# POORSPOT_SECRET partagé entre workers/redémarrages, sinon secret aléatoire
+# (les jetons ne survivent alors pas au redémarrage).
+TOKEN_TTL = 7 * 86400
+TOKEN_CACHE = 65536
+
+def _b64(raw: bytes) -> str: return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+class Tokens:
+    def __init__(self, secret: Optional[bytes] = None, ttl: int = TOKEN_TTL, cache_size: int = TOKEN_CACHE):
+        env = os.environ.get("POORSPOT_SECRET")
+        self.secret = secret or (env.encode() if env else secrets.token_bytes(32))
+        self.ttl = ttl
+        self._check = lru_cache(maxsize=cache_size)(self._decode)
+
+    def _sign(self, payload: str) -> str: return _b64(hmac.new(self.secret, payload.encode(), hashlib.sha256).digest())
+
+    def issue(self, user_id: str, now: Optional[float] = None) -> dict:
+        expires = int((now or time.time()) + self.ttl)
+        payload = f"{_b64(user_id.encode())}.{expires}"
+        return {"token": f"{payload}.{self._sign(payload)}", "expires": expires, "userId": user_id}
+
+    def _decode(self, token: str):
+        try:
+            uid, expires, sig = token.split(".")
+            # En octets : compare_digest refuse (TypeError) les str non ASCII d'un en-tête forgé
+            if not hmac.compare_digest(sig.encode(), self._sign(f"{uid}.{expires}").encode()): return None
+            return base64.urlsafe_b64decode(uid + "=" * (-len(uid) % 4)).decode(), int(expires)
+        except (ValueError, UnicodeDecodeError): return None
+
+    # user_id si le jeton est valide et non expiré
+    def verify(self, token: str, now: Optional[float] = None) -> Optional[str]:
+        checked = self._check(token)
+        if not checked or checked[1] < (now or time.time()): return None
+        return checked[0]
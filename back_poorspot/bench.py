@@ -0,0 +1,187 @@
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from uuid import uuid4
+
+import httpx
+
+from gen_data import PASSWORD, user_name
+
+# --- BANC DE CHARGE HTTP ---
+# Envoie un mélange pondéré de requêtes sur toutes les routes de main.py (hors
+# flux live : voir live_load.py) avec N clients concurrents, puis affiche par
+# route : nombre, erreurs, req/s, p50/p95/p99.
+# En process (ASGI, sur une copie de --db dans un dossier temporaire) :
+#   python gen_data.py --out /tmp/big.json ...
+#   python bench.py --db /tmp/big.json --concurrency 64 --requests 20000
+# Ou contre un serveur lancé à part, sans limiteur de débit (un seul client
+# simule tous les utilisateurs) :
+#   POORSPOT_RATE=0 python main.py &
+#   python bench.py --url http://127.0.0.1:8000
+
+def pct(values, p): return values[min(len(values) - 1, int(len(values) * p))] * 1000 if values else 0
+
+class State:
+    def __init__(self, rng):
+        self.rng = rng
+        self.users = []     # id des comptes utilisables
+        self.names = []     # (nom, mot de passe) pour /users/login
+        self.spots = []     # résumés (id, latitude, longitude)
+        self.occupied = {}  # utilisateur -> spot occupé par le banc
+        self.version = "0"
+
+    def user(self): return self.rng.choice(self.users)
+    def spot(self): return self.rng.choice(self.spots)
+
+# Chaque scénario : (nom, poids, statuts attendus, fabrique de requête)
+def occupy(st):
+    u, s = st.user(), st.spot()["id"]
+    st.occupied[u] = s
+    return "POST", f"/spots/{s}/occupy", {"user_id": u}, None
+
+def release(st):
+    if not st.occupied: return occupy(st)
+    u = st.rng.choice(list(st.occupied))
+    return "POST", f"/spots/{st.occupied.pop(u)}/release", {"user_id": u}, None
+
+def around(st, d=0.01):
+    s = st.spot()
+    return s["latitude"], s["longitude"], d
+
+def review(st):
+    return {"id": str(uuid4()), "authorName": st.rng.choice(st.names)[0], "ratingRevenue": st.rng.randint(1, 5),
+            "ratingSecurity": st.rng.randint(1, 5), "ratingTraffic": st.rng.randint(1, 5),
+            "attribute": "music", "comment": "bench", "createdAt": "2024-01-01T12:00:00"}
+
+def new_spot(st):
+    lat, lon, _ = around(st)
+    return {"id": str(uuid4()), "name": "Bench", "description": "bench", "latitude": lat + 0.001, "longitude": lon + 0.001,
+            "category": "Autre", "createdAt": "2024-01-01T12:00:00", "createdBy": "bench", "currentActiveUsers": 0}
+
+SCENARIOS = [
+    ("POST /users/register", 2, {200}, lambda st: ("POST", "/users/register", None, {"username": f"bench-{uuid4().hex[:12]}", "password": PASSWORD})),
+    ("POST /users/login", 4, {200}, lambda st: ("POST", "/users/login", None, dict(zip(("username", "password"), st.rng.choice(st.names))))),
+    ("PUT /users/{id}/attributes", 2, {200}, lambda st: ("PUT", f"/users/{st.user()}/attributes", None, st.rng.sample(["music", "dog", "family"], 2))),
+    ("GET /achievements/list", 3, {200}, lambda st: ("GET", "/achievements/list", None, None)),
+    ("GET /occupations", 10, {200}, lambda st: ("GET", "/occupations", None, None)),
+    ("GET /occupations?since", 10, {200}, lambda st: ("GET", "/occupations", {"since": st.version}, None)),
+    ("POST /spots/{id}/occupy", 8, {200, 409}, occupy),
+    ("POST /spots/{id}/release", 8, {200, 403}, release),
+    ("GET /users/top", 6, {200}, lambda st: ("GET", "/users/top", {"period": st.rng.choice(["day", "week", "month", "forever"]),
+                                                                  "sort_by": st.rng.choice(["time", "points"])}, None)),
+    ("POST /users/{id}/favorites", 2, {200}, lambda st: ("POST", f"/users/{st.user()}/favorites/{st.spot()['id']}", None, None)),
+    ("DELETE /users/{id}/favorites", 1, {200}, lambda st: ("DELETE", f"/users/{st.user()}/favorites/{st.spot()['id']}", None, None)),
+    ("GET /users/{id}/favorites", 4, {200}, lambda st: ("GET", f"/users/{st.user()}/favorites", None, None)),
+    ("GET /spots", 1, {200}, lambda st: ("GET", "/spots", None, None)),
+    ("GET /spots?since", 4, {200}, lambda st: ("GET", "/spots", {"since": st.version}, None)),
+    ("GET /spots/summary", 6, {200}, lambda st: ("GET", "/spots/summary", None, None)),
+    ("GET /spots/{id}/reviews", 8, {200}, lambda st: ("GET", f"/spots/{st.spot()['id']}/reviews", {"limit": 20}, None)),
+    ("GET /spots/bbox", 6, {200}, lambda st: (lambda lat, lon, d: ("GET", "/spots/bbox", {"min_lat": lat - d, "min_lon": lon - d, "max_lat": lat + d, "max_lon": lon + d}, None))(*around(st))),
+    ("GET /spots/near", 6, {200}, lambda st: (lambda lat, lon, _: ("GET", "/spots/near", {"lat": lat, "lon": lon, "radius": 500}, None))(*around(st))),
+    ("GET /spots/nearest", 6, {200}, lambda st: (lambda lat, lon, _: ("GET", "/spots/nearest", {"lat": lat, "lon": lon, "k": 10}, None))(*around(st))),
+    ("POST /spots", 1, {200}, lambda st: ("POST", "/spots", None, new_spot(st))),
+    ("POST /spots/{id}/reviews", 2, {200}, lambda st: ("POST", f"/spots/{st.spot()['id']}/reviews", None, review(st))),
+]
+
+async def prepare(client, st: State, nb_users):
+    r = await client.get("/spots/summary")
+    st.spots = [{"id": s["id"], "latitude": s["latitude"], "longitude": s["longitude"]} for s in r.json()]
+    if not st.spots: raise SystemExit("Aucun spot en base (python gen_data.py)")
+    # Comptes générés par gen_data.py (user0, user1...) sinon comptes créés pour l'occasion
+    for i in range(nb_users):
+        r = await client.post("/users/login", json={"username": user_name(i), "password": PASSWORD})
+        if r.status_code != 200: break
+        st.users.append(r.json()["id"])
+        st.names.append((user_name(i), PASSWORD))
+    while len(st.users) < nb_users:
+        name = f"bench-{uuid4().hex[:12]}"
+        r = await client.post("/users/register", json={"username": name, "password": PASSWORD})
+        r.raise_for_status()
+        st.users.append(r.json()["id"])
+        st.names.append((name, PASSWORD))
+    r = await client.get("/occupations", params={"since": "0"})
+    st.version = r.json().get("version", "0")
+
+async def run(client, st: State, args):
+    names = [s[0] for s in SCENARIOS if not args.only or any(o in s[0] for o in args.only)]
+    if not names: raise SystemExit("Aucune route ne correspond à --only")
+    chosen = [s for s in SCENARIOS if s[0] in names]
+    weights = [s[1] for s in chosen]
+    samples = {s[0]: [] for s in chosen}
+    errors = {s[0]: 0 for s in chosen}
+    remaining = args.requests
+    limited = 0
+
+    async def worker():
+        nonlocal remaining, limited
+        while remaining > 0:
+            remaining -= 1
+            name, _, ok, make = st.rng.choices(chosen, weights=weights)[0]
+            method, path, params, body = make(st)
+            t0 = time.perf_counter()
+            try:
+                r = await client.request(method, path, params=params, json=body)
+                status = r.status_code
+            except httpx.HTTPError: status = None
+            samples[name].append(time.perf_counter() - t0)
+            if status not in ok: errors[name] += 1
+            limited += status == 429
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - t0
+
+    print(f"\n{args.requests} requêtes, {args.concurrency} clients, {elapsed:.1f}s : {args.requests / elapsed:.0f} req/s\n")
+    print(f"{'route':<32}{'n':>7}{'err':>6}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    every = []
+    for name in names:
+        lat = sorted(samples[name])
+        every += lat
+        if lat: print(f"{name:<32}{len(lat):>7}{errors[name]:>6}{len(lat) / elapsed:>9.0f}{pct(lat, .5):>9.1f}{pct(lat, .95):>9.1f}{pct(lat, .99):>9.1f}")
+    every.sort()
+    print(f"{'total':<32}{len(every):>7}{sum(errors.values()):>6}{len(every) / elapsed:>9.0f}{pct(every, .5):>9.1f}{pct(every, .95):>9.1f}{pct(every, .99):>9.1f}")
+    if limited: print(f"\n{limited} réponses 429 : relancer le serveur avec POORSPOT_RATE=0")
+
+async def main(args):
+    st = State(random.Random(args.seed))
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=60) as client:
+            await prepare(client, st, args.users)
+            await run(client, st, args)
+        return
+
+    # En process : le serveur travaille sur une copie (le banc écrit dans la base)
+    sqlite = args.db.endswith((".sqlite3", ".sqlite", ".db"))
+    work = tempfile.mkdtemp(prefix="poorspot-bench-")
+    shutil.copy(args.db, os.path.join(work, "db.sqlite3" if sqlite else "db.json"))
+    os.environ["POORSPOT_STORAGE"] = "sqlite" if sqlite else "json"
+    os.environ.setdefault("POORSPOT_RATE", "0")  # Un seul client simule tous les utilisateurs
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    os.chdir(work)
+    try:
+        import main as server
+        t0 = time.perf_counter()
+        async with server.lifespan(server.app):
+            print(f"Démarrage en process ({args.db}) : {time.perf_counter() - t0:.1f}s")
+            transport = httpx.ASGITransport(app=server.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", limits=limits, timeout=60) as client:
+                await prepare(client, st, args.users)
+                await run(client, st, args)
+    finally: shutil.rmtree(work, ignore_errors=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Banc de charge des routes PoorSpot")
+    parser.add_argument("--db", default="db.json", help="base copiée pour le mode en process (*.json ou *.sqlite3)")
+    parser.add_argument("--url", help="serveur à viser au lieu du mode en process (lancé avec POORSPOT_RATE=0)")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=200, help="comptes utilisés par le banc")
+    parser.add_argument("--only", nargs="*", help="ne viser que les routes contenant ces motifs")
+    parser.add_argument("--seed", type=int, default=0)
+    asyncio.run(main(parser.parse_args()))
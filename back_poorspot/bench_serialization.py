@@ -0,0 +1,91 @@
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import httpx
+
+import fastjson
+from storage import GZIP_LEVEL, JsonStore, encode_snapshot
+
+# --- BANC DE SÉRIALISATION ---
+# Compare l'ancien chemin (model_dump + json indent=4 ; réponses revalidées par
+# response_model) au nouveau (pydantic-core / orjson, snapshot compact ou gzip,
+# réponses de confiance) sur une base donnée.
+#   python gen_data.py --out /tmp/big.json --users 20000 --sessions 2000000
+#   python bench_serialization.py --db /tmp/big.json
+
+def best(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        times.append(time.perf_counter() - t0)
+    return min(times), out
+
+def snapshots(path, repeat):
+    store = JsonStore(path).load()
+    data = store._snapshot_data()
+    print(f"Snapshot ({len(data['users'])} utilisateurs, {len(data['spots'])} spots), encodeur : {'orjson' if fastjson.orjson else 'json'}")
+    print(f"{'format':<24}{'écriture ms':>12}{'lecture ms':>12}{'taille Mo':>12}")
+
+    def old():
+        d = store.database().model_dump()
+        d["walSeq"] = store.seq
+        return json.dumps(d, ensure_ascii=False, indent=4).encode("utf-8")
+    rows = [
+        ("json indent=4 (avant)", old, json.loads),
+        ("pretty", lambda: encode_snapshot(data, "pretty"), fastjson.loads),
+        ("compact", lambda: encode_snapshot(data, "compact"), fastjson.loads),
+        ("gzip", lambda: gzip.compress(encode_snapshot(data, "compact"), compresslevel=GZIP_LEVEL, mtime=0),
+         lambda raw: fastjson.loads(gzip.decompress(raw))),
+    ]
+    for name, write, read in rows:
+        w, raw = best(write, repeat)
+        r, _ = best(lambda: read(raw), repeat)
+        print(f"{name:<24}{w * 1000:>12.0f}{r * 1000:>12.0f}{len(raw) / 1e6:>12.1f}")
+
+async def responses(path, requests):
+    work = tempfile.mkdtemp(prefix="poorspot-serial-")
+    shutil.copy(path, os.path.join(work, "db.json"))
+    os.environ["POORSPOT_STORAGE"] = "json"
+    os.environ.setdefault("POORSPOT_RATE", "0")
+    os.environ.setdefault("POORSPOT_CACHE_TTL", "0")  # Mesure la sérialisation, pas le cache des réponses
+    os.chdir(work)
+    try:
+        import main as server
+        async with server.lifespan(server.app):
+            heaviest = max(server.store.users, key=lambda u: len(u.history))
+            # Le compte le plus chargé (gen_data.py : mot de passe "password"), lu via le jeton
+            token = server.tokens.issue(heaviest.id)["token"]
+            cases = [(f"GET /users/me ({len(heaviest.history)} sessions)", "/users/me"), ("GET /spots", "/spots"),
+                     ("GET /spots/summary", "/spots/summary"), ("GET /users/top", "/users/top")]
+            transport = httpx.ASGITransport(app=server.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers={"Authorization": f"Bearer {token}"}) as client:
+                print(f"\nRéponses ({requests} requêtes chacune)")
+                print(f"{'route':<40}{'validé ms':>11}{'direct ms':>11}{'gain':>7}")
+                for name, url in cases:
+                    timings = []
+                    for validate in (True, False):
+                        server.VALIDATE_RESPONSES = validate
+                        await client.get(url)  # Préchauffage
+                        t0 = time.perf_counter()
+                        for _ in range(requests): (await client.get(url)).raise_for_status()
+                        timings.append((time.perf_counter() - t0) / requests)
+                    print(f"{name:<40}{timings[0] * 1000:>11.2f}{timings[1] * 1000:>11.2f}{timings[0] / timings[1]:>6.1f}x")
+    finally: shutil.rmtree(work, ignore_errors=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Banc de sérialisation (snapshot et réponses)")
+    parser.add_argument("--db", default="db.json")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--requests", type=int, default=50)
+    args = parser.parse_args()
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    snapshots(args.db, args.repeat)
+    asyncio.run(responses(os.path.abspath(args.db), args.requests))
@@ -0,0 +1,79 @@
+import asyncio
+import logging
+import os
+import time
+from contextlib import suppress
+from typing import Callable, Dict
+
+from storage import FileLock
+
+WORKERS = int(os.environ.get("POORSPOT_WORKERS", 1))  # > 1 : mode multi-workers (base SQLite partagée)
+POLL_INTERVAL = 0.05       # Secondes entre deux relevés du journal partagé
+CHANGES_TTL = 3600         # Secondes de rétention de la table changes
+PRUNE_INTERVAL = 60
+
+log = logging.getLogger("poorspot.cluster")
+
+# --- PLUSIEURS WORKERS SUR UNE MACHINE ---
+# Chaque worker uvicorn garde ses index en mémoire (sessions, succès,
+# classements, grille, occupations...). La base SQLite partagée fait foi :
+# - écritures : un lot de l'écrivain à la fois, tous processus confondus
+#   (flock + BEGIN IMMEDIATE, voir sqlite_storage.py) ;
+# - invalidation : chaque mutation est notée dans la table changes, dans sa
+#   transaction. Chaque worker relève PRAGMA data_version toutes les 50 ms et
+#   rejoue les entrées des autres (dans l'ordre seq) sur ses index, et avant
+#   chaque lot pour écrire sur un état à jour ;
+# - leader : un seul worker (flock non bloquant sur db.sqlite3.leader) fait
+#   la réconciliation au démarrage, l'expiration des occupations et la purge
+#   du journal. S'il meurt, le noyau libère le verrou et un autre prend la main.
+
+class Cluster:
+    def __init__(self, store, leader_path: str):
+        self.store = store
+        self.leader = FileLock(leader_path)
+        self.seq = 0
+        self.replayed = 0
+        self.handlers: Dict[str, Callable] = {}  # op hors données (occupations) -> fn(data)
+
+    def on(self, op, fn): self.handlers[op] = fn
+
+    @property
+    def leading(self) -> bool: return self.leader.held
+
+    # Au démarrage, sous le verrou d'écriture : les index construits et ce curseur
+    # décrivent le même état, le rattrapage repart de là
+    def start(self) -> bool:
+        self.seq = self.store.last_seq = self.store.change_head()
+        return self.leader.acquire(blocking=False)
+
+    def catch_up(self):
+        self.seq, changes = self.store.changes_since(self.seq)
+        for seq, op, data in changes:
+            self.store.last_seq = seq  # Version du changement pour le fil (sync.py)
+            handler = self.handlers.get(op)
+            if handler: handler(data)
+            else: self.store.replay(op, data)
+        self.replayed += len(changes)
+
+    # lead() : tâches du leader, lancées quand ce worker le devient
+    async def run(self, lead):
+        task = asyncio.create_task(lead()) if self.leading else None
+        try:
+            while True:
+                try: self.catch_up()
+                except Exception as e: log.warning("Rattrapage impossible : %r", e)
+                if task is None and self.leader.acquire(blocking=False):
+                    log.info("Ce worker devient leader (pid %d)", os.getpid())
+                    task = asyncio.create_task(lead())
+                await asyncio.sleep(POLL_INTERVAL)
+        finally:
+            if task:
+                task.cancel()
+                with suppress(asyncio.CancelledError): await task
+            self.leader.release()
+
+    # Purge du journal partagé (leader), via l'écrivain pour tenir le verrou d'écriture
+    async def prune(self, writer):
+        while True:
+            await asyncio.sleep(PRUNE_INTERVAL)
+            await writer.submit(lambda: self.store.prune_changes(time.time() - CHANGES_TTL))
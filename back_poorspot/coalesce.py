@@ -0,0 +1,60 @@
+import asyncio
+import inspect
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Tuple
+
+CACHE_TTL = float(os.environ.get("POORSPOT_CACHE_TTL", 1.0))  # Secondes (0 : pas de cache, coalescence seule)
+CACHE_SIZE = 256           # Corps gardés (clé = route + paramètres)
+
+# --- LECTURES CHAUDES : UN CALCUL, UN CORPS SÉRIALISÉ ---
+# Les routes lues par tous les clients à la fois (/spots, /occupations,
+# /users/top...) passent par get(clé, version, build) :
+# - le corps JSON déjà sérialisé est resservi tant que la version de ce qu'il
+#   décrit n'a pas bougé (feed.spots_version, occupations_version... : toute
+#   écriture l'invalide, rejeux d'autres workers compris) et au plus CACHE_TTL s ;
+# - une requête identique arrivée pendant un build asynchrone attend le même
+#   résultat au lieu d'en lancer un second (single-flight). Un build synchrone
+#   tourne d'une traite sur la boucle : les requêtes suivantes trouvent le cache.
+
+class ResponseCache:
+    def __init__(self, ttl: float = CACHE_TTL, size: int = CACHE_SIZE):
+        self.ttl = ttl
+        self.size = size
+        self.entries: "OrderedDict[tuple, Tuple[object, float, bytes]]" = OrderedDict()  # clé -> (version, expiration, corps)
+        self.inflight: Dict[tuple, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def get(self, key, version, build) -> bytes:
+        entry = self.entries.get(key)
+        if entry and entry[0] == version and entry[1] > time.monotonic():
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry[2]
+        flight = self.inflight.get((key, version))
+        if flight:
+            self.coalesced += 1
+            return await asyncio.shield(flight)
+
+        self.misses += 1
+        fut = self.inflight[(key, version)] = asyncio.get_running_loop().create_future()
+        try:
+            body = build()
+            if inspect.isawaitable(body): body = await body
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except BaseException as e:
+            fut.set_exception(e)
+            fut.exception()  # Personne n'attendait : pas d'avertissement "never retrieved"
+            raise
+        finally: del self.inflight[(key, version)]
+        fut.set_result(body)
+        if self.ttl > 0:
+            self.entries[key] = (version, time.monotonic() + self.ttl, body)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size: self.entries.popitem(last=False)
+        return body
@@ -0,0 +1,34 @@
+import json
+from typing import Any
+
+from pydantic import TypeAdapter
+from starlette.responses import JSONResponse, Response
+
+try: import orjson
+except ImportError: orjson = None  # json standard (plus lent, même résultat)
+
+# --- SÉRIALISATION RAPIDE ---
+# dumps/loads : données simples (dict, listes...) du journal, des snapshots et
+# des réponses sans modèle. orjson si installé, sinon json compact.
+# dumps_models : objets internes contenant des modèles Pydantic (User, Spot...),
+# sérialisés directement en Rust par pydantic-core, sans repasser par la
+# validation du response_model ni par jsonable_encoder.
+
+def dumps(obj) -> bytes:
+    if orjson is not None: return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def loads(data):
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+_ANY = TypeAdapter(Any)
+
+def dumps_models(obj, indent=None) -> bytes: return _ANY.dump_json(obj, indent=indent)
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes: return dumps(content)
+
+# Réponse pour un objet de confiance (déjà validé à l'entrée ou issu du store) :
+# le response_model de la route ne sert plus qu'à la documentation OpenAPI.
+def model_response(obj, headers=None) -> Response:
+    return Response(dumps_models(obj), media_type="application/json", headers=headers)
@@ -0,0 +1,207 @@
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import sys
+import time
+from array import array
+from datetime import datetime, timedelta
+from uuid import UUID
+
+from storage import WAL_SUFFIX
+
+# --- GÉNÉRATEUR DE DONNÉES SYNTHÉTIQUES ---
+# Construit une base de taille "prod" (utilisateurs, spots, avis, sessions)
+# autour de Bruxelles, écrite au fil de l'eau : un utilisateur (et son
+# historique) à la fois, les avis d'un spot à la fois. 10M de sessions ne
+# tiennent donc jamais en mémoire. Sortie db.json (format snapshot) ou SQLite
+# (selon l'extension).
+#   python gen_data.py --users 100000 --spots 3000 --reviews 200000 --sessions 10000000 --out big.json
+
+CATEGORIES = {"Tourisme": 18, "Shopping": 14, "Transport": 14, "Nightlife": 10, "Business": 10,
+              "Culture": 9, "Market": 7, "Parc": 7, "Nature": 4, "Event": 4, "Autre": 3}
+ATTRIBUTES = ["music", "circus", "dog", "family", "student", "security", "disability"]
+FIRST_NAMES = ["Lucas", "Emma", "Noah", "Olivia", "Adam", "Louise", "Mohamed", "Alice", "Arthur", "Lina",
+               "Jules", "Mila", "Victor", "Sofia", "Nathan", "Chloé", "Rayan", "Inès", "Louis", "Yasmine"]
+COMMENTS = ["Toujours beaucoup de monde.", "Public généreux le week-end.", "Calme en semaine.",
+            "Attention aux contrôles.", "Bon spot le soir.", "Peu de passage.", "Touristes sympas.", "À éviter la nuit."]
+
+# Quartiers (lat, lon, dispersion en degrés, poids) : les spots s'y regroupent
+HOTSPOTS = [
+    ("Grand-Place", 50.8467, 4.3524, 0.004, 10), ("Gare Centrale", 50.8453, 4.3571, 0.003, 6),
+    ("Gare du Midi", 50.8358, 4.3365, 0.004, 6), ("Gare du Nord", 50.8604, 4.3610, 0.004, 5),
+    ("Louise", 50.8335, 4.3590, 0.005, 6), ("Flagey", 50.8275, 4.3720, 0.005, 5),
+    ("Quartier européen", 50.8400, 4.3820, 0.005, 5), ("Saint-Gilles", 50.8270, 4.3450, 0.005, 4),
+    ("Sainte-Catherine", 50.8510, 4.3480, 0.003, 4), ("Heysel", 50.8950, 4.3415, 0.006, 3),
+    ("Cinquantenaire", 50.8400, 4.3930, 0.004, 3), ("Bois de la Cambre", 50.8120, 4.3750, 0.006, 2),
+    ("Anderlecht", 50.8370, 4.3100, 0.008, 2), ("Schaerbeek", 50.8670, 4.3780, 0.008, 2),
+]
+
+# Poids des heures de début (0-23) par catégorie
+DAYTIME = [0, 0, 0, 0, 0, 1, 2, 4, 6, 6, 6, 7, 9, 9, 7, 6, 6, 8, 8, 6, 4, 2, 1, 0]
+HOURS = {
+    "Nightlife": [6, 5, 4, 2, 1, 0, 0, 0, 0, 0, 0, 0, 1, 1, 1, 1, 1, 2, 4, 6, 8, 9, 9, 8],
+    "Business": [0, 0, 0, 0, 0, 0, 1, 6, 9, 8, 6, 6, 9, 9, 6, 5, 6, 8, 4, 1, 0, 0, 0, 0],
+    "Transport": [0, 0, 0, 0, 1, 3, 6, 10, 10, 5, 3, 3, 4, 4, 3, 4, 7, 10, 9, 5, 3, 2, 1, 0],
+    "Market": [0, 0, 0, 0, 0, 1, 4, 8, 10, 10, 10, 9, 8, 6, 3, 1, 0, 0, 0, 0, 0, 0, 0, 0],
+}
+# Profil de notes (revenu, sécurité, passage) par catégorie
+QUALITY = {"Tourisme": (4.2, 3.5, 4.6), "Shopping": (3.8, 3.8, 4.2), "Transport": (3.0, 2.6, 4.8),
+           "Nightlife": (3.6, 2.2, 3.8), "Business": (4.0, 4.2, 3.4), "Culture": (3.4, 4.0, 3.0),
+           "Market": (3.2, 3.4, 4.0), "Parc": (2.6, 3.2, 2.4), "Nature": (2.0, 3.0, 1.6), "Event": (4.4, 3.0, 4.4)}
+DEFAULT_QUALITY = (3.0, 3.0, 3.0)
+PASSWORD = "password"  # Même mot de passe pour tous (bench.py se connecte avec)
+
+def cumulative(weights):
+    total, out = 0, []
+    for w in weights:
+        total += w
+        out.append(total)
+    return out
+
+def user_name(i): return f"{FIRST_NAMES[i % len(FIRST_NAMES)]}{i}"
+
+def uid(rng): return str(UUID(int=rng.getrandbits(128), version=4))
+
+def star(x): return min(5.0, max(0.5, round(x * 2) / 2))
+
+class Generator:
+    def __init__(self, users, spots, reviews, sessions, days=365, seed=0, now=None):
+        self.rng = random.Random(seed)
+        self.nb_users, self.nb_spots, self.nb_reviews, self.nb_sessions = users, spots, reviews, sessions
+        self.days = days
+        self.now = (now or datetime.now()).replace(microsecond=0)
+        self.origin = self.now - timedelta(days=days)
+        self.password_hash = hashlib.sha256(PASSWORD.encode()).hexdigest()
+        self.hour_cums = {c: cumulative(HOURS.get(c, DAYTIME)) for c in CATEGORIES}
+        self._make_spots()
+        self.user_ids = [uid(self.rng) for _ in range(users)]
+
+    # --- SPOTS (métadonnées seulement en mémoire, avis générés à l'écriture) ---
+    def _make_spots(self):
+        rng = self.rng
+        cats, cat_cum = list(CATEGORIES), cumulative(CATEGORIES.values())
+        zone_cum = cumulative(h[4] for h in HOTSPOTS)
+        self.spots = []
+        for i in range(self.nb_spots):
+            zone = rng.choices(HOTSPOTS, cum_weights=zone_cum)[0]
+            cat = rng.choices(cats, cum_weights=cat_cum)[0]
+            base = QUALITY.get(cat, DEFAULT_QUALITY)
+            self.spots.append({
+                "id": uid(rng), "name": f"{zone[0]} #{i + 1}", "category": cat,
+                "latitude": round(rng.gauss(zone[1], zone[3]), 6), "longitude": round(rng.gauss(zone[2], zone[3] * 1.6), 6),
+                "quality": tuple(min(5, max(0.5, q + rng.gauss(0, 0.6))) for q in base),
+            })
+        # Popularité en loi de Zipf : quelques spots concentrent l'activité
+        order = list(range(self.nb_spots))
+        rng.shuffle(order)
+        weights = [0.0] * self.nb_spots
+        for rank, i in enumerate(order): weights[i] = 1 / (rank + 1) ** 0.9
+        self.spot_cum = cumulative(weights)
+
+    def _split(self, total, n, sigma):
+        # Répartition lognormale (quelques gros utilisateurs, beaucoup de petits), somme exacte
+        if not n: return array("i")
+        rng = self.rng
+        w = [rng.lognormvariate(0, sigma) for _ in range(n)]
+        scale = total / sum(w)
+        counts = array("i", (int(x * scale) for x in w))
+        for i in rng.sample(range(n), total - sum(counts)): counts[i] += 1
+        return counts
+
+    def spot_docs(self):
+        rng = self.rng
+        per_spot = self._split(self.nb_reviews, self.nb_spots, 1.0)
+        for s, count in zip(self.spots, per_spot):
+            reviews = []
+            for _ in range(count):
+                rev, sec, traf = (star(rng.gauss(q, 0.7)) for q in s["quality"])
+                created = self.origin + timedelta(seconds=rng.randrange(self.days * 86400))
+                reviews.append({"id": uid(rng), "authorName": user_name(rng.randrange(max(self.nb_users, 1))),
+                                "ratingRevenue": rev, "ratingSecurity": sec, "ratingTraffic": traf,
+                                "attribute": rng.choice(ATTRIBUTES), "comment": rng.choice(COMMENTS), "createdAt": created.isoformat()})
+            reviews.sort(key=lambda r: r["createdAt"], reverse=True)  # Plus récent en tête (format JSON)
+            yield {"id": s["id"], "name": s["name"], "description": f"Spot {s['category']} près de {s['name'].split(' #')[0]}",
+                   "latitude": s["latitude"], "longitude": s["longitude"], "category": s["category"],
+                   "createdAt": self.origin.isoformat(), "createdBy": self.user_ids[rng.randrange(len(self.user_ids))] if self.user_ids and rng.random() < 0.3 else "Admin",
+                   "currentActiveUsers": 0, "reviews": reviews}
+
+    # --- UTILISATEURS (un à la fois, avec tout son historique) ---
+    def user_docs(self):
+        rng, spots = self.rng, self.spots
+        per_user = self._split(self.nb_sessions, self.nb_users, 1.2)
+        for i, count in enumerate(per_user):
+            favorites = rng.choices(range(len(spots)), cum_weights=self.spot_cum, k=rng.randint(2, 12)) if spots else []
+            history = []
+            for _ in range(count if spots else 0):
+                s = spots[rng.choice(favorites) if rng.random() < 0.75 else rng.choices(range(len(spots)), cum_weights=self.spot_cum)[0]]
+                day = rng.randrange(self.days)
+                hour = rng.choices(range(24), cum_weights=self.hour_cums[s["category"]])[0]
+                start = self.origin + timedelta(days=day, hours=hour, minutes=rng.randrange(60), seconds=rng.randrange(60))
+                if start >= self.now: start -= timedelta(days=1)
+                # Durée lognormale (médiane ~45 min), quelques sessions éclair
+                duration = rng.randint(30, 290) if rng.random() < 0.05 else int(min(8 * 3600, max(300, rng.lognormvariate(math.log(2700), 0.8))))
+                history.append((start, s["id"], s["name"], duration))
+            history.sort(reverse=True)  # Plus récent en tête (format JSON)
+            first = history[-1][0] if history else self.now - timedelta(days=rng.randrange(max(self.days, 1)))
+            yield {"id": self.user_ids[i], "name": user_name(i), "password_hash": self.password_hash,
+                   "attributes": rng.sample(ATTRIBUTES, rng.randint(0, 2)),
+                   "favorites": [spots[f]["id"] for f in dict.fromkeys(favorites[:3])],
+                   "history": [{"spotId": sid, "spotName": name, "timestamp": t.isoformat(), "durationSeconds": d} for t, sid, name, d in history],
+                   "createdAt": (first - timedelta(days=rng.randint(1, 30))).isoformat(), "points": 10, "achievements": ["welcome"]}
+
+# --- ÉCRITURE EN FLUX ---
+def write_json(path, gen: Generator, progress):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write('{"users": [\n')
+        for i, u in enumerate(gen.user_docs()):
+            if i: f.write(",\n")
+            f.write(json.dumps(u, ensure_ascii=False))
+            progress(i + 1)
+        f.write('\n], "spots": [\n')
+        for i, s in enumerate(gen.spot_docs()):
+            if i: f.write(",\n")
+            f.write(json.dumps(s, ensure_ascii=False))
+        f.write('\n], "walSeq": 0}\n')
+    os.replace(tmp, path)
+    # Un ancien journal serait rejoué sur la nouvelle base
+    if os.path.exists(path + WAL_SUFFIX): os.remove(path + WAL_SUFFIX)
+
+def write_sqlite(path, gen: Generator, progress):
+    from models import User, Spot
+    from sqlite_storage import SqliteStore
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix): os.remove(path + suffix)
+    store = SqliteStore(path).load()
+    def users():
+        for i, u in enumerate(gen.user_docs()):
+            yield User(**u)
+            progress(i + 1)
+    store.bulk_insert(users(), (Spot(**s) for s in gen.spot_docs()))
+    store.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Génère une base PoorSpot synthétique (Bruxelles)")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--spots", type=int, default=500)
+    parser.add_argument("--reviews", type=int, default=20000)
+    parser.add_argument("--sessions", type=int, default=500000)
+    parser.add_argument("--days", type=int, default=365, help="profondeur de l'historique")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="db.json", help="*.json ou *.sqlite3")
+    args = parser.parse_args()
+
+    gen = Generator(args.users, args.spots, args.reviews, args.sessions, args.days, args.seed)
+    t0 = time.perf_counter()
+    step = max(args.users // 100, 1)
+    def progress(done):
+        if done % step == 0 or done == args.users:
+            sys.stderr.write(f"\r  {done}/{args.users} utilisateurs ({time.perf_counter() - t0:.0f}s)")
+            sys.stderr.flush()
+    (write_sqlite if args.out.endswith((".sqlite3", ".sqlite", ".db")) else write_json)(args.out, gen, progress)
+    sys.stderr.write("\n")
+    print(f"{args.out} : {args.users} utilisateurs, {args.spots} spots, {args.reviews} avis, {args.sessions} sessions "
+          f"en {time.perf_counter() - t0:.1f}s")
@@ -0,0 +1,143 @@
+import heapq
+import math
+from typing import Dict, List, Optional, Tuple
+
+CELL_DEG = 0.005           # ~550m en latitude, ~350m en longitude à Bruxelles
+EARTH_RADIUS_M = 6371000
+
+# --- INDEX SPATIAL (GRILLE) ---
+# Les spots sont rangés par case de CELL_DEG degrés. Une requête ne visite
+# que les cases qui touchent la zone demandée, et un create_spot ajoute juste
+# une entrée dans sa case (pas de reconstruction).
+
+def distance_m(lat1, lon1, lat2, lon2) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+def cell_of(lat, lon) -> Tuple[int, int]: return (math.floor(lat / CELL_DEG), math.floor(lon / CELL_DEG))
+
+# --- GEOHASH ---
+# Tuiles hiérarchiques : le préfixe d'un geohash est la tuile qui le contient
+# (agrégation à une précision plus grossière en tronquant la chaîne).
+GEOHASH_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+def geohash(lat, lon, precision: int = 7) -> str:
+    lat_lo, lat_hi, lon_lo, lon_hi = -90.0, 90.0, -180.0, 180.0
+    chars, bits, n, even = [], 0, 0, True
+    while len(chars) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if lon >= mid: bits, lon_lo = bits * 2 + 1, mid
+            else: bits, lon_hi = bits * 2, mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid: bits, lat_lo = bits * 2 + 1, mid
+            else: bits, lat_hi = bits * 2, mid
+        even, n = not even, n + 1
+        if n == 5:
+            chars.append(GEOHASH_BASE32[bits])
+            bits, n = 0, 0
+    return "".join(chars)
+
+# (lat_min, lon_min, lat_max, lon_max) de la tuile
+def geohash_bounds(code: str) -> Tuple[float, float, float, float]:
+    lat_lo, lat_hi, lon_lo, lon_hi = -90.0, 90.0, -180.0, 180.0
+    even = True
+    for c in code:
+        bits = GEOHASH_BASE32.index(c)
+        for shift in range(4, -1, -1):
+            bit = (bits >> shift) & 1
+            if even:
+                mid = (lon_lo + lon_hi) / 2
+                if bit: lon_lo = mid
+                else: lon_hi = mid
+            else:
+                mid = (lat_lo + lat_hi) / 2
+                if bit: lat_lo = mid
+                else: lat_hi = mid
+            even = not even
+    return lat_lo, lon_lo, lat_hi, lon_hi
+
+class SpotGrid:
+    def __init__(self):
+        self.cells: Dict[Tuple[int, int], List[Tuple[float, float, str, str]]] = {}
+        self.bounds: Optional[Tuple[int, int, int, int]] = None  # Cases min/max occupées
+
+    def build(self, spots):
+        self.__init__()
+        for s in spots: self.add(s.id, s.latitude, s.longitude, s.category)
+        return self
+
+    def on_event(self, op, d):
+        if op == "add_spot": self.add(d["id"], d["latitude"], d["longitude"], d["category"])
+
+    def add(self, spot_id, lat, lon, category):
+        cy, cx = cell_of(lat, lon)
+        self.cells.setdefault((cy, cx), []).append((lat, lon, category, spot_id))
+        b = self.bounds
+        self.bounds = (cy, cx, cy, cx) if b is None else (min(b[0], cy), min(b[1], cx), max(b[2], cy), max(b[3], cx))
+
+    # --- REQUÊTES ---
+    def bbox(self, min_lat, min_lon, max_lat, max_lon, categories=None) -> List[str]:
+        y0, x0 = cell_of(min_lat, min_lon)
+        y1, x1 = cell_of(max_lat, max_lon)
+        if self.bounds:
+            # Une fenêtre plus grande que la ville ne parcourt que les cases occupées
+            y0, x0 = max(y0, self.bounds[0]), max(x0, self.bounds[1])
+            y1, x1 = min(y1, self.bounds[2]), min(x1, self.bounds[3])
+        found = []
+        for cy in range(y0, y1 + 1):
+            for cx in range(x0, x1 + 1):
+                for lat, lon, cat, sid in self.cells.get((cy, cx), ()):
+                    if min_lat <= lat <= max_lat and min_lon <= lon <= max_lon and (not categories or cat in categories):
+                        found.append(sid)
+        return found
+
+    def radius(self, lat, lon, radius_m, categories=None) -> List[Tuple[float, str]]:
+        dlat = math.degrees(radius_m / EARTH_RADIUS_M)
+        dlon = dlat / max(math.cos(math.radians(lat)), 1e-6)
+        if not self.bounds: return []
+        b = self.bounds
+        hits = []
+        for cy in range(max(cell_of(lat - dlat, lon)[0], b[0]), min(cell_of(lat + dlat, lon)[0], b[2]) + 1):
+            for cx in range(max(cell_of(lat, lon - dlon)[1], b[1]), min(cell_of(lat, lon + dlon)[1], b[3]) + 1):
+                for slat, slon, cat, sid in self.cells.get((cy, cx), ()):
+                    if categories and cat not in categories: continue
+                    d = distance_m(lat, lon, slat, slon)
+                    if d <= radius_m: hits.append((d, sid))
+        hits.sort()
+        return hits
+
+    def nearest(self, lat, lon, k, categories=None) -> List[Tuple[float, str]]:
+        if not self.bounds or k <= 0: return []
+        cy, cx = cell_of(lat, lon)
+        # Distance minimale garantie jusqu'à une case de l'anneau r+1
+        step_m = math.radians(CELL_DEG) * EARTH_RADIUS_M * min(1.0, math.cos(math.radians(lat)))
+        b = self.bounds
+        # Anneaux qui touchent la zone occupée uniquement (requête hors ville comprise)
+        first_ring = max(0, b[0] - cy, cy - b[2], b[1] - cx, cx - b[3])
+        last_ring = max(abs(cy - b[0]), abs(cy - b[2]), abs(cx - b[1]), abs(cx - b[3]))
+        best: List[Tuple[float, str]] = []  # tas max (distances négatives)
+        for r in range(first_ring, last_ring + 1):
+            for (y, x) in _ring(cy, cx, r, b):
+                for slat, slon, cat, sid in self.cells.get((y, x), ()):
+                    if categories and cat not in categories: continue
+                    d = distance_m(lat, lon, slat, slon)
+                    if len(best) < k: heapq.heappush(best, (-d, sid))
+                    elif d < -best[0][0]: heapq.heapreplace(best, (-d, sid))
+            if len(best) == k and -best[0][0] <= r * step_m: break
+        return sorted((-d, sid) for d, sid in best)
+
+def _ring(cy, cx, r, b):
+    # Cases à distance (Chebyshev) r de la case centrale, restreintes aux bornes b
+    if r == 0:
+        yield (cy, cx)
+        return
+    for x in range(max(cx - r, b[1]), min(cx + r, b[3]) + 1):
+        if cy - r >= b[0]: yield (cy - r, x)
+        if cy + r <= b[2]: yield (cy + r, x)
+    for y in range(max(cy - r + 1, b[0]), min(cy + r - 1, b[2]) + 1):
+        if cx - r >= b[1]: yield (y, cx - r)
+        if cx + r <= b[3]: yield (y, cx + r)
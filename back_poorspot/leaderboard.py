@@ -0,0 +1,150 @@
+import heapq
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sessions import SessionLog, epoch_of
+
+TOP_K = 50
+PERIODS = ("daily", "weekly", "monthly")
+
+# --- CLASSEMENTS PRÉ-CALCULÉS ---
+# Chaque session fermée est rangée dans un seau horaire (début en secondes,
+# lu dans le journal en colonnes : pas de reparsing des timestamps). Chaque période
+# (24h/7j/30j) tient les totaux par utilisateur des heures entièrement dans
+# sa fenêtre, et retire les seaux qui en sortent au fil du temps. L'heure
+# "à cheval" sur la limite est recalculée à la demande (quelques sessions).
+# /users/top lit ensuite un top-K déjà trié au lieu de parser tout l'historique.
+
+def hour_of(start: float) -> int: return int(start // 3600)
+
+def period_cutoff(period, now: datetime) -> Optional[datetime]:
+    if period == "daily": return now.replace(hour=0, minute=0, second=0, microsecond=0)
+    if period == "weekly": return now - timedelta(days=7)
+    if period == "monthly": return now - timedelta(days=30)
+    return None
+
+class Ranking:
+    # Scores > 0 par utilisateur + top-K trié (score décroissant, puis ordre d'inscription)
+    def __init__(self, order: Dict[str, int], k: int = TOP_K):
+        self.order = order
+        self.k = k
+        self.scores: Dict[str, int] = {}
+        self.top: List[str] = []
+        self.dirty = False
+
+    def key(self, uid): return (-self.scores[uid], self.order[uid])
+
+    def add(self, uid, delta):
+        if not delta: return
+        score = self.scores.get(uid, 0) + delta
+        if score > 0: self.scores[uid] = score
+        else: self.scores.pop(uid, None)
+        if self.dirty: return
+        if delta < 0:
+            # Une baisse peut faire entrer un utilisateur hors du top : on recalculera
+            if uid in self.top: self.dirty = True
+        elif uid in self.top: self.top.sort(key=self.key)
+        elif len(self.top) < self.k or self.key(uid) < self.key(self.top[-1]):
+            self.top.append(uid)
+            self.top.sort(key=self.key)
+            del self.top[self.k:]
+
+    def best(self) -> List[str]:
+        if self.dirty:
+            self.top = heapq.nsmallest(self.k, self.scores, key=self.key)
+            self.dirty = False
+        return self.top
+
+class Window:
+    def __init__(self, period, order):
+        self.period = period
+        self.ranking = Ranking(order)
+        self.expired_upto: Optional[int] = None  # Heures <= : hors des totaux
+
+    def counts(self, hour) -> bool: return self.expired_upto is None or hour > self.expired_upto
+
+class Leaderboards:
+    def __init__(self, k: int = TOP_K):
+        self.k = k
+        self.order: Dict[str, int] = {}
+        self.profiles: Dict[str, Tuple[str, List[str]]] = {}
+        self.buckets: Dict[int, List[Tuple[float, str, int]]] = {}
+        self.forever = Ranking(self.order, k)
+        self.points = Ranking(self.order, k)
+        self.windows = {p: Window(p, self.order) for p in PERIODS}
+        self.version = 0  # Change à chaque événement pris en compte (cache des réponses)
+
+    # --- CONSTRUCTION ---
+    def build(self, db, now: Optional[datetime] = None, sessions: Optional[SessionLog] = None):
+        self.__init__(self.k)
+        # Fenêtres positionnées d'abord : les sessions trop vieilles ne sont jamais rangées
+        self.expire(now or datetime.now())
+        for u in db.users: self.add_user(u.id, u.name, u.attributes, u.points)
+        for uid, _, start, secs in (sessions or SessionLog().build(db)).rows(): self.add_session(uid, start, secs)
+        return self
+
+    def add_user(self, uid, name, attributes, points=0):
+        self.order.setdefault(uid, len(self.order))
+        self.profiles[uid] = (name, attributes)
+        self.points.add(uid, points)
+
+    def add_session(self, uid, start: float, secs):
+        if not secs: return
+        self.forever.add(uid, secs)
+        if start != start: return  # Timestamp illisible (NaN) : hors fenêtres
+        hour = hour_of(start)
+        oldest = self.windows["monthly"].expired_upto
+        if oldest is not None and hour < oldest: return  # Trop vieux pour toute fenêtre
+        self.buckets.setdefault(hour, []).append((start, uid, secs))
+        for w in self.windows.values():
+            if w.counts(hour): w.ranking.add(uid, secs)
+
+    # --- ÉVÉNEMENTS ---
+    def on_event(self, op, d):
+        if op in ("add_user", "set_attributes", "close_log", "unlock"): self.version += 1
+        if op == "add_user": self.add_user(d["id"], d["name"], d["attributes"], d["points"])
+        elif op == "set_attributes": self.profiles[d["userId"]] = (self.profiles[d["userId"]][0], d["attributes"])
+        elif op == "close_log": self.add_session(d["userId"], epoch_of(d["timestamp"]), d["durationSeconds"])
+        elif op == "unlock": self.points.add(d["userId"], d["points"])
+
+    # --- FENÊTRES GLISSANTES ---
+    def expire(self, now: datetime):
+        for w in self.windows.values():
+            cutoff_hour = hour_of(epoch_of(period_cutoff(w.period, now)))
+            if w.expired_upto is not None and cutoff_hour <= w.expired_upto: continue
+            start = w.expired_upto + 1 if w.expired_upto is not None else min(self.buckets, default=cutoff_hour)
+            for hour in range(start, cutoff_hour + 1):
+                for _, uid, secs in self.buckets.get(hour, ()): w.ranking.add(uid, -secs)
+            w.expired_upto = cutoff_hour
+        # La fenêtre mensuelle est la plus large : ce qu'elle a lâché ne sert plus
+        oldest = self.windows["monthly"].expired_upto
+        for hour in [h for h in self.buckets if h < oldest]: del self.buckets[hour]
+
+    # --- REQUÊTE ---
+    def top(self, period: str = "forever", sort_by: str = "time", now: Optional[datetime] = None):
+        if sort_by == "points": return self._rows(self.points, self.points.best())
+        if period not in self.windows: return self._rows(self.forever, self.forever.best())
+
+        now = now or datetime.now()
+        self.expire(now)
+        w = self.windows[period]
+        cutoff = epoch_of(period_cutoff(period, now))
+        # Heure limite : seules ses sessions postérieures à la coupure comptent
+        partial: Dict[str, int] = {}
+        for start, uid, secs in self.buckets.get(w.expired_upto, ()):
+            if start >= cutoff: partial[uid] = partial.get(uid, 0) + secs
+        if not partial: return self._rows(w.ranking, w.ranking.best())
+
+        # Hors du top-K complet, seuls les utilisateurs de l'heure limite peuvent remonter
+        scores = w.ranking.scores
+        final = {uid: scores.get(uid, 0) for uid in w.ranking.best()}
+        for uid, secs in partial.items(): final[uid] = scores.get(uid, 0) + secs
+        best = sorted(final, key=lambda uid: (-final[uid], self.order[uid]))[:self.k]
+        return [self._row(uid, final[uid]) for uid in best]
+
+    def _rows(self, ranking: Ranking, ids):
+        return [self._row(uid, ranking.scores[uid]) for uid in ids]
+
+    def _row(self, uid, score):
+        name, attributes = self.profiles[uid]
+        return {"userId": uid, "name": name, "score": score, "attributes": attributes}
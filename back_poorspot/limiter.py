@@ -0,0 +1,84 @@
+import math
+import os
+import time
+from typing import Callable, Dict, List, Optional
+
+from fastjson import dumps
+from metrics import Metrics, metrics
+
+RATE = float(os.environ.get("POORSPOT_RATE", 0))      # Requêtes/s par client en régime établi (0 : pas de limite)
+BURST = float(os.environ.get("POORSPOT_BURST", 60))   # Rafale tolérée (une appli qui se rafraîchit en entier)
+IP_SHARE = float(os.environ.get("POORSPOT_IP_SHARE", 10))  # Clients anonymes derrière une même IP (NAT opérateur)
+EXEMPT = ("/metrics", "/occupations/stream")
+MAX_CLIENTS = 100000       # Seaux gardés en mémoire avant purge des clients inactifs
+
+# --- LIMITATION DE DÉBIT (SEAU À JETONS) ---
+# Désactivée par défaut (POORSPOT_RATE=0). Chaque client a un seau de BURST
+# jetons qui se remplit de RATE jetons par seconde ; une requête en prend un.
+# Seau vide : 429 + Retry-After, sans toucher à l'application. Un seau qui
+# s'est rempli équivaut à un client jamais vu : ce sont eux qu'on purge.
+# Le client est l'utilisateur du jeton ; sans jeton, l'adresse IP, dont le
+# seau vaut IP_SHARE clients (tout un quartier derrière le NAT d'un opérateur).
+# Les flux (SSE, WebSocket) ne coûtent qu'à l'ouverture : ils sont exemptés.
+
+metrics.describe("http_rate_limited_total", "Requêtes refusées (429) par le limiteur de débit")
+
+def client_ip(scope) -> str: return (scope.get("client") or ("?",))[0]
+
+def anonymous(scope): return None
+
+class TokenBuckets:
+    def __init__(self, rate: float = RATE, burst: float = BURST, max_clients: int = MAX_CLIENTS):
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.max_clients = max_clients
+        self.buckets: Dict[str, List[float]] = {}  # client -> [jetons, dernier relevé]
+        self.limited = 0
+
+    # 0 : accepté ; sinon secondes avant le prochain jeton
+    def take(self, key, now: Optional[float] = None) -> float:
+        now = now if now is not None else time.monotonic()
+        b = self.buckets.get(key)
+        if b is None:
+            if len(self.buckets) >= self.max_clients: self.prune(now)
+            b = self.buckets[key] = [self.burst, now]
+        tokens = min(self.burst, b[0] + (now - b[1]) * self.rate)
+        b[1] = now
+        if tokens >= 1:
+            b[0] = tokens - 1
+            return 0.0
+        b[0] = tokens
+        self.limited += 1
+        return (1 - tokens) / self.rate
+
+    def prune(self, now: float):
+        for key in [k for k, (tokens, last) in self.buckets.items() if tokens + (now - last) * self.rate >= self.burst]:
+            del self.buckets[key]
+        # Encore trop de clients actifs : les moins récents repartent à plein
+        if len(self.buckets) >= self.max_clients:
+            recent = sorted(self.buckets.items(), key=lambda kv: kv[1][1])[len(self.buckets) // 2:]
+            self.buckets = dict(recent)
+
+# key(scope) : client identifié, ou None pour passer par le seau de son IP
+class RateLimitMiddleware:
+    def __init__(self, app, buckets: TokenBuckets, key: Callable = anonymous, ip_buckets: Optional[TokenBuckets] = None,
+                 exempt=EXEMPT, registry: Metrics = metrics):
+        self.app = app
+        self.buckets = buckets
+        self.ip_buckets = ip_buckets or buckets
+        self.key = key
+        self.exempt = set(exempt)
+        self.metrics = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exempt:
+            return await self.app(scope, receive, send)
+        key = self.key(scope)
+        buckets = self.buckets if key is not None else self.ip_buckets
+        if not buckets.rate: return await self.app(scope, receive, send)
+        wait = buckets.take(key if key is not None else "ip:" + client_ip(scope))
+        if not wait: return await self.app(scope, receive, send)
+        self.metrics.inc("http_rate_limited_total")
+        await send({"type": "http.response.start", "status": 429,
+                    "headers": [(b"content-type", b"application/json"), (b"retry-after", str(math.ceil(wait)).encode())]})
+        await send({"type": "http.response.body", "body": dumps({"detail": "Trop de requêtes"})})
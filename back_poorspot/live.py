@@ -0,0 +1,145 @@
+import asyncio
+import math
+from typing import Dict, Optional, Set, Tuple
+
+TILE_DEG = 0.01     # Tuile carte ~1.1km x 0.7km à Bruxelles
+MAX_TILES = 400     # Au-delà, bbox refusée : s'abonner à tout (sans bbox)
+HEARTBEAT = 15      # Secondes sans événement avant un "ping"
+
+# --- DIFFUSION LIVE DES OCCUPATIONS ---
+# Chaque occupy/release est publié sur la boucle asyncio, dans le job de
+# l'écrivain qui le produit (ou au rattrapage des autres workers), puis
+# réparti après ce job vers les abonnés concernés : par spot, par tuile
+# (bbox de la carte) ou tout. Chaque abonné n'a qu'une boîte "dernier état
+# par spot" : un client lent saute les états intermédiaires au lieu
+# d'accumuler une file, et reçoit toujours l'état le plus récent.
+
+def tile_of(lat, lon) -> Tuple[int, int]: return (math.floor(lat / TILE_DEG), math.floor(lon / TILE_DEG))
+
+# "min_lat,min_lon,max_lat,max_lon" (query) ou liste de 4 nombres (message WS)
+def parse_bbox(value) -> Optional[Tuple[float, float, float, float]]:
+    if value is None: return None
+    parts = value.split(",") if isinstance(value, str) else value
+    try: box = tuple(float(p) for p in parts)
+    except (TypeError, ValueError): raise ValueError("bbox invalide")
+    if len(box) != 4 or box[0] > box[2] or box[1] > box[3]: raise ValueError("bbox invalide")
+    return box
+
+def tiles_in(box) -> Set[Tuple[int, int]]:
+    y0, x0 = tile_of(box[0], box[1])
+    y1, x1 = tile_of(box[2], box[3])
+    if (y1 - y0 + 1) * (x1 - x0 + 1) > MAX_TILES: raise ValueError("Zone trop grande")
+    return {(y, x) for y in range(y0, y1 + 1) for x in range(x0, x1 + 1)}
+
+class Subscriber:
+    def __init__(self):
+        self.spots: Set[str] = set()
+        self.tiles: Set[Tuple[int, int]] = set()
+        self.everything = True
+        self.pending: Dict[str, dict] = {}  # Dernier événement non envoyé, par spot
+        self.resync = True                  # Renvoyer un instantané (connexion, changement d'abonnement)
+        self.closed = False
+        self.dropped = 0
+        self.wake = asyncio.Event()
+
+    def push(self, event):
+        if event["spotId"] in self.pending: self.dropped += 1
+        self.pending[event["spotId"]] = event
+        self.wake.set()
+
+class LiveHub:
+    def __init__(self):
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.spot_tiles: Dict[str, Tuple[int, int]] = {}
+        self.state: Dict[str, dict] = {}    # Occupations telles que diffusées
+        self.version: Optional[str] = None
+        self.subscribers: Set[Subscriber] = set()
+        self.everyone: Set[Subscriber] = set()
+        self.by_spot: Dict[str, Set[Subscriber]] = {}
+        self.by_tile: Dict[Tuple[int, int], Set[Subscriber]] = {}
+
+    def attach(self, loop, spots, occupations, version):
+        self.loop = loop
+        self.spot_tiles = {s.id: tile_of(s.latitude, s.longitude) for s in spots}
+        self.state = dict(occupations)
+        self.version = version
+
+    def on_event(self, op, d):
+        if op == "add_spot": self.spot_tiles[d["id"]] = tile_of(d["latitude"], d["longitude"])
+
+    # --- PUBLICATION (boucle asyncio, jobs de l'écrivain) ---
+    def publish(self, spot_id, occupation, version):
+        event = {"spotId": spot_id, "occupation": occupation, "version": version}
+        # Répartition différée, dans l'ordre des publications : l'ordre des versions
+        if self.loop is None: self._dispatch(event)
+        else: self.loop.call_soon_threadsafe(self._dispatch, event)
+
+    def _dispatch(self, event):
+        spot_id = event["spotId"]
+        if event["occupation"] is None: self.state.pop(spot_id, None)
+        else: self.state[spot_id] = event["occupation"]
+        self.version = event["version"]
+        for sub in self.everyone: sub.push(event)
+        targets = self.by_spot.get(spot_id, set()) | self.by_tile.get(self.spot_tiles.get(spot_id), set())
+        for sub in targets: sub.push(event)
+
+    # --- ABONNEMENTS (boucle asyncio) ---
+    def subscribe(self, spots=None, bbox=None) -> Subscriber:
+        sub = Subscriber()
+        self.subscribers.add(sub)
+        self.update(sub, spots, bbox)
+        return sub
+
+    def update(self, sub: Subscriber, spots=None, bbox=None):
+        tiles = tiles_in(bbox) if bbox else set()  # ValueError avant toute modification
+        self._unindex(sub)
+        sub.spots, sub.tiles = set(spots or ()), tiles
+        sub.everything = not sub.spots and not bbox
+        if sub.everything: self.everyone.add(sub)
+        for s in sub.spots: self.by_spot.setdefault(s, set()).add(sub)
+        for t in sub.tiles: self.by_tile.setdefault(t, set()).add(sub)
+        sub.resync = True
+        sub.wake.set()
+
+    def unsubscribe(self, sub: Subscriber):
+        self._unindex(sub)
+        self.subscribers.discard(sub)
+        sub.closed = True
+        sub.wake.set()
+
+    def _unindex(self, sub: Subscriber):
+        self.everyone.discard(sub)
+        for key, index in [(s, self.by_spot) for s in sub.spots] + [(t, self.by_tile) for t in sub.tiles]:
+            subs = index.get(key)
+            if subs is None: continue
+            subs.discard(sub)
+            if not subs: del index[key]
+
+    def close(self):
+        for sub in self.subscribers:
+            sub.closed = True
+            sub.wake.set()
+
+    def wants(self, sub: Subscriber, spot_id) -> bool:
+        return sub.everything or spot_id in sub.spots or self.spot_tiles.get(spot_id) in sub.tiles
+
+    # --- FLUX D'UN ABONNÉ ---
+    # Instantané filtré puis lots d'événements. Pendant l'envoi d'un lot, les
+    # suivants s'accumulent dans pending (un par spot) : c'est la contre-pression.
+    async def messages(self, sub: Subscriber, heartbeat: float = HEARTBEAT):
+        while not sub.closed:
+            try: await asyncio.wait_for(sub.wake.wait(), heartbeat)
+            except asyncio.TimeoutError:
+                yield {"type": "ping", "version": self.version}
+                continue
+            sub.wake.clear()
+            if sub.closed: break
+            if sub.resync:
+                # L'état est tenu sur la boucle : tout ce qui est en attente y est déjà inclus
+                sub.resync = False
+                sub.pending.clear()
+                occupations = {sid: info for sid, info in self.state.items() if self.wants(sub, sid)}
+                yield {"type": "snapshot", "version": self.version, "occupations": occupations}
+            elif sub.pending:
+                events, sub.pending = list(sub.pending.values()), {}
+                yield {"type": "events", "version": self.version, "events": events}
@@ -0,0 +1,121 @@
+import argparse
+import asyncio
+import json
+import random
+import resource
+import time
+from uuid import uuid4
+
+# --- GÉNÉRATEUR DE CHARGE LIVE ---
+# Ouvre des milliers de flux SSE (/occupations/stream) contre un serveur local,
+# puis enchaîne des occupy/release et mesure le délai de diffusion.
+# Client HTTP minimal en asyncio pur (HTTP/1.0 : pas de chunked, fin = fermeture).
+# Tous les clients partagent une IP : serveur sans limiteur de débit (POORSPOT_RATE=0).
+#   POORSPOT_RATE=0 python main.py &
+#   python live_load.py --clients 5000 --moves 500
+
+async def http(host, port, method, path, body=None):
+    reader, writer = await asyncio.open_connection(host, port)
+    data = json.dumps(body).encode() if body is not None else b""
+    writer.write(f"{method} {path} HTTP/1.0\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(data)}\r\n\r\n".encode() + data)
+    raw = await reader.read()
+    writer.close()
+    head, _, payload = raw.partition(b"\r\n\r\n")
+    status = int(head.split()[1])
+    if status == 429: raise SystemExit("429 : serveur limité, le relancer avec POORSPOT_RATE=0")
+    return status, json.loads(payload) if payload else None
+
+class Listener:
+    def __init__(self, query):
+        self.query = query
+        self.snapshot = asyncio.Event()
+        self.events = 0
+        self.arrivals = []  # (version, instant de réception)
+
+    async def run(self, host, port):
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write(f"GET /occupations/stream{self.query} HTTP/1.0\r\nHost: {host}\r\nAccept: text/event-stream\r\n\r\n".encode())
+        status = (await reader.readline()).split()[1]
+        if status != b"200": raise RuntimeError(f"stream {self.query}: HTTP {status.decode()}")
+        while (await reader.readline()).strip(): pass  # En-têtes
+        try:
+            while True:
+                line = await reader.readline()
+                if not line: break
+                if not line.startswith(b"data: "): continue
+                msg = json.loads(line[6:])
+                if msg["type"] == "snapshot": self.snapshot.set()
+                elif msg["type"] == "events":
+                    now = time.perf_counter()
+                    self.events += len(msg["events"])
+                    self.arrivals += [(e["version"], now) for e in msg["events"]]
+        finally: writer.close()
+
+def pct(values, p): return values[min(len(values) - 1, int(len(values) * p))] * 1000 if values else 0
+
+async def main(args):
+    host, port = args.host, args.port
+    # Assez de descripteurs pour tenir toutes les connexions
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (min(hard, max(soft, args.clients + 1024)), hard))
+
+    _, spots = await http(host, port, "GET", "/spots/summary")
+    if not spots: raise SystemExit("Aucun spot en base")
+    spots = spots[:args.spots]
+    users = []
+    for _ in range(args.users):
+        status, u = await http(host, port, "POST", "/users/register", {"username": f"load-{uuid4().hex[:8]}", "password": "x"})
+        if status == 200: users.append(u["id"])
+
+    # Un tiers tout, un tiers par spot, un tiers par zone autour d'un spot
+    listeners = []
+    for i in range(args.clients):
+        s = random.choice(spots)
+        if i % 3 == 0: query = ""
+        elif i % 3 == 1: query = f"?spot={s['id']}"
+        else: query = f"?bbox={s['latitude'] - 0.01},{s['longitude'] - 0.01},{s['latitude'] + 0.01},{s['longitude'] + 0.01}"
+        listeners.append(Listener(query))
+
+    print(f"Ouverture de {len(listeners)} flux...")
+    t0 = time.perf_counter()
+    tasks = []
+    for i in range(0, len(listeners), 200):
+        tasks += [asyncio.create_task(l.run(host, port)) for l in listeners[i:i + 200]]
+        await asyncio.sleep(0.05)  # Pas de rafale SYN sur le backlog du serveur
+    await asyncio.wait_for(asyncio.gather(*(l.snapshot.wait() for l in listeners)), 60)
+    print(f"  {len(listeners)} flux ouverts en {time.perf_counter() - t0:.1f}s")
+
+    # Chaque utilisateur occupe puis libère des spots au hasard.
+    # La version produite par un mouvement est relue ensuite (/occupations) :
+    # les réceptions sont horodatées et appariées à la fin.
+    sent = {}
+    t0 = time.perf_counter()
+    for _ in range(args.moves):
+        user, spot = random.choice(users), random.choice(spots)["id"]
+        action = "occupy" if random.random() < 0.6 else "release"
+        start = time.perf_counter()
+        status, body = await http(host, port, "POST", f"/spots/{spot}/{action}?user_id={user}")
+        if status == 200:
+            _, occ = await http(host, port, "GET", "/occupations?since=0")
+            if occ and occ.get("version"): sent.setdefault(occ["version"], start)
+        await asyncio.sleep(args.interval)
+    await asyncio.sleep(1)
+    elapsed = time.perf_counter() - t0
+
+    for t in tasks: t.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    latencies = sorted(at - sent[v] for l in listeners for v, at in l.arrivals if v in sent)
+    print(f"{args.moves} mouvements en {elapsed:.1f}s, {sum(l.events for l in listeners)} événements reçus")
+    print(f"Délai de diffusion : p50={pct(latencies, 0.5):.1f}ms p95={pct(latencies, 0.95):.1f}ms p99={pct(latencies, 0.99):.1f}ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--clients", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--spots", type=int, default=50)
+    parser.add_argument("--moves", type=int, default=300)
+    parser.add_argument("--interval", type=float, default=0.01)
+    asyncio.run(main(parser.parse_args()))
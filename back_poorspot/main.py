@@ -1,526 +1,635 @@
+import asyncio
 import json
 import os
-import hashlib
-from contextlib import asynccontextmanager
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from typing import List, Optional, Dict
-from datetime import datetime, timedelta
+import secrets
+import time
+from contextlib import asynccontextmanager, suppress
+from fastapi import FastAPI, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from typing import List, Dict, Optional
+from datetime import datetime
 from uuid import uuid4
 import uvicorn
 
+from models import UserAuth, CheckInLog, User, Review, Spot, SpotSummary, ReviewPage, Database
+from storage import Storage, JsonStore, COMPACT_EVERY, COMPACT_INTERVAL
+from sqlite_storage import SqliteStore
+from achievements import ACHIEVEMENTS_BY_ID, ACHIEVEMENTS_DEF, AchievementEngine
+from leaderboard import Leaderboards
+from sessions import SessionLog
+from geo import SpotGrid
+from rollups import TILE_PRECISION, Rollups
+from recommend import Recommender
+from search import SearchIndex
+from sync import ChangeFeed, new_epoch
+from live import LiveHub, parse_bbox
+from writer import Writer
+from metrics import TimingMiddleware, metrics, profiler, span
+from auth import PasswordPool, Tokens
+from fastjson import FastJSONResponse, dumps, dumps_models, model_response
+from reaper import Reaper
+from occupancy import Conflict, OccupancyStore
+from cluster import WORKERS, Cluster
+from limiter import BURST, IP_SHARE, RATE, RateLimitMiddleware, TokenBuckets
+from coalesce import ResponseCache
+
 DB_FILE = "db.json"
+SQLITE_FILE = "db.sqlite3"
+OCCUPANCY_FILE = os.environ.get("POORSPOT_OCCUPANCY", "occupations.sqlite3")
+STORAGE = os.environ.get("POORSPOT_STORAGE", "json") # "json" ou "sqlite"
+PROFILING = os.environ.get("POORSPOT_PROFILING") == "1"  # Active /debug/profile/*
+VALIDATE_RESPONSES = os.environ.get("POORSPOT_VALIDATE_RESPONSES") == "1"  # Ancien chemin (revalidation response_model)
+CLUSTER = WORKERS > 1
+if CLUSTER and STORAGE != "sqlite": raise RuntimeError("POORSPOT_WORKERS > 1 demande POORSPOT_STORAGE=sqlite")
 
-# --- 50 SUCCÈS GAMIFIÉS (LISTE ÉTENDUE) ---
-ACHIEVEMENTS_DEF = [
-    # --- 1. DÉMARRAGE (2) ---
-    {"id": "welcome", "name": "Bienvenue", "desc": "Créer son compte", "points": 10, "icon": "waving_hand"},
-    {"id": "first_step", "name": "Premier Pas", "desc": "Terminer une première session", "points": 20, "icon": "footprint"},
-    
-    # --- 2. ENDURANCE (TEMPS) (5) ---
-    {"id": "time_1h", "name": "Débutant", "desc": "1 heure cumulée", "points": 30, "icon": "hourglass_bottom"},
-    {"id": "time_5h", "name": "Habitué", "desc": "5 heures cumulées", "points": 60, "icon": "hourglass_empty"},
-    {"id": "time_10h", "name": "Pro de la rue", "desc": "10 heures cumulées", "points": 120, "icon": "hourglass_full"},
-    {"id": "time_24h", "name": "Légende", "desc": "24 heures cumulées", "points": 300, "icon": "history"},
-    {"id": "time_100h", "name": "Immortel", "desc": "100 heures cumulées", "points": 1000, "icon": "infinity"},
-    
-    # --- 3. EXPLORATION (QUANTITÉ) (5) ---
-    {"id": "explorer_3", "name": "Curieux", "desc": "3 spots différents visités", "points": 50, "icon": "compass"},
-    {"id": "explorer_10", "name": "Nomade", "desc": "10 spots différents visités", "points": 150, "icon": "map"},
-    {"id": "explorer_15", "name": "Explorateur Ultime", "desc": "15 spots différents visités", "points": 250, "icon": "explore"}, # NEW
-    {"id": "explorer_20", "name": "Vagabond", "desc": "20 spots différents visités", "points": 300, "icon": "public"},
-    {"id": "jack_of_all", "name": "Polyvalent", "desc": "Visiter 1 spot de chaque catégorie", "points": 200, "icon": "category"},
-
-    # --- 4. SPÉCIALISTE (CATÉGORIES) (9) ---
-    {"id": "biz_man", "name": "Business Man", "desc": "3 spots Business visités", "points": 75, "icon": "business_center"},
-    {"id": "tourist", "name": "Touriste", "desc": "3 spots Tourisme visités", "points": 75, "icon": "camera_alt"},
-    {"id": "party_animal", "name": "Fêtard", "desc": "3 spots Nightlife visités", "points": 75, "icon": "celebration"},
-    {"id": "shopper", "name": "Panier Percé", "desc": "3 spots Shopping visités", "points": 75, "icon": "shopping_bag"},
-    {"id": "commuter", "name": "Voyageur", "desc": "3 spots Transport visités", "points": 75, "icon": "train"},
-    {"id": "culture_fan", "name": "Intellectuel", "desc": "3 spots Culture visités", "points": 75, "icon": "school"}, # NEW
-    {"id": "nature_lover", "name": "Écureuil", "desc": "3 spots Nature/Parc visités", "points": 75, "icon": "park"}, # NEW
-    {"id": "market_trader", "name": "Négociant", "desc": "3 spots Marché visités", "points": 75, "icon": "storefront"}, # NEW
-    {"id": "festival_goer", "name": "Festivalier", "desc": "3 spots Event visités", "points": 75, "icon": "local_activity"}, # NEW
-
-    # --- 5. CONTEXTE (HORAIRES) (6) ---
-    {"id": "early_bird", "name": "Lève-tôt", "desc": "Mendier entre 5h et 8h du matin", "points": 50, "icon": "wb_sunny"},
-    {"id": "lunch_time", "name": "Pause Déj", "desc": "Mendier entre 12h et 14h", "points": 50, "icon": "restaurant"},
-    {"id": "afterwork", "name": "Afterwork", "desc": "5 sessions entre 17h et 20h", "points": 60, "icon": "local_bar"}, # NEW
-    {"id": "night_owl", "name": "Oiseau de Nuit", "desc": "Mendier entre 2h et 5h du matin", "points": 100, "icon": "bedtime"},
-    {"id": "insomniac", "name": "Insomniaque", "desc": "5 sessions de nuit (00h-04h)", "points": 150, "icon": "nights_stay"}, # NEW
-    {"id": "weekender", "name": "Du Dimanche", "desc": "Mendier un Samedi ou Dimanche", "points": 40, "icon": "weekend"},
-
-    # --- 6. CONTRIBUTION (CRÉATION/AVIS) (6) ---
-    {"id": "creator_1", "name": "Pionnier", "desc": "Créer 1 nouveau spot", "points": 100, "icon": "add_location"},
-    {"id": "creator_5", "name": "Architecte", "desc": "Créer 5 spots", "points": 400, "icon": "domain"},
-    {"id": "urban_planner", "name": "Urbaniste", "desc": "Créer 10 spots", "points": 800, "icon": "city"}, # NEW
-    {"id": "reviewer_1", "name": "Critique", "desc": "Laisser 1 avis", "points": 30, "icon": "rate_review"},
-    {"id": "reviewer_5", "name": "Influenceur", "desc": "Laisser 5 avis", "points": 150, "icon": "campaign"},
-    {"id": "reviewer_20", "name": "Guide Local", "desc": "Laisser 20 avis", "points": 500, "icon": "map"}, # NEW
-
-    # --- 7. STYLE DE JEU (STATS) (10) ---
-    {"id": "loyal_5", "name": "Squatteur", "desc": "Revenir 5 fois au même spot", "points": 80, "icon": "home"},
-    {"id": "loyal_10", "name": "Fidèle", "desc": "Revenir 10 fois au même spot", "points": 150, "icon": "lock"}, # NEW
-    {"id": "marathon", "name": "Marathon", "desc": "Rester + de 3h d'affilée", "points": 150, "icon": "timer"},
-    {"id": "camping", "name": "Camping", "desc": "Rester + de 5h d'affilée", "points": 300, "icon": "tent"}, # NEW
-    {"id": "sprint", "name": "Sprint", "desc": "Rester moins de 5 min", "points": 10, "icon": "bolt"},
-    {"id": "flash", "name": "Flash", "desc": "10 sessions de moins de 5 min", "points": 100, "icon": "flash_on"}, # NEW
-    {"id": "rich_zone", "name": "Zone Riche", "desc": "Visiter un spot noté 5/5 en revenu", "points": 50, "icon": "attach_money"},
-    {"id": "safe_zone", "name": "Zone Sûre", "desc": "Visiter un spot noté 5/5 en sécurité", "points": 50, "icon": "shield"},
-    {"id": "busy_zone", "name": "Bain de foule", "desc": "Visiter un spot noté 5/5 en passage", "points": 50, "icon": "groups"},
-    {"id": "star", "name": "La Star", "desc": "Visiter un spot noté >4 en Revenu ET Passage", "points": 100, "icon": "star"}, # NEW
-
-    # --- 8. RISQUE & STRATÉGIE (7) ---
-    {"id": "risk_taker", "name": "Téméraire", "desc": "Visiter un spot mal famé (Sécu < 2.5)", "points": 100, "icon": "warning"}, # NEW
-    {"id": "survivor", "name": "Survivant", "desc": "5 sessions dans des spots mal famés", "points": 300, "icon": "skull"}, # NEW
-    {"id": "ghost", "name": "Fantôme", "desc": "Visiter un spot désert (Passage < 1.5)", "points": 60, "icon": "visibility_off"}, # NEW
-    {"id": "hermit", "name": "Ermite", "desc": "5 sessions dans des spots déserts", "points": 150, "icon": "nature_people"}, # NEW
-    {"id": "gourmet", "name": "Gourmet", "desc": "5 sessions dans des spots à haut revenu (>4.5)", "points": 200, "icon": "diamond"}, # NEW
-    {"id": "penny_pincher", "name": "Dèche", "desc": "5 sessions dans des spots à faible revenu (<2.0)", "points": 50, "icon": "money_off"}, # NEW
-    {"id": "kamikaze", "name": "Kamikaze", "desc": "Spot bondé (>4) mais dangereux (<1.5)", "points": 500, "icon": "local_fire_department"}, # NEW
-]
-
-active_occupations: Dict[str, dict] = {}
+active_occupations: Dict[str, dict] = {}   # spot -> occupant
+occupied_by: Dict[str, str] = {}           # user -> spot occupé
 
 # --- GESTION DB ---
-def load_db_data():
-    if not os.path.exists(DB_FILE): return {"users": [], "spots": []}
+def make_store() -> Storage: return SqliteStore(SQLITE_FILE, shared=CLUSTER) if STORAGE == "sqlite" else JsonStore(DB_FILE)
+
+store = make_store()
+sessions = SessionLog()
+engine = AchievementEngine()
+leaderboards = Leaderboards()
+grid = SpotGrid()
+rollups = Rollups()
+recommender = Recommender()
+search_index = SearchIndex()
+feed = ChangeFeed()
+hub = LiveHub()
+writer = Writer(store)
+passwords = PasswordPool()
+reaper = Reaper()
+occupancy = OccupancyStore(OCCUPANCY_FILE)
+tokens = Tokens()
+buckets = TokenBuckets()
+ip_buckets = TokenBuckets(RATE * IP_SHARE, BURST * IP_SHARE)
+responses = ResponseCache()
+cluster = Cluster(store, SQLITE_FILE + ".leader") if CLUSTER else None
+if cluster: feed.clock = lambda: store.last_seq  # Versions = seq du journal partagé, valables sur tous les workers
+store.subscribe(sessions.on_event)
+store.subscribe(engine.on_event)
+store.subscribe(leaderboards.on_event)
+store.subscribe(grid.on_event)
+store.subscribe(rollups.on_event)
+store.subscribe(recommender.on_event)
+store.subscribe(search_index.on_event)
+store.subscribe(feed.on_event)
+store.subscribe(hub.on_event)
+
+metrics.gauge("users", lambda: len(sessions.users), "Utilisateurs en base")
+metrics.gauge("sessions", lambda: len(sessions), "Sessions dans le journal en colonnes")
+metrics.gauge("active_occupations", lambda: len(active_occupations), "Spots occupés")
+metrics.gauge("search_terms", lambda: len(search_index.terms), "Termes de l'index de recherche")
+metrics.gauge("live_subscribers", lambda: len(hub.subscribers), "Flux live ouverts")
+metrics.gauge("wal_entries", lambda: store.wal_entries, "Entrées du journal avant compaction")
+metrics.gauge("writer_jobs_total", lambda: writer.jobs, "Mutations appliquées par l'écrivain", "counter")
+metrics.gauge("writer_batches_total", lambda: writer.batches, "Lots (fsync) de l'écrivain", "counter")
+metrics.gauge("recommendation_cache_hits_total", lambda: recommender.hits, "Recommandations servies depuis le cache", "counter")
+metrics.gauge("recommendation_cache_misses_total", lambda: recommender.misses, "Recommandations calculées", "counter")
+metrics.gauge("expired_occupations_total", lambda: reaper.expired, "Occupations libérées faute de battement", "counter")
+metrics.gauge("response_cache_hits_total", lambda: responses.hits, "Lectures chaudes servies depuis le cache", "counter")
+metrics.gauge("response_cache_misses_total", lambda: responses.misses, "Lectures chaudes recalculées", "counter")
+metrics.gauge("response_cache_coalesced_total", lambda: responses.coalesced, "Lectures jointes à un calcul en cours", "counter")
+if cluster:
+    metrics.gauge("cluster_leader", lambda: int(cluster.leading), "1 si ce worker est leader")
+    metrics.gauge("cluster_replayed_total", lambda: cluster.replayed, "Changements d'autres workers rejoués", "counter")
+
+# --- OCCUPATIONS ---
+# Toujours modifier active_occupations via ces deux fonctions (versionnage + diffusion live + expiration).
+# Vue en mémoire : la prise/libération durable passe par occupancy (qui fait foi).
+# broadcast : transmis aux autres workers (faux pour un changement qui en vient)
+def set_occupation(spot_id, info, last_seen: Optional[float] = None, broadcast: bool = True):
+    active_occupations[spot_id] = info
+    occupied_by[info["userId"]] = spot_id
+    reaper.beat(spot_id, last_seen)
+    # Noté avant la version : en multi-workers, elle vient du seq du journal
+    if broadcast: store.record("occupy", {"spotId": spot_id, "occupation": info, "lastSeen": reaper.last_seen[spot_id]})
+    feed.bump("occupation", spot_id)
+    hub.publish(spot_id, info, feed.token(feed.version))
+
+def clear_occupation(spot_id, broadcast: bool = True):
+    info = active_occupations.pop(spot_id, None)
+    if info is None: return
+    if occupied_by.get(info["userId"]) == spot_id: del occupied_by[info["userId"]]
+    reaper.forget(spot_id)
+    if broadcast: store.record("vacate", {"spotId": spot_id})
+    feed.bump("occupation", spot_id)
+    hub.publish(spot_id, None, feed.token(feed.version))
+
+if cluster:
+    cluster.on("occupy", lambda d: set_occupation(d["spotId"], d["occupation"], d["lastSeen"], broadcast=False))
+    cluster.on("vacate", lambda d: clear_occupation(d["spotId"], broadcast=False))
+    cluster.on("epoch", lambda d: feed.restart(d["epoch"], store.last_seq))
+
+# Ferme la session en cours de l'utilisateur si elle porte sur spot_id (durée jusqu'à end).
+# None : pas de session ouverte sur ce spot.
+def close_session(user_id, spot_id, end: Optional[datetime] = None, min_duration: int = 0) -> Optional[int]:
+    last = store.open_session(user_id)
+    if not last or last.spotId != spot_id: return None
+    duration = max(int(((end or datetime.now()) - datetime.fromisoformat(last.timestamp)).total_seconds()), min_duration)
+    store.close_log(user_id, last, duration)
+    return duration
+
+def award_achievements(user_id) -> List[dict]:
+    new_badges = engine.evaluate(store.get_user(user_id))
+    if new_badges: store.unlock(user_id, [d["id"] for d in new_badges], sum(d["points"] for d in new_badges))
+    return new_badges
+
+# Occupation entretenue puis sans battement depuis OCCUPATION_TTL : libérée comme
+# par release, session close au dernier battement (au moins 1 s, sinon elle
+# resterait ouverte). Une occupation qui n'a jamais reçu de battement (client
+# qui n'en envoie pas) n'expire pas : seul release la ferme, à sa vraie durée.
+async def expire_occupation(spot_id, last_seen: float) -> bool:
+    async def apply():
+        info = active_occupations.get(spot_id)
+        if not info or reaper.last_seen.get(spot_id) != last_seen: return False  # Battement ou libération entre-temps
+        if not await asyncio.to_thread(occupancy.release, spot_id, info["userId"], last_seen):
+            # Battement reçu par un autre worker : on se recale. Jamais de battement :
+            # revue au prochain délai (un autre worker a pu en recevoir). Sinon, libéré ailleurs.
+            row = await asyncio.to_thread(occupancy.get, spot_id)
+            if row and row["user_id"] == info["userId"]: reaper.beat(spot_id, row["last_seen"] if row["last_seen"] > row["since"] else time.time())
+            else: clear_occupation(spot_id)
+            return False
+        clear_occupation(spot_id)
+        if close_session(info["userId"], spot_id, datetime.fromtimestamp(last_seen), min_duration=1) is not None:
+            award_achievements(info["userId"])
+        return True
+    return await writer.submit(apply)
+
+# Les scripts hors-ligne (sync_achievements) travaillent sur une copie complète,
+# le serveur lui passe par le store résident.
+def load_db() -> Database:
+    s = make_store().load()
+    db = s.database()
+    s.close()
+    return db
+
+def save_db(db: Database):
+    s = make_store().load()
+    s.write_all(db)
+    s.close()
+
+# Démarrage : occupations rechargées depuis occupancy et recoupées avec les
+# sessions ouvertes. Une session ouverte sans occupation (kill avant ce
+# mécanisme, ou crash entre libération et fsync) reste ouverte, comme avant :
+# sa fin réelle est inconnue, le release de l'utilisateur la fermera.
+# Plusieurs workers : seul le premier (leader) réconcilie, les suivants
+# reprennent les occupations telles quelles.
+def restore_occupations(reconcile: bool = True):
+    if not reconcile:
+        for row in occupancy.all(): set_occupation(row["spot_id"], {"userId": row["user_id"], "userName": row["user_name"]}, row["last_seen"], broadcast=False)
+        return
+    kept, dropped = occupancy.reconcile(store.open_session, store.get_spot)
+    for spot_id, row in kept.items():
+        set_occupation(spot_id, {"userId": row["user_id"], "userName": row["user_name"]}, row["last_seen"], broadcast=False)
+    for spot_id in dropped: store.record("vacate", {"spotId": spot_id})
+
+# Tâches d'un seul processus (le leader en multi-workers)
+async def lead():
+    jobs = [reaper.run(expire_occupation)]
+    if cluster: jobs.append(cluster.prune(writer))
+    await asyncio.gather(*jobs)
+
+async def compactor():
+    while True:
+        await asyncio.sleep(COMPACT_INTERVAL)
+        if store.wal_entries >= COMPACT_EVERY: await asyncio.to_thread(store.compact)
+
+def build_indexes(db: Database):
+    sessions.build(db)
+    engine.build(db, sessions)
+    leaderboards.build(db, sessions=sessions)
+    grid.build(db.spots)
+    rollups.build(db, sessions)
+    recommender.build(db, sessions)
+    search_index.build(db.spots)
+
+# Lot ou job défait en base après avoir notifié les index (writer.py) : on repart
+# de ce qui est validé, sous le verrou d'écriture pour caler le curseur partagé
+async def rebuild_indexes():
+    await asyncio.to_thread(store.begin)
     try:
-        with open(DB_FILE, "r", encoding="utf-8") as f: return json.load(f)
-    except: return {"users": [], "spots": []}
-
-def save_db_data(data):
-    with open(DB_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=4)
+        build_indexes(store.database())
+        if cluster:
+            cluster.seq = store.change_head()
+            # Nouvel epoch pour tous les workers : des versions défaites ont pu être servies
+            epoch = new_epoch()
+            store.put_setting("feed_epoch", epoch)
+            store.record("epoch", {"epoch": epoch})
+            feed.restart(epoch, store.last_seq)
+        else: feed.reset()
+        responses.entries.clear()
+    finally: await asyncio.to_thread(store.flush)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    with span("startup.load"): store.open()
+    if cluster:
+        # Verrou d'écriture pendant tout le démarrage : index, curseur du journal
+        # partagé et occupations décrivent le même état
+        store.grouped = True
+        store.begin()
+        if not os.environ.get("POORSPOT_SECRET"): tokens.secret = store.setting("token_secret", lambda: secrets.token_hex(32)).encode()
+    db = store.database()
+    with span("startup.indexes"): build_indexes(db)
+    occupancy.open()
+    restore_occupations(cluster.start() if cluster else True)
+    # Epoch commun : un client garde ses versions d'un worker à l'autre
+    if cluster: feed.restart(store.setting("feed_epoch", new_epoch), store.last_seq)
+    store.flush()
+    hub.attach(asyncio.get_running_loop(), db.spots, active_occupations, feed.token(feed.version))
+    del db
+    writer.start()
+    writer.rebuild = rebuild_indexes
+    if cluster: writer.catch_up = cluster.catch_up
+    tasks = [asyncio.create_task(compactor()), asyncio.create_task(cluster.run(lead) if cluster else lead())]
     yield
-    if active_occupations:
-        data = load_db_data()
-        users = data.get("users", [])
-        for spot_id, info in active_occupations.items():
-            user_id = info["userId"]
-            user = next((u for u in users if u["id"] == user_id), None)
-            if user and "history" in user and user["history"]:
-                last = user["history"][0]
-                if last.get("spotId") == spot_id and not last.get("durationSeconds"):
-                    start = datetime.fromisoformat(last["timestamp"])
-                    last["durationSeconds"] = int((datetime.now() - start).total_seconds())
-        save_db_data(data)
-        active_occupations.clear()
-
-app = FastAPI(lifespan=lifespan)
-
-def hash_password(p: str) -> str: return hashlib.sha256(p.encode()).hexdigest()
-
-# --- MODELS ---
-class UserAuth(BaseModel):
-    username: str
-    password: str
-    attributes: List[str] = []
-
-class CheckInLog(BaseModel):
-    spotId: str
-    spotName: str
-    timestamp: str
-    durationSeconds: Optional[int] = 0
-
-class User(BaseModel):
-    id: str
-    name: str
-    password_hash: str 
-    attributes: List[str] = []
-    favorites: List[str] = []
-    history: List[CheckInLog] = [] 
-    createdAt: str
-    points: int = 0
-    achievements: List[str] = []
-
-class Review(BaseModel):
-    id: str
-    authorName: str
-    ratingRevenue: float
-    ratingSecurity: float
-    ratingTraffic: float
-    attribute: str
-    comment: str
-    createdAt: str
-
-class Spot(BaseModel):
-    id: str
-    name: str
-    description: str
-    latitude: float
-    longitude: float
-    category: str
-    createdAt: str
-    createdBy: str
-    currentActiveUsers: int
-    reviews: List[Review] = []
-    # Helper properties for logic
-    @property
-    def avgRevenue(self): return sum(r.ratingRevenue for r in self.reviews)/len(self.reviews) if self.reviews else 0
-
-class Database(BaseModel):
-    users: List[User]
-    spots: List[Spot]
-
-def load_db() -> Database:
-    data = load_db_data()
-    for u in data.get("users", []):
-        if "points" not in u: u["points"] = 0
-        if "achievements" not in u: u["achievements"] = []
-    return Database(**data)
-
-def save_db(db: Database): save_db_data(db.model_dump())
-
-# --- LOGIQUE DE DÉBLOCAGE (Mise à jour) ---
-def check_new_achievements(user: User, db: Database):
-    new_unlocks = []
-    def has(aid): return aid in user.achievements
-
-    # Données agrégées
-    history = [h for h in user.history if h.durationSeconds and h.durationSeconds > 0]
-    total_seconds = sum(h.durationSeconds for h in history)
-    distinct_spots = set(h.spotId for h in history)
-    
-    # Données Spots créés / Avis
-    created_count = sum(1 for s in db.spots if s.createdBy == user.id)
-    reviews_count = sum(sum(1 for r in s.reviews if r.authorName == user.name) for s in db.spots)
-
-    # Maps et Compteurs
-    spots_map = {s.id: s for s in db.spots}
-    cat_visits = {}
-    spot_visits_count = {}
-    
-    # Compteurs contextuels
-    afterwork_count = 0
-    insomnia_count = 0
-    high_rev_count = 0
-    low_rev_count = 0
-    low_sec_count = 0
-    low_traf_count = 0
-    flash_count = 0
-
-    for h in history:
-        s = spots_map.get(h.spotId)
-        spot_visits_count[h.spotId] = spot_visits_count.get(h.spotId, 0) + 1
-        
-        # Check durée courte
-        if h.durationSeconds < 300: flash_count += 1
-
-        # Check horaire
-        try:
-            dt = datetime.fromisoformat(h.timestamp)
-            if 17 <= dt.hour < 20: afterwork_count += 1
-            if 0 <= dt.hour < 4: insomnia_count += 1
-        except: pass
-
-        if s:
-            cat_visits.setdefault(s.category, set()).add(s.id)
-            
-            # Calcul moyennes spot
-            if s.reviews:
-                avg_rev = sum(r.ratingRevenue for r in s.reviews)/len(s.reviews)
-                avg_sec = sum(r.ratingSecurity for r in s.reviews) / len(s.reviews)
-                avg_traf = sum(r.ratingTraffic for r in s.reviews) / len(s.reviews)
-                
-                if avg_rev > 4.5: high_rev_count += 1
-                if avg_rev < 2.0: low_rev_count += 1
-                if avg_sec < 2.0: low_sec_count += 1
-                if avg_traf < 2.0: low_traf_count += 1
-
-    # --- CHECK DES CONDITIONS ---
-
-    # 1. Démarrage
-    if has("welcome") is False: new_unlocks.append("welcome")
-    if len(history) >= 1 and not has("first_step"): new_unlocks.append("first_step")
-
-    # 2. Temps
-    if total_seconds >= 3600 and not has("time_1h"): new_unlocks.append("time_1h")
-    if total_seconds >= 18000 and not has("time_5h"): new_unlocks.append("time_5h")
-    if total_seconds >= 36000 and not has("time_10h"): new_unlocks.append("time_10h")
-    if total_seconds >= 86400 and not has("time_24h"): new_unlocks.append("time_24h")
-    if total_seconds >= 360000 and not has("time_100h"): new_unlocks.append("time_100h")
-
-    # 3. Exploration
-    if len(distinct_spots) >= 3 and not has("explorer_3"): new_unlocks.append("explorer_3")
-    if len(distinct_spots) >= 10 and not has("explorer_10"): new_unlocks.append("explorer_10")
-    if len(distinct_spots) >= 15 and not has("explorer_15"): new_unlocks.append("explorer_15")
-    if len(distinct_spots) >= 20 and not has("explorer_20"): new_unlocks.append("explorer_20")
-    
-    # 4. Catégories
-    all_cats = ["Tourisme", "Business", "Nightlife", "Shopping", "Transport"]
-    if all(len(cat_visits.get(c, [])) >= 1 for c in all_cats) and not has("jack_of_all"): new_unlocks.append("jack_of_all")
-
-    if len(cat_visits.get("Business", [])) >= 3 and not has("biz_man"): new_unlocks.append("biz_man")
-    if len(cat_visits.get("Tourisme", [])) >= 3 and not has("tourist"): new_unlocks.append("tourist")
-    if len(cat_visits.get("Nightlife", [])) >= 3 and not has("party_animal"): new_unlocks.append("party_animal")
-    if len(cat_visits.get("Shopping", [])) >= 3 and not has("shopper"): new_unlocks.append("shopper")
-    if len(cat_visits.get("Transport", [])) >= 3 and not has("commuter"): new_unlocks.append("commuter")
-    
-    if len(cat_visits.get("Culture", [])) >= 3 and not has("culture_fan"): new_unlocks.append("culture_fan")
-    if len(cat_visits.get("Market", [])) >= 3 and not has("market_trader"): new_unlocks.append("market_trader")
-    if len(cat_visits.get("Event", [])) >= 3 and not has("festival_goer"): new_unlocks.append("festival_goer")
-    # Nature + Parc combinés
-    nature_count = len(cat_visits.get("Nature", [])) + len(cat_visits.get("Parc", []))
-    if nature_count >= 3 and not has("nature_lover"): new_unlocks.append("nature_lover")
-
-    # 5. Contribution
-    if created_count >= 1 and not has("creator_1"): new_unlocks.append("creator_1")
-    if created_count >= 5 and not has("creator_5"): new_unlocks.append("creator_5")
-    if created_count >= 10 and not has("urban_planner"): new_unlocks.append("urban_planner")
-    
-    if reviews_count >= 1 and not has("reviewer_1"): new_unlocks.append("reviewer_1")
-    if reviews_count >= 5 and not has("reviewer_5"): new_unlocks.append("reviewer_5")
-    if reviews_count >= 20 and not has("reviewer_20"): new_unlocks.append("reviewer_20")
-
-    # 6. Fidélité / Style (Compteurs globaux)
-    if any(c >= 5 for c in spot_visits_count.values()) and not has("loyal_5"): new_unlocks.append("loyal_5")
-    if any(c >= 10 for c in spot_visits_count.values()) and not has("loyal_10"): new_unlocks.append("loyal_10")
-    
-    if flash_count >= 10 and not has("flash"): new_unlocks.append("flash")
-    if afterwork_count >= 5 and not has("afterwork"): new_unlocks.append("afterwork")
-    if insomnia_count >= 5 and not has("insomniac"): new_unlocks.append("insomniac")
-    if high_rev_count >= 5 and not has("gourmet"): new_unlocks.append("gourmet")
-    if low_rev_count >= 5 and not has("penny_pincher"): new_unlocks.append("penny_pincher")
-    if low_sec_count >= 5 and not has("survivor"): new_unlocks.append("survivor")
-    if low_traf_count >= 5 and not has("hermit"): new_unlocks.append("hermit")
-
-    # 7. Contextuel (Session Actuelle - last log)
-    if history:
-        last = history[0] 
-        # Duration
-        if last.durationSeconds >= 10800 and not has("marathon"): new_unlocks.append("marathon") # 3h
-        if last.durationSeconds >= 18000 and not has("camping"): new_unlocks.append("camping") # 5h
-        if last.durationSeconds < 300 and not has("sprint"): new_unlocks.append("sprint") # 5 min
-
-        # Time
-        dt = datetime.fromisoformat(last.timestamp)
-        if 5 <= dt.hour < 8 and not has("early_bird"): new_unlocks.append("early_bird")
-        if 12 <= dt.hour < 14 and not has("lunch_time"): new_unlocks.append("lunch_time")
-        if 2 <= dt.hour < 5 and not has("night_owl"): new_unlocks.append("night_owl")
-        if dt.weekday() >= 5 and not has("weekender"): new_unlocks.append("weekender")
-
-        # Spot Quality
-        s = spots_map.get(last.spotId)
-        if s and s.reviews:
-            # Calcul stats instantané pour ce spot précis
-            rev = [r.ratingRevenue for r in s.reviews]
-            sec = [r.ratingSecurity for r in s.reviews]
-            traf = [r.ratingTraffic for r in s.reviews]
-            
-            avg_rev = sum(rev)/len(rev)
-            avg_sec = sum(sec)/len(sec)
-            avg_traf = sum(traf)/len(traf)
-
-            if avg_rev >= 4.8 and not has("rich_zone"): new_unlocks.append("rich_zone")
-            if avg_sec >= 4.8 and not has("safe_zone"): new_unlocks.append("safe_zone")
-            if avg_traf >= 4.8 and not has("busy_zone"): new_unlocks.append("busy_zone")
-            
-            # Badges Spéciaux uniques
-            if avg_sec < 2.5 and not has("risk_taker"): new_unlocks.append("risk_taker")
-            if avg_traf < 1.5 and not has("ghost"): new_unlocks.append("ghost")
-            if avg_rev > 4.0 and avg_traf > 4.0 and not has("star"): new_unlocks.append("star")
-            if avg_sec < 1.5 and avg_traf > 4.0 and not has("kamikaze"): new_unlocks.append("kamikaze")
-
-    # Appliquer changements
-    result = []
-    for aid in new_unlocks:
-        defi = next((d for d in ACHIEVEMENTS_DEF if d["id"] == aid), None)
-        if defi:
-            user.achievements.append(aid)
-            user.points += defi["points"]
-            result.append(defi)
-    
-    return result
+    hub.close()
+    for task in tasks: task.cancel()
+    with suppress(asyncio.CancelledError): await asyncio.gather(*tasks)
+    await writer.stop()
+    # Les occupations restent dans occupancy (redémarrage à chaud, autres workers) :
+    # le reaper les fermera au dernier battement si personne ne revient
+    active_occupations.clear()
+    occupied_by.clear()
+    occupancy.close()
+    store.compact()
+    store.close()
+    profiler.stop()
+    passwords.close()
+
+# Client du limiteur de débit : l'utilisateur d'un jeton valide, sinon son adresse IP
+def rate_key(scope) -> Optional[str]:
+    for name, value in scope["headers"]:
+        if name != b"authorization": continue
+        scheme, _, token = value.decode("latin-1").partition(" ")
+        user_id = tokens.verify(token.strip()) if scheme.lower() == "bearer" else None
+        if user_id: return "user:" + user_id
+    return None
+
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
+app.add_middleware(RateLimitMiddleware, buckets=buckets, key=rate_key, ip_buckets=ip_buckets)
+app.add_middleware(TimingMiddleware)
+
+# Objets du store ou déjà validés à l'entrée : sérialisés directement (pydantic-core),
+# sans revalidation par response_model ni jsonable_encoder. response : en-têtes à garder.
+def trusted(obj, response: Optional[Response] = None):
+    if VALIDATE_RESPONSES: return obj
+    return model_response(obj, dict(response.headers) if response else None)
+
+# Lectures chaudes : un seul calcul et un seul corps sérialisé pour toutes les
+# requêtes identiques, tant que version (ce que décrit la réponse) et TTL tiennent
+async def shared(request: Request, response: Response, version, build, revalidate: bool = True):
+    if VALIDATE_RESPONSES and revalidate: return build()
+    body = await responses.get((request.url.path, request.url.query), version, lambda: dumps_models(build()))
+    return Response(body, media_type="application/json", headers=dict(response.headers))
+
+# --- AUTHENTIFICATION ---
+# Jeton facultatif (Authorization: Bearer <jeton>, reçu au login/register dans
+# X-Auth-Token ou via /users/token) : s'il est présent, il doit correspondre à
+# l'utilisateur visé. Sans jeton, comportement historique (user_id seul).
+def token_user(request: Request) -> Optional[str]:
+    header = request.headers.get("authorization")
+    if not header: return None
+    scheme, _, token = header.partition(" ")
+    user_id = tokens.verify(token.strip()) if scheme.lower() == "bearer" else None
+    if not user_id: raise HTTPException(401, "Jeton invalide ou expiré")
+    return user_id
+
+def check_owner(request: Request, user_id: str):
+    owner = token_user(request)
+    if owner is not None and owner != user_id: raise HTTPException(403, "Jeton d'un autre utilisateur")
+
+async def authenticate(auth: UserAuth) -> User:
+    u = store.find_user_by_name(auth.username)
+    if u and await passwords.verify(auth.password, u.password_hash): return u
+    raise HTTPException(status_code=401, detail="Identifiants incorrects")
 
 # --- ROUTES ---
+# Routes async : les lectures se font sur la boucle, directement en mémoire.
+# Toute mutation est une fonction synchrone confiée à l'écrivain unique
+# (writer.submit), qui l'exécute dans l'ordre puis la rend durable.
+# occupations.sqlite3 peut attendre un autre worker (verrou SQLite) : ses appels
+# se font dans un thread (asyncio.to_thread), la mutation devient une coroutine.
 
 @app.post("/users/register", response_model=User)
-def register(auth: UserAuth):
-    db = load_db()
-    for u in db.users:
-        if u.name.lower() == auth.username.lower():
+async def register(auth: UserAuth, response: Response):
+    # Hachage hors écrivain (pool) ; l'unicité est revérifiée dans apply
+    if store.find_user_by_name(auth.username): raise HTTPException(status_code=400, detail="Pseudo déjà pris")
+    password_hash = await passwords.hash(auth.password)
+
+    def apply():
+        if store.find_user_by_name(auth.username):
             raise HTTPException(status_code=400, detail="Pseudo déjà pris")
-    
-    # Welcome Achievement direct
-    welcome_ach = next((a for a in ACHIEVEMENTS_DEF if a["id"] == "welcome"), None)
-    points = welcome_ach["points"] if welcome_ach else 0
-    achs = ["welcome"] if welcome_ach else []
-
-    new_user = User(
-        id=str(uuid4()),
-        name=auth.username,
-        password_hash=hash_password(auth.password),
-        attributes=auth.attributes,
-        favorites=[],
-        history=[],
-        createdAt=datetime.now().isoformat(),
-        points=points,
-        achievements=achs
-    )
-    db.users.append(new_user)
-    save_db(db)
-    return new_user
+
+        # Welcome Achievement direct
+        welcome_ach = ACHIEVEMENTS_BY_ID.get("welcome")
+        points = welcome_ach["points"] if welcome_ach else 0
+        achs = ["welcome"] if welcome_ach else []
+
+        new_user = User(
+            id=str(uuid4()),
+            name=auth.username,
+            password_hash=password_hash,
+            attributes=auth.attributes,
+            favorites=[],
+            history=[],
+            createdAt=datetime.now().isoformat(),
+            points=points,
+            achievements=achs
+        )
+        return store.add_user(new_user)
+    user = await writer.submit(apply)
+    response.headers["X-Auth-Token"] = tokens.issue(user.id)["token"]
+    return trusted(user, response)
 
 @app.post("/users/login", response_model=User)
-def login(auth: UserAuth):
-    db = load_db()
-    hashed = hash_password(auth.password)
-    for u in db.users:
-        if u.name.lower() == auth.username.lower() and u.password_hash == hashed:
-            return u
-    raise HTTPException(status_code=401, detail="Identifiants incorrects")
+async def login(auth: UserAuth, response: Response):
+    u = await authenticate(auth)
+    response.headers["X-Auth-Token"] = tokens.issue(u.id)["token"]
+    return trusted(u, response)
+
+@app.post("/users/token")
+async def issue_token(auth: UserAuth): return tokens.issue((await authenticate(auth)).id)
+
+@app.get("/users/me", response_model=User)
+async def get_me(request: Request):
+    user_id = token_user(request)
+    u = store.get_user(user_id) if user_id else None
+    if not u: raise HTTPException(401, "Jeton requis")
+    return trusted(u)
 
 @app.put("/users/{user_id}/attributes", response_model=User)
-def update_attributes(user_id: str, attributes: List[str]):
-    db = load_db()
-    for u in db.users:
-        if u.id == user_id:
-            u.attributes = attributes
-            save_db(db)
-            return u
-    raise HTTPException(status_code=404, detail="User not found")
+async def update_attributes(user_id: str, attributes: List[str], request: Request):
+    check_owner(request, user_id)
+    def apply():
+        if not store.get_user(user_id): raise HTTPException(status_code=404, detail="User not found")
+        store.set_attributes(user_id, attributes)
+        return store.get_user(user_id)
+    return trusted(await writer.submit(apply))
 
 @app.get("/achievements/list")
-def get_achievements_list(): return ACHIEVEMENTS_DEF
+async def get_achievements_list(): return trusted(ACHIEVEMENTS_DEF)
+
+# --- GET CONDITIONNELS (ETag) & DELTAS (?since=) ---
+def not_modified(request: Request, response: Response, version) -> Optional[Response]:
+    etag = feed.etag(version)
+    if etag in [t.strip() for t in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return None
 
 @app.get("/occupations")
-def get_occupations(): return active_occupations
+async def get_occupations(request: Request, response: Response, since: Optional[str] = None):
+    cached = not_modified(request, response, feed.occupations_version)
+    if cached: return cached
+    def build():
+        if since is None: return active_occupations
+        version = feed.parse(since)
+        if version is None: return {"version": feed.token(feed.version), "full": True, "changed": active_occupations, "removed": []}
+        return feed.occupations_delta(version, active_occupations)
+    # Les deltas portent la version globale : leur corps la suit
+    return await shared(request, response, feed.occupations_version if since is None else feed.version, build)
+
+# --- LIVE (WebSocket / SSE) ---
+# Abonnement par spot (?spot=a&spot=b), par zone (?bbox=min_lat,min_lon,max_lat,max_lon)
+# ou à tout. Premier message : instantané filtré, puis lots d'événements
+# {"spotId", "occupation" (None = libéré), "version"}.
+@app.websocket("/ws/occupations")
+async def ws_occupations(ws: WebSocket, spot: Optional[List[str]] = Query(None), bbox: Optional[str] = None):
+    try: sub = hub.subscribe(spot, parse_bbox(bbox))
+    except ValueError:
+        await ws.close(code=1008)
+        return
+    await ws.accept()
+
+    async def pump():
+        async for msg in hub.messages(sub): await ws.send_text(dumps(msg).decode())
+        await ws.close()
+
+    sender = asyncio.create_task(pump())
+    try:
+        # Le client peut changer d'abonnement : {"spots": [...], "bbox": [...]}
+        while True:
+            msg = await ws.receive_json()
+            try: hub.update(sub, msg.get("spots"), parse_bbox(msg.get("bbox")))
+            except (AttributeError, ValueError): await ws.send_json({"type": "error", "detail": "Abonnement invalide"})
+    except (WebSocketDisconnect, RuntimeError, json.JSONDecodeError): pass
+    finally:
+        hub.unsubscribe(sub)
+        sender.cancel()
+        with suppress(asyncio.CancelledError, WebSocketDisconnect, RuntimeError): await sender
+
+@app.get("/occupations/stream")
+async def stream_occupations(spot: Optional[List[str]] = Query(None), bbox: Optional[str] = None):
+    try: sub = hub.subscribe(spot, parse_bbox(bbox))
+    except ValueError as e: raise HTTPException(400, str(e))
+
+    async def events():
+        try:
+            async for msg in hub.messages(sub): yield f"event: {msg['type']}\ndata: {dumps(msg).decode()}\n\n"
+        finally: hub.unsubscribe(sub)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @app.post("/spots/{spot_id}/occupy")
-def occupy_spot(spot_id: str, user_id: str):
-    curr = active_occupations.get(spot_id)
-    if curr and curr["userId"] != user_id: raise HTTPException(409, "Occupé")
-    
-    db = load_db()
-    user = next((u for u in db.users if u.id == user_id), None)
-    spot = next((s for s in db.spots if s.id == spot_id), None)
-    if not user or not spot: raise HTTPException(404, "Inconnu")
-
-    # Auto Release others
-    for s_id, info in list(active_occupations.items()):
-        if info["userId"] == user_id and s_id != spot_id:
-            if user.history:
-                # Trouver le log ouvert correspondant
-                for log in user.history:
-                    if log.spotId == s_id and not log.durationSeconds:
-                        st = datetime.fromisoformat(log.timestamp)
-                        log.durationSeconds = int((datetime.now() - st).total_seconds())
-                        break
-            del active_occupations[s_id]
-
-    active_occupations[spot_id] = {"userId": user.id, "userName": user.name}
-    new_log = CheckInLog(spotId=spot.id, spotName=spot.name, timestamp=datetime.now().isoformat())
-    user.history.insert(0, new_log)
-    save_db(db)
-    return {"status": "occupied", "history_entry": new_log}
+async def occupy_spot(spot_id: str, user_id: str, request: Request):
+    check_owner(request, user_id)
+    async def apply():
+        curr = active_occupations.get(spot_id)
+        if curr and curr["userId"] != user_id: raise HTTPException(409, "Occupé")
+
+        user = store.get_user(user_id)
+        spot = store.get_spot(spot_id)
+        if not user or not spot: raise HTTPException(404, "Inconnu")
+
+        # Prise atomique (entre workers aussi) ; l'autre spot de l'utilisateur est libéré au passage
+        try: prev = await asyncio.to_thread(occupancy.claim, spot_id, user.id, user.name)
+        except Conflict: raise HTTPException(409, "Occupé")
+        if prev:
+            close_session(user_id, prev)
+            clear_occupation(prev)
+
+        set_occupation(spot_id, {"userId": user.id, "userName": user.name})
+        new_log = CheckInLog(spotId=spot.id, spotName=spot.name, timestamp=datetime.now().isoformat())
+        store.open_log(user.id, new_log)
+        return {"status": "occupied", "history_entry": new_log}
+    return trusted(await writer.submit(apply))
 
 @app.post("/spots/{spot_id}/release")
-def release_spot(spot_id: str, user_id: str):
-    curr = active_occupations.get(spot_id)
-    if curr:
-        if curr["userId"] != user_id: raise HTTPException(403, "Pas à vous")
-        del active_occupations[spot_id]
-
-    db = load_db()
-    user = next((u for u in db.users if u.id == user_id), None)
-    
-    duration = 0
-    new_badges = []
-
-    if user and user.history:
-        last = user.history[0]
-        if last.spotId == spot_id and not last.durationSeconds:
-            st = datetime.fromisoformat(last.timestamp)
-            duration = int((datetime.now() - st).total_seconds())
-            last.durationSeconds = duration
-            
-            # Check Badges
-            new_badges = check_new_achievements(user, db)
-            save_db(db)
-
-    return {"status": "released", "duration": duration, "new_achievements": new_badges, "total_points": user.points if user else 0}
+async def release_spot(spot_id: str, user_id: str, request: Request):
+    check_owner(request, user_id)
+    async def apply():
+        holder = await asyncio.to_thread(occupancy.get, spot_id)
+        if holder:
+            if holder["user_id"] != user_id: raise HTTPException(403, "Pas à vous")
+            await asyncio.to_thread(occupancy.release, spot_id, user_id)
+        clear_occupation(spot_id)
+
+        user = store.get_user(user_id)
+        duration = close_session(user_id, spot_id) if user else None
+        # Check Badges
+        new_badges = award_achievements(user_id) if duration is not None else []
+        if new_badges: user = store.get_user(user_id)
+
+        return {"status": "released", "duration": duration or 0, "new_achievements": new_badges, "total_points": user.points if user else 0}
+    return trusted(await writer.submit(apply))
+
+# Battement du client qui occupe le spot (toutes les quelques minutes).
+# 404 : l'occupation a expiré (ou été libérée), le client doit réoccuper.
+@app.post("/spots/{spot_id}/heartbeat")
+async def heartbeat(spot_id: str, user_id: str, request: Request):
+    check_owner(request, user_id)
+    now = time.time()
+    if not await asyncio.to_thread(occupancy.beat, spot_id, user_id, now):
+        if not await asyncio.to_thread(occupancy.get, spot_id): raise HTTPException(404, "Spot libre")
+        raise HTTPException(403, "Pas à vous")
+    expires = reaper.beat(spot_id, now) if spot_id in active_occupations else now + reaper.ttl
+    return {"status": "alive", "expiresAt": datetime.fromtimestamp(expires).isoformat(), "ttl": reaper.ttl}
 
 @app.get("/users/top")
-def get_top_users(period: str = "forever", sort_by: str = "time"):
-    db = load_db()
-    
-    if sort_by == "points":
-        lb = [{"userId": u.id, "name": u.name, "score": u.points, "attributes": u.attributes} for u in db.users if u.points > 0]
-        lb.sort(key=lambda x: x["score"], reverse=True)
-        return lb[:50]
-
-    now = datetime.now()
-    cutoff = None
-    if period == "daily": cutoff = now.replace(hour=0, minute=0, second=0, microsecond=0)
-    elif period == "weekly": cutoff = now - timedelta(days=7)
-    elif period == "monthly": cutoff = now - timedelta(days=30)
-
-    lb = []
-    for user in db.users:
-        secs = 0
-        for log in user.history:
-            if log.durationSeconds:
-                if cutoff is None or datetime.fromisoformat(log.timestamp) >= cutoff:
-                    secs += log.durationSeconds
-        if secs > 0:
-            lb.append({"userId": user.id, "name": user.name, "score": secs, "attributes": user.attributes})
-    
-    lb.sort(key=lambda x: x["score"], reverse=True)
-    return lb[:50]
+async def get_top_users(request: Request, response: Response, period: str = "forever", sort_by: str = "time"):
+    # Les fenêtres glissantes expirent avec l'heure : le TTL du cache borne ce retard
+    return await shared(request, response, leaderboards.version, lambda: leaderboards.top(period, sort_by))
 
 @app.post("/users/{user_id}/favorites/{spot_id}")
-def add_favorite(user_id: str, spot_id: str):
-    db = load_db()
-    for u in db.users:
-        if u.id == user_id:
-            if spot_id not in u.favorites:
-                u.favorites.append(spot_id)
-                save_db(db)
-            return {"status": "ok"}
-    raise HTTPException(404)
+async def add_favorite(user_id: str, spot_id: str, request: Request):
+    check_owner(request, user_id)
+    def apply():
+        u = store.get_user(user_id)
+        if not u: raise HTTPException(404)
+        if spot_id not in u.favorites: store.add_favorite(user_id, spot_id)
+        return {"status": "ok"}
+    return await writer.submit(apply)
 
 @app.delete("/users/{user_id}/favorites/{spot_id}")
-def remove_favorite(user_id: str, spot_id: str):
-    db = load_db()
-    for u in db.users:
-        if u.id == user_id:
-            if spot_id in u.favorites:
-                u.favorites.remove(spot_id)
-                save_db(db)
-            return {"status": "ok"}
-    raise HTTPException(404)
+async def remove_favorite(user_id: str, spot_id: str, request: Request):
+    check_owner(request, user_id)
+    def apply():
+        u = store.get_user(user_id)
+        if not u: raise HTTPException(404)
+        if spot_id in u.favorites: store.remove_favorite(user_id, spot_id)
+        return {"status": "ok"}
+    return await writer.submit(apply)
+
+# Spots libres les mieux notés pour l'utilisateur (recommend.py), dans le rayon si lat/lon sont donnés
+@app.get("/users/{user_id}/recommendations")
+async def get_recommendations(user_id: str, lat: Optional[float] = None, lon: Optional[float] = None,
+                              radius: float = Query(2000, gt=0, le=50000), k: int = Query(10, ge=1, le=100),
+                              category: Optional[List[str]] = Query(None)):
+    if user_id not in recommender.user_attrs: raise HTTPException(404)
+    near = lat is not None and lon is not None
+    return recommender.recommend(user_id, lat if near else None, lon if near else None, radius if near else None, k, category, active_occupations)
 
 @app.get("/users/{user_id}/favorites", response_model=List[str])
-def get_favorites(user_id: str):
-    db = load_db()
-    for u in db.users:
-        if u.id == user_id: return u.favorites
-    raise HTTPException(404)
+async def get_favorites(user_id: str):
+    u = store.get_user(user_id)
+    if not u: raise HTTPException(404)
+    return trusted(u.favorites)
 
 @app.get("/spots", response_model=List[Spot])
-def get_spots(): return load_db().spots
+async def get_spots(request: Request, response: Response, since: Optional[str] = None):
+    cached = not_modified(request, response, feed.spots_version)
+    if cached: return cached
+    if since is None: return await shared(request, response, feed.spots_version, lambda: store.spots)
+    def delta():
+        version = feed.parse(since)
+        return feed.spots_delta(version, store.get_spot) if version is not None else \
+            {"version": feed.token(feed.version), "full": True, "spots": store.spots, "reviews": []}
+    return await shared(request, response, feed.version, delta, revalidate=False)  # Pas une List[Spot] : jamais revalidé
+
+# Liste légère pour la carte : les avis se chargent à la demande (/spots/{id}/reviews)
+@app.get("/spots/summary", response_model=List[SpotSummary])
+async def get_spots_summary(request: Request, response: Response):
+    cached = not_modified(request, response, feed.spots_version)
+    if cached: return cached
+    return await shared(request, response, feed.spots_version, store.spot_summaries)
+
+@app.get("/spots/{spot_id}/reviews", response_model=ReviewPage)
+async def get_reviews(spot_id: str, cursor: Optional[str] = None, limit: int = Query(20, ge=1, le=100)):
+    try: page = store.reviews_page(spot_id, cursor, limit)
+    except ValueError: raise HTTPException(400, "Curseur invalide")
+    if not page: raise HTTPException(404)
+    return trusted(page)
+
+# --- RECHERCHE GÉOGRAPHIQUE ---
+def spots_by_ids(ids) -> List[Spot]: return [s for s in map(store.get_spot, ids) if s]
+
+# Recherche plein texte (search.py) : tous les mots, le dernier complété ; sans accents ni casse
+@app.get("/spots/search")
+async def search_spots(q: str = Query(..., max_length=200), limit: int = Query(20, ge=1, le=100), category: Optional[List[str]] = Query(None)):
+    return search_index.search(q, limit, category)
+
+@app.get("/spots/autocomplete", response_model=List[str])
+async def autocomplete_spots(q: str = Query(..., max_length=200), limit: int = Query(10, ge=1, le=50)):
+    return trusted(search_index.autocomplete(q, limit))
+
+@app.get("/spots/bbox", response_model=List[Spot])
+async def get_spots_bbox(min_lat: float, min_lon: float, max_lat: float, max_lon: float, category: Optional[List[str]] = Query(None)):
+    return trusted(spots_by_ids(grid.bbox(min_lat, min_lon, max_lat, max_lon, category)))
+
+@app.get("/spots/near", response_model=List[Spot])
+async def get_spots_near(lat: float, lon: float, radius: float = 1000, category: Optional[List[str]] = Query(None)):
+    return trusted(spots_by_ids(sid for _, sid in grid.radius(lat, lon, radius, category)))
+
+@app.get("/spots/nearest", response_model=List[Spot])
+async def get_spots_nearest(lat: float, lon: float, k: int = 10, category: Optional[List[str]] = Query(None)):
+    return trusted(spots_by_ids(sid for _, sid in grid.nearest(lat, lon, min(k, 100), category)))
+
+# --- FRÉQUENTATION ---
+# Lu dans les agrégats par heure de la semaine (rollups.py) : jour 0 = lundi
+@app.get("/spots/heatmap")
+async def get_heatmap(precision: int = Query(6, ge=1, le=TILE_PRECISION), category: Optional[List[str]] = Query(None),
+                      day: Optional[int] = Query(None, ge=0, le=6), hour: Optional[int] = Query(None, ge=0, le=23)):
+    return {"precision": precision, "weeks": rollups.weeks, "tiles": rollups.heatmap(precision, category, day, hour)}
+
+@app.get("/spots/{spot_id}/busy-hours")
+async def get_busy_hours(spot_id: str):
+    if spot_id not in rollups.spot_info: raise HTTPException(404)
+    return {"spotId": spot_id, **rollups.spot_busy_hours(spot_id)}
+
+@app.get("/categories/{category}/busy-hours")
+async def get_category_busy_hours(category: str):
+    if category not in rollups.category_spots: raise HTTPException(404)
+    return {"category": category, **rollups.category_busy_hours(category)}
 
 @app.post("/spots", response_model=Spot)
-def create_spot(spot: Spot):
-    db = load_db()
+async def create_spot(spot: Spot):
     if not spot.id: spot.id = str(uuid4())
-    db.spots.append(spot)
-    save_db(db)
-    return spot
+    return trusted(await writer.submit(lambda: store.add_spot(spot)))
 
 @app.post("/spots/{spot_id}/reviews", response_model=Review)
-def add_review(spot_id: str, review: Review):
-    db = load_db()
-    for s in db.spots:
-        if s.id == spot_id:
-            s.reviews.insert(0, review)
-            save_db(db)
-            return review
-    raise HTTPException(404)
+async def add_review(spot_id: str, review: Review):
+    def apply():
+        if not store.get_spot(spot_id): raise HTTPException(404)
+        store.add_review(spot_id, review)
+        return review
+    return trusted(await writer.submit(apply))
+
+# --- OBSERVABILITÉ ---
+@app.get("/metrics")
+async def get_metrics(): return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+# Profileur par échantillonnage (POORSPOT_PROFILING=1) : start, charge, puis stop
+# renvoie les piles "collapsed" (flamegraph.pl profile.txt > flame.svg)
+def require_profiling():
+    if not PROFILING: raise HTTPException(404)
+
+@app.post("/debug/profile/start")
+async def start_profile(interval: float = Query(0.005, ge=0.001, le=1)):
+    require_profiling()
+    if not profiler.start(interval): raise HTTPException(409, "Profilage déjà en cours")
+    return {"status": "profiling", "interval": interval}
+
+@app.post("/debug/profile/stop")
+async def stop_profile():
+    require_profiling()
+    if not profiler.running: raise HTTPException(409, "Aucun profilage en cours")
+    return PlainTextResponse(await asyncio.to_thread(profiler.stop))
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # Les flux live ne se terminent pas d'eux-mêmes : ne pas bloquer l'arrêt.
+    # Plusieurs workers : uvicorn réimporte l'application dans chaque processus
+    uvicorn.run("main:app" if CLUSTER else app, host="0.0.0.0", port=8000, workers=WORKERS, timeout_graceful_shutdown=5)
\ No newline at end of file
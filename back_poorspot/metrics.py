@@ -0,0 +1,196 @@
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict, Optional
+
+# --- MÉTRIQUES (histogrammes en mémoire, format texte Prometheus) ---
+# Requêtes HTTP (middleware ASGI) et portions chaudes du code (spans : parse de
+# db.json, validation Pydantic, succès, dumps, fsync...) agrégées en
+# histogrammes à seaux fixes. Une observation = deux perf_counter, un bisect et
+# deux additions : négligeable face à la requête mesurée.
+#   GET /metrics
+
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # Dernier seau : +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+def _labels(labels, **extra) -> str:
+    items = list(labels) + list(extra.items())
+    if not items: return ""
+    esc = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in items) + "}"
+
+class Metrics:
+    def __init__(self, prefix="poorspot"):
+        self.prefix = prefix
+        self.help: Dict[str, str] = {}
+        self.histograms: Dict[str, Dict[tuple, Histogram]] = {}
+        self.counters: Dict[str, Dict[tuple, float]] = {}
+        self.gauges: Dict[str, tuple] = {}  # nom -> (type, fonction lue au rendu)
+
+    def describe(self, name, text): self.help[name] = text
+
+    # Les threads (flush, compaction) observent aussi : un += sur une liste est
+    # atomique sous le GIL, une observation perdue au pire n'a pas d'importance.
+    def observe(self, name, value, **labels):
+        series = self.histograms.setdefault(name, {})
+        key = tuple(labels.items())
+        h = series.get(key)
+        if h is None: h = series[key] = Histogram()
+        h.observe(value)
+
+    def inc(self, name, value=1, **labels):
+        series = self.counters.setdefault(name, {})
+        key = tuple(labels.items())
+        series[key] = series.get(key, 0) + value
+
+    # kind="counter" pour un total tenu ailleurs (compteurs de l'écrivain...)
+    def gauge(self, name, fn, text="", kind="gauge"):
+        self.gauges[name] = (kind, fn)
+        if text: self.help[name] = text
+
+    @contextmanager
+    def span(self, name):
+        t0 = time.perf_counter()
+        try: yield
+        finally: self.observe("span_seconds", time.perf_counter() - t0, span=name)
+
+    def timed(self, name):
+        def deco(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                t0 = time.perf_counter()
+                try: return fn(*args, **kwargs)
+                finally: self.observe("span_seconds", time.perf_counter() - t0, span=name)
+            return wrapper
+        return deco
+
+    def render(self) -> str:
+        out = []
+        def header(name, kind):
+            full = f"{self.prefix}_{name}"
+            if name in self.help: out.append(f"# HELP {full} {self.help[name]}")
+            out.append(f"# TYPE {full} {kind}")
+            return full
+        for name, series in sorted(self.histograms.items()):
+            full = header(name, "histogram")
+            for key, h in sorted(series.items()):
+                cumulative = 0
+                for le, c in zip(BUCKETS + ("+Inf",), h.counts):
+                    cumulative += c
+                    out.append(f"{full}_bucket{_labels(key, le=le)} {cumulative}")
+                out.append(f"{full}_sum{_labels(key)} {h.sum:.6f}")
+                out.append(f"{full}_count{_labels(key)} {h.count}")
+        for name, series in sorted(self.counters.items()):
+            full = header(name, "counter")
+            for key, v in sorted(series.items()): out.append(f"{full}{_labels(key)} {v}")
+        for name, (kind, fn) in sorted(self.gauges.items()):
+            full = header(name, kind)
+            try: out.append(f"{full} {fn()}")
+            except Exception: continue
+        return "\n".join(out) + "\n"
+
+metrics = Metrics()
+span = metrics.span
+timed = metrics.timed
+metrics.describe("span_seconds", "Durée des portions instrumentées du code")
+metrics.describe("http_request_seconds", "Durée des requêtes HTTP par route")
+metrics.describe("http_requests_total", "Requêtes HTTP par route et statut")
+
+# --- MIDDLEWARE ASGI ---
+# ASGI pur plutôt que @app.middleware("http") : pas de tâche ni de file en plus
+# par requête, et les flux (SSE, WebSocket) passent sans être tamponnés.
+# Label = gabarit de la route (/spots/{spot_id}) et non l'URL : cardinalité bornée.
+class TimingMiddleware:
+    def __init__(self, app, registry: Metrics = metrics):
+        self.app = app
+        self.metrics = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http": return await self.app(scope, receive, send)
+        t0 = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start": status = message["status"]
+            await send(message)
+
+        try: await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            labels = {"method": scope["method"], "route": getattr(route, "path", "unmatched")}
+            self.metrics.observe("http_request_seconds", time.perf_counter() - t0, **labels)
+            self.metrics.inc("http_requests_total", **labels, status=status)
+
+# --- PROFILEUR PAR ÉCHANTILLONNAGE ---
+# Désactivé par défaut : aucun coût tant qu'il ne tourne pas. Une fois lancé, un
+# thread relève la pile de chaque thread toutes les `interval` secondes
+# (sys._current_frames) et compte les piles identiques. Sortie au format
+# "collapsed" (une pile par ligne, frames séparées par ';', puis le nombre
+# d'échantillons) : flamegraph.pl, speedscope, inferno...
+class Profiler:
+    def __init__(self):
+        self.samples: Counter = Counter()
+        self.thread: Optional[threading.Thread] = None
+        self.stopping = threading.Event()
+        self.interval = 0.005
+        self.started = 0.0
+        self.count = 0
+
+    @property
+    def running(self): return self.thread is not None
+
+    def start(self, interval=0.005):
+        if self.running: return False
+        self.samples.clear()
+        self.count = 0
+        self.interval = interval
+        self.started = time.time()
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self.thread.start()
+        return True
+
+    def stop(self) -> str:
+        if self.running:
+            self.stopping.set()
+            self.thread.join()
+            self.thread = None
+        return self.collapsed()
+
+    def _run(self):
+        me = threading.get_ident()
+        names = {}
+        while not self.stopping.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == me: continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                if ident not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stack.append(names.get(ident, str(ident)))
+                self.samples[";".join(reversed(stack))] += 1
+            self.count += 1
+
+    def collapsed(self) -> str: return "".join(f"{stack} {n}\n" for stack, n in self.samples.most_common())
+
+profiler = Profiler()
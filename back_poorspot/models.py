@@ -0,0 +1,134 @@
+from pydantic import BaseModel, computed_field, field_serializer, field_validator
+from typing import List, Optional
+
+# --- MODELS ---
+class UserAuth(BaseModel):
+    username: str
+    password: str
+    attributes: List[str] = []
+
+class CheckInLog(BaseModel):
+    spotId: str
+    spotName: str
+    timestamp: str
+    durationSeconds: Optional[int] = 0
+
+class User(BaseModel):
+    id: str
+    name: str
+    password_hash: str
+    attributes: List[str] = []
+    favorites: List[str] = []
+    history: List[CheckInLog] = []
+    createdAt: str
+    points: int = 0
+    achievements: List[str] = []
+
+    # JSON (API, db.json) : du plus récent au plus ancien, comme avant.
+    # En mémoire : ordre chronologique, un check-in est un simple append.
+    @field_validator("history")
+    @classmethod
+    def _chronological(cls, history): return history[::-1]
+
+    @field_serializer("history")
+    def _newest_first(self, history): return history[::-1]
+
+class Review(BaseModel):
+    id: str
+    authorName: str
+    ratingRevenue: float
+    ratingSecurity: float
+    ratingTraffic: float
+    attribute: str
+    comment: str
+    createdAt: str
+
+class RatingStats(BaseModel):
+    # Sommes + histogrammes (notes arrondies à l'étoile, 0 à 5) tenus à jour avis par avis
+    count: int = 0
+    sumRevenue: float = 0.0
+    sumSecurity: float = 0.0
+    sumTraffic: float = 0.0
+    histRevenue: List[int] = [0] * 6
+    histSecurity: List[int] = [0] * 6
+    histTraffic: List[int] = [0] * 6
+
+    @classmethod
+    def of(cls, reviews: List[Review]) -> "RatingStats":
+        stats = cls()
+        for r in reviews: stats.add(r)
+        return stats
+
+    def add(self, r: Review):
+        self.count += 1
+        self.sumRevenue += r.ratingRevenue
+        self.sumSecurity += r.ratingSecurity
+        self.sumTraffic += r.ratingTraffic
+        self.histRevenue[_star(r.ratingRevenue)] += 1
+        self.histSecurity[_star(r.ratingSecurity)] += 1
+        self.histTraffic[_star(r.ratingTraffic)] += 1
+
+    @computed_field
+    @property
+    def avgRevenue(self) -> float: return self.sumRevenue / self.count if self.count else 0
+
+    @computed_field
+    @property
+    def avgSecurity(self) -> float: return self.sumSecurity / self.count if self.count else 0
+
+    @computed_field
+    @property
+    def avgTraffic(self) -> float: return self.sumTraffic / self.count if self.count else 0
+
+def _star(rating: float) -> int: return min(5, max(0, int(rating + 0.5)))
+
+class Spot(BaseModel):
+    id: str
+    name: str
+    description: str
+    latitude: float
+    longitude: float
+    category: str
+    createdAt: str
+    createdBy: str
+    currentActiveUsers: int
+    reviews: List[Review] = []
+    ratings: RatingStats = RatingStats()
+
+    # Calculé une seule fois à la construction (chargement, création), puis incrémental
+    def model_post_init(self, __context): self.ratings = RatingStats.of(self.reviews)
+
+    def add_review(self, review: Review):
+        self.reviews.insert(0, review)
+        self.ratings.add(review)
+
+    # Helper properties for logic
+    @property
+    def avgRevenue(self): return self.ratings.avgRevenue
+
+# Version légère pour la carte : pas d'avis, juste les agrégats
+class SpotSummary(BaseModel):
+    id: str
+    name: str
+    latitude: float
+    longitude: float
+    category: str
+    reviewCount: int
+    avgRevenue: float
+    avgSecurity: float
+    avgTraffic: float
+
+    @classmethod
+    def of(cls, s: Spot) -> "SpotSummary":
+        r = s.ratings
+        return cls(id=s.id, name=s.name, latitude=s.latitude, longitude=s.longitude, category=s.category,
+                   reviewCount=r.count, avgRevenue=r.avgRevenue, avgSecurity=r.avgSecurity, avgTraffic=r.avgTraffic)
+
+class ReviewPage(BaseModel):
+    items: List[Review]
+    nextCursor: Optional[str] = None
+    total: int
+
+class Database(BaseModel):
+    users: List[User]
+    spots: List[Spot]
@@ -0,0 +1,117 @@
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+# --- OCCUPATIONS DURABLES ---
+# Les occupations en cours vivent dans une petite base SQLite à part
+# (occupations.sqlite3), quel que soit le moteur principal : un kill -9 ne les
+# perd plus, et le redémarrage les recharge telles quelles (dernier battement
+# compris, l'expiration reprend où elle en était).
+# La base fait foi : chaque prise de spot est une transaction BEGIN IMMEDIATE
+# (verrou d'écriture SQLite, partagé entre processus). Deux workers uvicorn ne
+# peuvent donc jamais accorder le même spot, ni deux spots au même utilisateur.
+# active_occupations (main.py) n'en est que la vue en mémoire pour les lectures.
+# Mode WAL + synchronous=NORMAL : survit au crash du processus sans fsync par
+# battement (une coupure de courant peut perdre les toutes dernières secondes).
+# Les appels sont bloquants (verrou SQLite attendu jusqu'à timeout) : main.py
+# les fait dans un thread, une connexion partagée sous self.lock.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS occupations (
+    spot_id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL UNIQUE,
+    user_name TEXT NOT NULL,
+    since REAL NOT NULL,
+    last_seen REAL NOT NULL
+);
+"""
+
+class Conflict(Exception):
+    def __init__(self, holder: str):
+        super().__init__(holder)
+        self.holder = holder
+
+class OccupancyStore:
+    def __init__(self, path: str, timeout: float = 10.0):
+        self.path = path
+        self.timeout = timeout
+        self.conn: Optional[sqlite3.Connection] = None
+        self.lock = threading.RLock()
+
+    def open(self):
+        # Autocommit : les transactions sont ouvertes explicitement (BEGIN IMMEDIATE)
+        self.conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        return self
+
+    def close(self):
+        if self.conn:
+            self.conn.close()
+            self.conn = None
+
+    @contextmanager
+    def transaction(self):
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try: yield self.conn
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    # --- LECTURES ---
+    def all(self) -> List[dict]:
+        with self.lock: return [dict(r) for r in self.conn.execute("SELECT * FROM occupations")]
+
+    def get(self, spot_id) -> Optional[dict]:
+        with self.lock: row = self.conn.execute("SELECT * FROM occupations WHERE spot_id = ?", (spot_id,)).fetchone()
+        return dict(row) if row else None
+
+    # --- MUTATIONS ---
+    # Prend spot_id pour l'utilisateur ; son éventuel autre spot est libéré dans
+    # la même transaction et renvoyé. Conflict si le spot est à quelqu'un d'autre.
+    def claim(self, spot_id, user_id, user_name, now: Optional[float] = None) -> Optional[str]:
+        now = now if now is not None else time.time()
+        with self.transaction() as c:
+            row = c.execute("SELECT user_id FROM occupations WHERE spot_id = ?", (spot_id,)).fetchone()
+            if row and row["user_id"] != user_id: raise Conflict(row["user_id"])
+            prev = c.execute("SELECT spot_id FROM occupations WHERE user_id = ? AND spot_id != ?", (user_id, spot_id)).fetchone()
+            if prev: c.execute("DELETE FROM occupations WHERE spot_id = ?", (prev["spot_id"],))
+            # Reprise du même spot : nouvelle session, battements comptés à partir d'elle
+            c.execute("INSERT INTO occupations (spot_id, user_id, user_name, since, last_seen) VALUES (?, ?, ?, ?, ?) "
+                      "ON CONFLICT(spot_id) DO UPDATE SET since = excluded.since, last_seen = excluded.last_seen", (spot_id, user_id, user_name, now, now))
+        return prev["spot_id"] if prev else None
+
+    # Libère le spot s'il est toujours à user_id. Pour une expiration : seulement
+    # une occupation entretenue (last_seen > since : au moins un battement) sans
+    # battement depuis last_seen, éventuellement reçu par un autre worker
+    def release(self, spot_id, user_id, last_seen: Optional[float] = None) -> bool:
+        sql, args = "DELETE FROM occupations WHERE spot_id = ? AND user_id = ?", [spot_id, user_id]
+        if last_seen is not None:
+            sql += " AND last_seen <= ? AND last_seen > since"
+            args.append(last_seen)
+        with self.lock: return self.conn.execute(sql, args).rowcount > 0
+
+    def beat(self, spot_id, user_id, now: Optional[float] = None) -> bool:
+        now = now if now is not None else time.time()
+        with self.lock: return self.conn.execute("UPDATE occupations SET last_seen = ? WHERE spot_id = ? AND user_id = ?", (now, spot_id, user_id)).rowcount > 0
+
+    # --- RÉCONCILIATION AU DÉMARRAGE ---
+    # Une occupation n'est gardée que si la session ouverte de l'utilisateur
+    # (open_session) porte sur ce spot : sinon le crash a eu lieu entre la prise
+    # du spot et l'écriture du check-in. Renvoie les occupations gardées (par spot)
+    # et les spots écartés.
+    def reconcile(self, open_session, known_spot) -> Tuple[Dict[str, dict], List[str]]:
+        kept, dropped = {}, []
+        with self.transaction() as c:
+            for row in c.execute("SELECT * FROM occupations").fetchall():
+                log = open_session(row["user_id"])
+                if log and log.spotId == row["spot_id"] and known_spot(row["spot_id"]): kept[row["spot_id"]] = dict(row)
+                else: dropped.append(row["spot_id"])
+            c.executemany("DELETE FROM occupations WHERE spot_id = ?", [(s,) for s in dropped])
+        return kept, dropped
@@ -0,0 +1,70 @@
+import asyncio
+import heapq
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+OCCUPATION_TTL = float(os.environ.get("POORSPOT_OCCUPATION_TTL", 900))  # Secondes sans battement avant libération
+
+log = logging.getLogger("poorspot.reaper")
+
+# --- EXPIRATION DES OCCUPATIONS ---
+# Une occupation est entretenue par des battements (POST .../heartbeat) ; à
+# l'échéance, main.py ne libère que celles qui en ont reçu au moins un.
+# Un tas (échéance, spot, dernier battement) donne la prochaine expiration en
+# O(1) et chaque battement/expiration coûte O(log n). Un battement ne retire
+# pas l'ancienne entrée : elle est reconnue périmée au dépilage (dernier
+# battement différent), et le tas est reconstruit s'il grossit trop.
+# Comme le délai est fixe, une nouvelle échéance n'est jamais plus proche que
+# la tête du tas : la tâche dort jusqu'à celle-ci, sans réveil à gérer.
+
+class Reaper:
+    def __init__(self, ttl: float = OCCUPATION_TTL):
+        self.ttl = ttl
+        self.last_seen: Dict[str, float] = {}  # spot occupé -> dernier battement (epoch)
+        self.heap: List[Tuple[float, str, float]] = []
+        self.expired = 0
+
+    def __len__(self): return len(self.last_seen)
+
+    def beat(self, spot_id, now: Optional[float] = None) -> float:
+        now = now if now is not None else time.time()
+        self.last_seen[spot_id] = now
+        heapq.heappush(self.heap, (now + self.ttl, spot_id, now))
+        if len(self.heap) > 2 * len(self.last_seen) + 1024: self._rebuild()
+        return now + self.ttl
+
+    def forget(self, spot_id): self.last_seen.pop(spot_id, None)
+
+    def deadline(self, spot_id) -> Optional[float]:
+        seen = self.last_seen.get(spot_id)
+        return seen + self.ttl if seen is not None else None
+
+    def _rebuild(self):
+        self.heap = [(seen + self.ttl, spot_id, seen) for spot_id, seen in self.last_seen.items()]
+        heapq.heapify(self.heap)
+
+    # Spots dont le dernier battement a dépassé le délai : (spot, dernier battement)
+    def due(self, now: Optional[float] = None) -> List[Tuple[str, float]]:
+        now = now if now is not None else time.time()
+        out = []
+        while self.heap and self.heap[0][0] <= now:
+            _, spot_id, seen = heapq.heappop(self.heap)
+            if self.last_seen.get(spot_id) == seen: out.append((spot_id, seen))
+        return out
+
+    # expire(spot_id, last_seen) : coroutine qui libère le spot (via l'écrivain)
+    async def run(self, expire):
+        while True:
+            due = self.due()
+            if due:
+                results = await asyncio.gather(*(expire(spot_id, seen) for spot_id, seen in due), return_exceptions=True)
+                for (spot_id, seen), result in zip(due, results):
+                    if isinstance(result, Exception):
+                        # Nouvel essai au prochain délai plutôt qu'un spot bloqué pour toujours
+                        log.warning("Expiration de %s impossible : %r", spot_id, result)
+                        if self.last_seen.get(spot_id) == seen: heapq.heappush(self.heap, (time.time() + self.ttl, spot_id, seen))
+                    elif result: self.expired += 1
+            delay = self.heap[0][0] - time.time() if self.heap else self.ttl
+            await asyncio.sleep(min(max(delay, 0.05), self.ttl))
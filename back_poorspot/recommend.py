@@ -0,0 +1,311 @@
+import math
+import time
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Set
+
+from geo import EARTH_RADIUS_M
+from sessions import Interner, SessionLog
+
+try: import numpy as np
+except ImportError: np = None  # Scores en Python pur (plus lents, mêmes résultats)
+
+RECO_TTL = 30              # Secondes de vie d'une liste calculée (les avis récents y entrent au plus tard là)
+RECO_CACHE = 10000         # Utilisateurs gardés en cache
+OVERFETCH = 20             # Candidats en plus du top-k : de quoi remplacer les spots occupés entre-temps
+RATING_WEIGHTS = (0.4, 0.4, 0.1)  # Préférences communes : revenus, sécurité, passage
+POPULARITY_WEIGHT = 0.3
+FAVORITE_WEIGHT = 2.0      # Un favori pèse comme deux fois le temps passé, réparti par catégorie
+ATTRIBUTE_WEIGHT = 0.5
+DISTANCE_WEIGHT = 0.5      # Pénalité au bord du rayon
+FIXED = ("revenue", "security", "traffic", "popularity")
+
+# --- RECOMMANDATIONS ---
+# Chaque spot est une ligne d'une matrice spots x caractéristiques : notes
+# moyennes (/5), popularité (log des sessions), catégorie (1 colonne par
+# catégorie) et part de ses avis laissés par chaque profil (music, dog...).
+# Chaque utilisateur a un vecteur d'affinité dans le même espace : temps passé
+# et favoris par catégorie, ses propres profils, préférences communes de notes.
+# Score = matrice @ affinité (un produit matrice-vecteur), moins une pénalité
+# de distance dans le rayon demandé ; argpartition donne le top-k.
+# Avis, sessions, favoris et profils mettent à jour lignes et affinités au fil
+# des événements. Les listes calculées restent RECO_TTL secondes en cache par
+# utilisateur ; les spots occupés en sont retirés à chaque lecture.
+
+class Recommender:
+    def __init__(self):
+        self.spots = Interner()
+        self.columns = Interner()          # "cat:<catégorie>", "attr:<profil>"
+        for name in FIXED: self.columns.get(name)
+        self.names: List[str] = []
+        self.categories: List[str] = []
+        self.lat: List[float] = []
+        self.lon: List[float] = []
+        self.rows: List[list] = []         # Sans NumPy : une liste par spot
+        self.matrix = None                 # Avec NumPy : lignes [0, len(spots)) utiles, capacité doublée au besoin
+        self.lat_arr = None                # Coordonnées en colonnes contiguës (distances vectorisées)
+        self.lon_arr = None
+        self.cat_ids = None                # Colonne "cat:" de chaque spot (filtre par catégorie)
+        self.review_attrs: Dict[int, Counter] = {}
+        self.rating_sums: Dict[int, List[float]] = {}  # spot -> sommes revenus, sécurité, passage
+        self.sessions: List[int] = []
+        self.user_cats: Dict[str, Counter] = {}   # utilisateur -> secondes par catégorie
+        self.user_favs: Dict[str, Set[str]] = {}
+        self.user_attrs: Dict[str, List[str]] = {}
+        self.affinity: Dict[str, object] = {}
+        self.cache: "OrderedDict[str, dict]" = OrderedDict()  # utilisateur -> {paramètres: (expiration, candidats)}
+        self.hits = 0
+        self.misses = 0
+
+    # --- CONSTRUCTION ---
+    def build(self, db, sessions: Optional[SessionLog] = None):
+        self.__init__()
+        cells = []  # (ligne, colonne, valeur) posées en une fois à la fin
+        for s in db.spots:
+            self.add_spot(s.id, s.name, s.latitude, s.longitude, s.category)
+            r = self.spots.index[s.id]
+            counts = self.review_attrs[r] = Counter()
+            for rv in s.reviews: counts[rv.attribute] += 1
+            self.rating_sums[r] = [s.ratings.sumRevenue, s.ratings.sumSecurity, s.ratings.sumTraffic]
+            cells += self._review_cells(r)
+        for u in db.users:
+            self.user_favs[u.id] = set(u.favorites)
+            self.user_attrs[u.id] = list(u.attributes)
+        sessions = sessions or SessionLog().build(db)
+        if np is not None: self._build_sessions(sessions)
+        else:
+            for uid, spot_id, _, secs in sessions.rows():
+                if secs > 0: self.add_session(uid, spot_id, secs, popularity=False)
+        cells += [self._popularity_cell(r) for r in range(len(self.spots)) if self.sessions[r]]
+        for r, column, value in cells: self.columns.get(column)
+        if np is None:
+            for cell in cells: self._set(*cell)
+        elif cells:
+            rows, columns, values = zip(*cells)
+            self._widen()
+            self.matrix[list(rows), [self.columns.index[c] for c in columns]] = values
+        return self
+
+    # Sessions (popularité, temps par catégorie) depuis les colonnes du journal
+    def _build_sessions(self, sessions: SessionLog):
+        users, spots, _, dur = sessions._views()
+        to_row = np.array([self.spots.index.get(k, -1) for k in sessions.spots.keys] or [-1], dtype=np.int64)
+        rows = to_row[spots]
+        m = (dur > 0) & (rows >= 0)
+        rows, users, dur = rows[m], users[m].astype(np.int64), dur[m]
+        self.sessions = np.bincount(rows, minlength=len(self.spots)).tolist()
+        width = len(self.columns)
+        keys, inverse = np.unique(users * width + self.cat_ids[rows], return_inverse=True)
+        totals = np.bincount(inverse, weights=dur)
+        for key, secs in zip(keys.tolist(), totals.tolist()):
+            user_id, column = sessions.users.keys[key // width], self.columns.keys[key % width]
+            cats = self.user_cats.get(user_id)
+            if cats is None: cats = self.user_cats[user_id] = Counter()
+            cats[column[4:]] += int(secs)
+
+    def add_spot(self, spot_id, name, lat, lon, category):
+        if spot_id in self.spots.index: return
+        r = self.spots.get(spot_id)
+        self.names.append(name)
+        self.categories.append(category)
+        self.lat.append(lat)
+        self.lon.append(lon)
+        self.sessions.append(0)
+        if np is not None:
+            if self.matrix is None or r >= len(self.matrix):
+                self._grow(max(1024, 2 * r), self.matrix.shape[1] if self.matrix is not None else len(self.columns) + 8)
+            self.lat_arr[r], self.lon_arr[r] = lat, lon
+            self.cat_ids[r] = self.columns.get("cat:" + category)
+        else: self.rows.append([0.0] * len(self.columns))
+        self._set(r, "cat:" + category, 1.0)
+
+    def _grow(self, nrows, ncols):
+        old, self.matrix = self.matrix, np.zeros((nrows, ncols), dtype=np.float32)
+        columns = {"lat_arr": np.float32, "lon_arr": np.float32, "cat_ids": np.intc}
+        if old is None:
+            for name, dtype in columns.items(): setattr(self, name, np.zeros(nrows, dtype=dtype))
+            return
+        n, m = old.shape
+        self.matrix[:n, :m] = old
+        for name, dtype in columns.items():
+            col = np.zeros(nrows, dtype=dtype)
+            col[:n] = getattr(self, name)
+            setattr(self, name, col)
+
+    # Une place dans la matrice pour chaque colonne déclarée
+    def _widen(self):
+        if len(self.columns) > self.matrix.shape[1]:
+            self._grow(len(self.matrix), len(self.columns) + 8)
+            self.affinity.clear()  # Vecteurs plus courts que la matrice
+
+    def _set(self, r, column, value):
+        c = self.columns.get(column)
+        if np is not None:
+            if c >= self.matrix.shape[1]: self._widen()
+            self.matrix[r, c] = value
+        else:
+            row = self.rows[r]
+            if c >= len(row):
+                row.extend([0.0] * (c + 1 - len(row)))
+                self.affinity.clear()
+            row[c] = value
+
+    def _review_cells(self, r):
+        counts = self.review_attrs[r]
+        total = sum(counts.values())
+        if not total: return []
+        return [(r, name, v / total / 5) for name, v in zip(FIXED, self.rating_sums[r])] + \
+               [(r, "attr:" + attr, n / total) for attr, n in counts.items()]
+
+    def _set_reviews(self, r):
+        for cell in self._review_cells(r): self._set(*cell)
+
+    def _popularity_cell(self, r): return (r, "popularity", min(1.0, math.log1p(self.sessions[r]) / 10))
+
+    def _set_popularity(self, r): self._set(*self._popularity_cell(r))
+
+    def add_session(self, user_id, spot_id, secs, popularity: bool = True):
+        r = self.spots.index.get(spot_id)
+        if r is None or not secs or secs <= 0: return
+        self.sessions[r] += 1
+        if popularity: self._set_popularity(r)
+        cats = self.user_cats.get(user_id)
+        if cats is None: cats = self.user_cats[user_id] = Counter()
+        cats[self.categories[r]] += secs
+
+    # --- ÉVÉNEMENTS ---
+    def on_event(self, op, d):
+        if op == "add_spot":
+            self.add_spot(d["id"], d["name"], d["latitude"], d["longitude"], d["category"])
+            return
+        if op == "add_review":
+            r = self.spots.index.get(d["spotId"])
+            if r is None: return
+            rv = d["review"]
+            self.review_attrs.setdefault(r, Counter())[rv["attribute"]] += 1
+            sums = self.rating_sums.setdefault(r, [0.0, 0.0, 0.0])
+            for i, k in enumerate(("ratingRevenue", "ratingSecurity", "ratingTraffic")): sums[i] += rv[k]
+            self._set_reviews(r)
+            return
+        user_id = d.get("userId") or d.get("id")
+        if op == "add_user":
+            self.user_favs[user_id] = set(d["favorites"])
+            self.user_attrs[user_id] = list(d["attributes"])
+        elif op == "set_attributes": self.user_attrs[user_id] = list(d["attributes"])
+        elif op == "add_favorite": self.user_favs.setdefault(user_id, set()).add(d["spotId"])
+        elif op == "remove_favorite": self.user_favs.get(user_id, set()).discard(d["spotId"])
+        elif op == "close_log": self.add_session(user_id, d["spotId"], d["durationSeconds"])
+        else: return
+        self.affinity.pop(user_id, None)
+        self.cache.pop(user_id, None)
+
+    # --- AFFINITÉ ---
+    def user_vector(self, user_id):
+        vec = self.affinity.get(user_id)
+        if vec is not None: return vec
+        weights = dict(zip(FIXED, RATING_WEIGHTS + (POPULARITY_WEIGHT,)))
+        cats = self.user_cats.get(user_id) or {}
+        total = sum(cats.values())
+        for cat, secs in cats.items(): weights["cat:" + cat] = secs / total
+        favs = [self.spots.index[f] for f in self.user_favs.get(user_id, ()) if f in self.spots.index]
+        for r in favs:
+            key = "cat:" + self.categories[r]
+            weights[key] = weights.get(key, 0) + FAVORITE_WEIGHT / len(favs)
+        for attr in self.user_attrs.get(user_id, ()): weights["attr:" + attr] = ATTRIBUTE_WEIGHT
+        vec = [0.0] * len(self.columns)
+        for name, w in weights.items():
+            c = self.columns.index.get(name)
+            if c is not None: vec[c] = w
+        if np is not None: vec = np.pad(np.array(vec, dtype=np.float32), (0, self.matrix.shape[1] - len(vec)))
+        self.affinity[user_id] = vec
+        return vec
+
+    # --- REQUÊTE ---
+    # (ligne, score, distance) triés par score ; occupied : spots à écarter (active_occupations)
+    def recommend(self, user_id, lat=None, lon=None, radius=None, k=10, categories=None, occupied=(), now=None) -> List[dict]:
+        now = now or time.time()
+        key = (None if lat is None else round(lat, 4), None if lon is None else round(lon, 4), radius, k,
+               tuple(sorted(categories)) if categories else None)
+        entries = self.cache.get(user_id)
+        hit = entries.get(key) if entries else None
+        if hit and hit[0] > now:
+            self.hits += 1
+            out = self._serve(hit[1], k, occupied)
+            # Trop de candidats occupés depuis le calcul : on recalcule
+            if len(out) == k or len(hit[1]) < k + OVERFETCH: return out
+        self.misses += 1
+        candidates = self._rank(user_id, lat, lon, radius, k + OVERFETCH + len(occupied), categories)
+        self._remember(user_id, key, candidates, now)
+        return self._serve(candidates, k, occupied)
+
+    def _serve(self, candidates, k, occupied) -> List[dict]:
+        out = []
+        for r, score, dist in candidates:
+            spot_id = self.spots.keys[r]
+            if spot_id in occupied: continue
+            out.append({"spotId": spot_id, "name": self.names[r], "category": self.categories[r],
+                        "latitude": self.lat[r], "longitude": self.lon[r], "score": round(score, 4),
+                        "distance": None if dist is None else round(dist)})
+            if len(out) == k: break
+        return out
+
+    def _remember(self, user_id, key, candidates, now):
+        cache = self.cache
+        cache.setdefault(user_id, {})[key] = (now + RECO_TTL, candidates)
+        cache.move_to_end(user_id)
+        # Les plus anciens en tête : on retire les expirés, puis au-delà de la taille
+        while cache:
+            oldest = next(iter(cache.values()))
+            if len(cache) <= RECO_CACHE and any(exp > now for exp, _ in oldest.values()): break
+            cache.popitem(last=False)
+
+    def _rank(self, user_id, lat, lon, radius, n, categories):
+        size = len(self.spots)
+        if not size: return []
+        vec = self.user_vector(user_id)
+        near = lat is not None and lon is not None
+        scale = math.radians(1) * EARTH_RADIUS_M
+        if np is None: return self._rank_python(vec, lat, lon, radius, n, categories, near, scale)
+
+        # rows : lignes retenues (None : toutes), distances et scores alignés dessus
+        rows = dist = None
+        if near:
+            dy = (self.lat_arr[:size] - np.float32(lat)) * np.float32(scale)
+            dx = (self.lon_arr[:size] - np.float32(lon)) * np.float32(scale * math.cos(math.radians(lat)))
+            d2 = dx * dx
+            d2 += dy * dy
+            if radius:
+                rows = np.flatnonzero(d2 <= radius * radius)
+                d2 = d2[rows]
+            dist = np.sqrt(d2)
+        if categories:
+            ids = [self.columns.index[c] for c in ("cat:" + cat for cat in categories) if c in self.columns.index]
+            keep = np.isin(self.cat_ids[:size] if rows is None else self.cat_ids[rows], ids)
+            rows = np.flatnonzero(keep) if rows is None else rows[keep]
+            if dist is not None: dist = dist[keep]
+        # Sélection large (centre-ville) : produit complet puis extraction, moins cher que de copier les lignes
+        if rows is None: scores = self.matrix[:size] @ vec
+        elif len(rows) * 4 > size: scores = (self.matrix[:size] @ vec)[rows]
+        else: scores = self.matrix[rows] @ vec
+        if near and radius: scores -= np.float32(DISTANCE_WEIGHT / radius) * dist
+        n = min(n, len(scores))
+        if not n: return []
+        top = np.argpartition(-scores, n - 1)[:n] if n < len(scores) else np.arange(len(scores))
+        top = top[np.lexsort((top, -scores[top]))]  # Égalités : ordre d'ajout des spots
+        return [(int(i if rows is None else rows[i]), float(scores[i]), None if dist is None else float(dist[i])) for i in top]
+
+    def _rank_python(self, vec, lat, lon, radius, n, categories, near, scale):
+        ranked = []
+        for r, row in enumerate(self.rows):
+            if categories and self.categories[r] not in categories: continue
+            score = sum(a * b for a, b in zip(row, vec))
+            dist = None
+            if near:
+                dy = (self.lat[r] - lat) * scale
+                dx = (self.lon[r] - lon) * scale * math.cos(math.radians(lat))
+                dist = math.hypot(dx, dy)
+                if radius:
+                    if dist > radius: continue
+                    score -= DISTANCE_WEIGHT * (dist / radius)
+            ranked.append((-score, r, dist))
+        ranked.sort(key=lambda x: (x[0], x[1]))
+        return [(r, -s, dist) for s, r, dist in ranked[:n]]
@@ -0,0 +1,198 @@
+import math
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from geo import geohash, geohash_bounds
+from sessions import SessionLog, epoch_of, hour_of_day, weekday_of
+
+try: import numpy as np
+except ImportError: np = None  # Construction session par session (plus lente, mêmes compteurs)
+
+TILE_PRECISION = 7         # ~150 m x 150 m : une tuile par rue / place
+WEEK_HOURS = 168
+WEEK_SECONDS = WEEK_HOURS * 3600
+
+# --- AGRÉGATS D'OCCUPATION ---
+# Chaque session fermée est versée dans des compteurs par heure de la semaine
+# (lundi 0h = 0 ... dimanche 23h = 167) à trois niveaux : spot, catégorie et
+# tuile geohash (x catégorie). "started" compte les sessions commencées dans
+# l'heure, "occupied" les secondes occupées, réparties sur les heures couvertes.
+# Au démarrage, seuls les spots sont remplis depuis le journal en colonnes
+# (une seule répartition par session), catégories et tuiles en sont la somme ;
+# ensuite chaque close_log ajoute sa session aux trois niveaux.
+# Les routes busy-hours / heatmap lisent ces compteurs, jamais les historiques.
+
+def how_of(start: float) -> int: return weekday_of(start) * 24 + hour_of_day(start)
+
+# (heure de la semaine, secondes) couvertes par [start, start + secs)
+def spread(start: float, secs) -> List[Tuple[int, float]]:
+    weeks, rest = divmod(secs, WEEK_SECONDS)
+    parts = [(h, weeks * 3600) for h in range(WEEK_HOURS)] if weeks else []
+    t, end = start, start + rest
+    while t < end:
+        nxt = min(end, (t // 3600 + 1) * 3600)
+        parts.append((how_of(t), nxt - t))
+        t = nxt
+    return parts
+
+class Rollup:
+    __slots__ = ("sessions", "seconds", "started", "occupied")
+
+    def __init__(self):
+        self.sessions = 0
+        self.seconds = 0
+        self.started = array("i", [0]) * WEEK_HOURS
+        self.occupied = array("d", [0]) * WEEK_HOURS
+
+    def add(self, how: Optional[int], parts, secs):
+        self.sessions += 1
+        self.seconds += secs
+        if how is None: return  # Timestamp illisible : totaux seulement
+        self.started[how] += 1
+        occupied = self.occupied
+        for h, s in parts: occupied[h] += s
+
+    def merge(self, other: "Rollup"):
+        self.sessions += other.sessions
+        self.seconds += other.seconds
+        for h in range(WEEK_HOURS):
+            self.started[h] += other.started[h]
+            self.occupied[h] += other.occupied[h]
+
+    # Sessions commencées / secondes occupées sur un jour et/ou une heure (None : tous)
+    def select(self, day: Optional[int] = None, hour: Optional[int] = None) -> Tuple[int, float]:
+        if day is None and hour is None: return self.sessions, self.seconds
+        hours = [d * 24 + hour for d in range(7)] if day is None else \
+            range(day * 24, day * 24 + 24) if hour is None else (day * 24 + hour,)
+        return sum(self.started[h] for h in hours), sum(self.occupied[h] for h in hours)
+
+class Rollups:
+    def __init__(self):
+        self.spot_info: Dict[str, Tuple[str, str]] = {}  # spot -> (catégorie, tuile)
+        self.spots: Dict[str, Rollup] = {}
+        self.categories: Dict[str, Rollup] = {}
+        self.tiles: Dict[Tuple[str, str], Rollup] = {}   # (tuile, catégorie) -> agrégat
+        self.tile_spots: Dict[Tuple[str, str], int] = {}
+        self.category_spots: Dict[str, int] = {}
+        self.first: Optional[float] = None               # Débuts extrêmes (normalisation par semaine)
+        self.last: Optional[float] = None
+
+    # --- CONSTRUCTION ---
+    def build(self, db, sessions: Optional[SessionLog] = None):
+        self.__init__()
+        for s in db.spots: self.add_spot(s.id, s.latitude, s.longitude, s.category)
+        sessions = sessions or SessionLog().build(db)
+        if np is not None: self._build_spots(sessions)
+        else:
+            for _, spot_id, start, secs in sessions.rows():
+                if secs > 0: self._add([self._rollup(self.spots, spot_id)], start, secs)
+        for spot_id, r in self.spots.items():
+            info = self.spot_info.get(spot_id)
+            if not info: continue
+            self._rollup(self.categories, info[0]).merge(r)
+            self._rollup(self.tiles, (info[1], info[0])).merge(r)
+        return self
+
+    # Même répartition que spread(), vectorisée : une ligne par (session, heure couverte)
+    def _build_spots(self, sessions: SessionLog):
+        _, spot, start, dur = sessions._views()
+        m = dur > 0
+        spot, start, dur = spot[m].astype(np.int64), start[m], dur[m].astype(np.int64)
+        n = len(sessions.spots)
+        count = np.bincount(spot, minlength=n)
+        total = np.bincount(spot, weights=dur, minlength=n)
+        dated = ~np.isnan(start)
+        spot, start, dur = spot[dated], start[dated], dur[dated]
+        if len(start):
+            self.first, self.last = float(start.min()), float(start.max())
+        hours = start // 3600
+        how = lambda h: ((h // 24 + 3) % 7 * 24 + h % 24).astype(np.int64)
+        started = np.bincount(spot * WEEK_HOURS + how(hours), minlength=n * WEEK_HOURS).reshape(n, WEEK_HOURS)
+        weeks, rest = np.divmod(dur, WEEK_SECONDS)
+        occupied = np.repeat((np.bincount(spot, weights=weeks, minlength=n) * 3600)[:, None], WEEK_HOURS, axis=1)
+        end = start + rest
+        chunks = np.where(rest > 0, np.ceil(end / 3600) - hours, 0).astype(np.int64)
+        row = np.repeat(np.arange(len(start)), chunks)
+        h = hours[row] + (np.arange(len(row)) - np.repeat(np.cumsum(chunks) - chunks, chunks))
+        secs = np.minimum(end[row], (h + 1) * 3600) - np.maximum(start[row], h * 3600)
+        occupied += np.bincount(spot[row] * WEEK_HOURS + how(h), weights=secs, minlength=n * WEEK_HOURS).reshape(n, WEEK_HOURS)
+        for i in np.flatnonzero(count):
+            r = self.spots[sessions.spots.keys[i]] = Rollup()
+            r.sessions, r.seconds = int(count[i]), int(total[i])
+            r.started = array("i", started[i].astype(np.intc).tobytes())
+            r.occupied = array("d", occupied[i].tobytes())
+
+    def add_spot(self, spot_id, lat, lon, category):
+        if spot_id in self.spot_info: return
+        tile = geohash(lat, lon, TILE_PRECISION)
+        self.spot_info[spot_id] = (category, tile)
+        self.tile_spots[(tile, category)] = self.tile_spots.get((tile, category), 0) + 1
+        self.category_spots[category] = self.category_spots.get(category, 0) + 1
+
+    def _rollup(self, table, key) -> Rollup:
+        r = table.get(key)
+        if r is None: r = table[key] = Rollup()
+        return r
+
+    def _add(self, targets, start: float, secs):
+        dated = start == start  # NaN != NaN
+        how, parts = (how_of(start), spread(start, secs)) if dated else (None, ())
+        for r in targets: r.add(how, parts, secs)
+        if dated:
+            if self.first is None or start < self.first: self.first = start
+            if self.last is None or start > self.last: self.last = start
+
+    def add_session(self, spot_id, start: float, secs):
+        if not secs or secs <= 0: return
+        info = self.spot_info.get(spot_id)
+        targets = [self._rollup(self.spots, spot_id)]
+        if info: targets += [self._rollup(self.categories, info[0]), self._rollup(self.tiles, (info[1], info[0]))]
+        self._add(targets, start, secs)
+
+    # --- ÉVÉNEMENTS ---
+    def on_event(self, op, d):
+        if op == "add_spot": self.add_spot(d["id"], d["latitude"], d["longitude"], d["category"])
+        elif op == "close_log": self.add_session(d["spotId"], epoch_of(d["timestamp"]), d["durationSeconds"])
+
+    # --- REQUÊTES ---
+    # Semaines couvertes par les données (au moins 1) : base des moyennes par heure
+    @property
+    def weeks(self) -> int:
+        if self.first is None: return 1
+        return max(1, math.ceil((self.last - self.first) / WEEK_SECONDS))
+
+    # Grille 7 x 24 : sessions commencées et occupants moyens (secondes / heures observées)
+    def busy_hours(self, r: Optional[Rollup]) -> dict:
+        r = r or Rollup()
+        weeks = self.weeks
+        return {"sessions": r.sessions, "seconds": r.seconds, "weeks": weeks,
+                "started": [r.started[d * 24:d * 24 + 24].tolist() for d in range(7)],
+                "avgOccupants": [[round(r.occupied[d * 24 + h] / (weeks * 3600), 3) for h in range(24)] for d in range(7)]}
+
+    def spot_busy_hours(self, spot_id) -> dict: return self.busy_hours(self.spots.get(spot_id))
+
+    def category_busy_hours(self, category) -> dict:
+        return {"spots": self.category_spots.get(category, 0), **self.busy_hours(self.categories.get(category))}
+
+    # Tuiles (précision <= TILE_PRECISION) triées par secondes occupées décroissantes,
+    # occupants moyens sur les heures retenues (jour et/ou heure, toutes sinon)
+    def heatmap(self, precision: int = 6, categories=None, day: Optional[int] = None, hour: Optional[int] = None) -> List[dict]:
+        cells: Dict[str, list] = {}
+        for (tile, category), n in self.tile_spots.items():
+            if categories and category not in categories: continue
+            c = cells.setdefault(tile[:precision], [0, 0, 0])
+            c[2] += n
+            r = self.tiles.get((tile, category))
+            if r is None: continue
+            sessions, seconds = r.select(day, hour)
+            c[0] += sessions
+            c[1] += seconds
+        hours = self.weeks * (WEEK_HOURS if day is None and hour is None else 24 if hour is None else 7 if day is None else 1)
+        out = []
+        for tile, (sessions, seconds, spots) in cells.items():
+            lat0, lon0, lat1, lon1 = geohash_bounds(tile)
+            out.append({"tile": tile, "lat": round((lat0 + lat1) / 2, 6), "lon": round((lon0 + lon1) / 2, 6),
+                        "bounds": [lat0, lon0, lat1, lon1], "spots": spots, "sessions": sessions,
+                        "seconds": int(seconds), "avgOccupants": round(seconds / (hours * 3600), 3)})
+        out.sort(key=lambda c: (-c["seconds"], c["tile"]))
+        return out
@@ -0,0 +1,191 @@
+import heapq
+import math
+import re
+import unicodedata
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Set, Tuple
+
+from sessions import Interner
+
+FIELD_WEIGHTS = {"name": 3.0, "category": 2.0, "description": 1.0}
+REVIEW_WEIGHT = 0.3        # x log(1 + avis du spot contenant le terme) : un nom l'emporte sur 100 avis
+PREFIX_DISCOUNT = 0.8      # Terme complété (dernier mot de la requête) : un peu moins qu'un mot exact
+PREFIX_EXPANSION = 50      # Complétions retenues par requête (les plus répandues)
+STOPWORDS = {"au", "aux", "avec", "ce", "ces", "dans", "de", "des", "du", "en", "et", "il", "la", "le", "les",
+             "leur", "mais", "ou", "par", "pas", "pour", "qui", "que", "sa", "se", "son", "sur", "un", "une"}
+WORD = re.compile(r"\w+")
+LIGATURES = str.maketrans({"œ": "oe", "æ": "ae"})
+
+# --- RECHERCHE PLEIN TEXTE ---
+# Index inversé terme -> spots, sur le nom, la catégorie, la description et
+# les commentaires des avis. Les termes sont repliés (minuscules, sans accents ni
+# ligatures : "Église" et "eglise" se confondent). Les champs du spot pèsent
+# selon FIELD_WEIGHTS ; les avis comptent à part (nombre d'avis contenant le
+# terme, amorti en log) pour qu'un spot très commenté ne noie pas les noms.
+# Requête = ET des mots ; le dernier est aussi complété (autocomplétion) par
+# préfixe dans le vocabulaire trié. Score = somme des idf x poids. Seules les
+# listes des termes de la requête sont lues, jamais tous les spots.
+# add_spot / add_review indexent au fil des événements.
+
+def fold(word: str) -> str:
+    if word.isascii(): return word.lower()
+    word = unicodedata.normalize("NFKD", word.casefold().translate(LIGATURES))
+    return "".join(c for c in word if not unicodedata.combining(c))
+
+class SearchIndex:
+    def __init__(self):
+        self.spots = Interner()
+        self.info: List[tuple] = []                      # ligne -> (nom, catégorie, latitude, longitude)
+        self.fields: Dict[str, Dict[int, float]] = {}    # terme -> {spot: poids des champs}
+        self.reviews: Dict[str, Dict[int, int]] = {}     # terme -> {spot: avis contenant le terme}
+        self.terms: List[str] = []                       # Vocabulaire trié (préfixes)
+        self.display: Dict[str, str] = {}                # terme -> première forme rencontrée ("église")
+        self.folded: Dict[str, str] = {}                 # mot en minuscules -> terme
+        self.ranked: Dict[str, List[Tuple[float, int]]] = {}  # terme -> (-impact, spot) triés, créé à la première requête
+
+    # Mots utiles d'un texte : (terme replié, forme d'origine en minuscules)
+    def words(self, text: str):
+        seen = set()
+        for word in WORD.findall(text.lower()):
+            term = self.folded.get(word)
+            if term is None: term = self.folded[word] = fold(word)
+            if len(term) < 2 or term in STOPWORDS or term in seen: continue
+            seen.add(term)
+            yield term, word
+
+    def tokens(self, text: str) -> List[str]: return [t for t, _ in self.words(text)]
+
+    # --- CONSTRUCTION ---
+    def build(self, spots):
+        self.__init__()
+        new: Set[str] = set()
+        for s in spots:
+            self.add_spot(s.id, s.name, s.description, s.category, s.latitude, s.longitude, new)
+            r = self.spots.index[s.id]
+            for rv in s.reviews: self.add_comment(r, rv.comment, new)
+        self.terms = sorted(new)
+        return self
+
+    def _term(self, term, word, new: Optional[Set[str]]):
+        if term in self.display: return
+        self.display[term] = word
+        if new is not None: new.add(term)
+        else: insort(self.terms, term)
+
+    def add_spot(self, spot_id, name, description, category, lat, lon, new: Optional[Set[str]] = None):
+        if spot_id in self.spots.index: return
+        r = self.spots.get(spot_id)
+        self.info.append((name, category, lat, lon))
+        for field, text in (("name", name), ("category", category), ("description", description)):
+            weight = FIELD_WEIGHTS[field]
+            for term, word in self.words(text or ""):
+                self._term(term, word, new)
+                old = self.impact(term, r) if term in self.ranked else None
+                docs = self.fields.setdefault(term, {})
+                docs[r] = docs.get(r, 0) + weight
+                if old is not None: self._rerank(term, r, old)
+
+    def add_comment(self, r, comment, new: Optional[Set[str]] = None):
+        for term, word in self.words(comment or ""):
+            self._term(term, word, new)
+            old = self.impact(term, r) if term in self.ranked else None
+            docs = self.reviews.setdefault(term, {})
+            docs[r] = docs.get(r, 0) + 1
+            if old is not None: self._rerank(term, r, old)
+
+    # Liste triée du terme (déjà demandée par une requête) : l'entrée du spot change de place
+    def _rerank(self, term, r, old):
+        ranked = self.ranked[term]
+        if old: del ranked[bisect_left(ranked, (-old, r))]
+        insort(ranked, (-self.impact(term, r), r))
+
+    # --- ÉVÉNEMENTS ---
+    def on_event(self, op, d):
+        if op == "add_spot":
+            self.add_spot(d["id"], d["name"], d["description"], d["category"], d["latitude"], d["longitude"])
+            for rv in d.get("reviews") or (): self.add_comment(self.spots.index[d["id"]], rv["comment"])
+        elif op == "add_review":
+            r = self.spots.index.get(d["spotId"])
+            if r is not None: self.add_comment(r, d["review"]["comment"])
+
+    # --- REQUÊTES ---
+    def df(self, term) -> int: return len(self.fields.get(term, ())) + len(self.reviews.get(term, ()))
+
+    # Poids du terme pour un spot (0 : absent)
+    def impact(self, term, r) -> float:
+        fields, reviews = self.fields.get(term), self.reviews.get(term)
+        return (fields.get(r, 0) if fields else 0) + (REVIEW_WEIGHT * math.log1p(reviews.get(r, 0)) if reviews else 0)
+
+    # Spots du terme par poids décroissant (égalités : ordre d'ajout)
+    def _ranked(self, term) -> List[Tuple[float, int]]:
+        ranked = self.ranked.get(term)
+        if ranked is None:
+            docs = self.fields.get(term, {}).keys() | self.reviews.get(term, {}).keys()
+            ranked = self.ranked[term] = sorted((-self.impact(term, r), r) for r in docs)
+        return ranked
+
+    # Termes du vocabulaire qui commencent par prefix, les plus répandus d'abord
+    def complete(self, prefix, limit=PREFIX_EXPANSION) -> List[str]:
+        i = bisect_left(self.terms, prefix)
+        found = []
+        while i < len(self.terms) and self.terms[i].startswith(prefix):
+            found.append(self.terms[i])
+            i += 1
+        return heapq.nsmallest(limit, found, key=lambda t: (-self.df(t), t))
+
+    # Suggestions : la requête dont le dernier mot est complété (forme accentuée d'origine)
+    def autocomplete(self, q, limit=10) -> List[str]:
+        words = WORD.findall(q.lower())
+        if not words: return []
+        head = " ".join(words[:-1])
+        return [(head + " " if head else "") + self.display[t] for t in self.complete(fold(words[-1]), limit)]
+
+    def search(self, q, limit=20, categories=None, prefix=True) -> List[dict]:
+        terms = self.tokens(q)
+        if not terms: return []
+        n = max(1, len(self.spots))
+        groups = []  # Par mot de la requête : [(terme, poids)] (mot exact, complétions)
+        for i, term in enumerate(terms):
+            group = [(term, 1.0)] if term in self.display else []
+            if prefix and i == len(terms) - 1:
+                group += [(t, PREFIX_DISCOUNT) for t in self.complete(term) if t != term]
+            if not group: return []
+            groups.append([(t, w * math.log(1 + n / self.df(t))) for t, w in group])
+
+        # Algorithme à seuil : chaque mot de la requête donne une liste de spots par
+        # contribution décroissante (complétions fusionnées). On les lit en parallèle,
+        # chaque nouveau spot est noté en entier (ET : tous les mots doivent le
+        # trouver) ; on s'arrête quand le k-ième score atteint la somme des
+        # contributions courantes, plafond de tout spot encore non lu. Une liste
+        # épuisée : tous les spots qui ont ce mot ont été vus.
+        lists = [heapq.merge(*(((neg * w, r) for neg, r in self._ranked(t)) for t, w in g)) for g in groups]
+        bounds = [math.inf] * len(groups)
+        seen: Set[int] = set()
+        best: List[Tuple[float, int]] = []  # tas min des (score, -spot)
+        while True:
+            for i, it in enumerate(lists):
+                entry = next(it, None)
+                if entry is None: return self._rows(best)
+                bounds[i] = -entry[0]
+                r = entry[1]
+                if r in seen: continue
+                seen.add(r)
+                if categories and self.info[r][1] not in categories: continue
+                score = 0.0
+                for g in groups:
+                    # Plusieurs complétions d'un même mot : la meilleure seulement
+                    part = max(w * self.impact(t, r) for t, w in g)
+                    if not part: break
+                    score += part
+                else:
+                    if len(best) < limit: heapq.heappush(best, (score, -r))
+                    elif (score, -r) > best[0]: heapq.heapreplace(best, (score, -r))
+            if len(best) == limit and best[0][0] >= sum(bounds): return self._rows(best)
+
+    def _rows(self, best) -> List[dict]:
+        out = []
+        for score, r in sorted(best, reverse=True):
+            name, category, lat, lon = self.info[-r]
+            out.append({"spotId": self.spots.keys[-r], "name": name, "category": category,
+                        "latitude": lat, "longitude": lon, "score": round(score, 4)})
+        return out
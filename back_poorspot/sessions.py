@@ -0,0 +1,186 @@
+from array import array
+from datetime import datetime
+from typing import Dict, List
+
+try: import numpy as np
+except ImportError: np = None  # Requêtes en Python pur (plus lentes, mêmes résultats)
+
+EPOCH = datetime(1970, 1, 1)
+
+# --- JOURNAL DES SESSIONS EN COLONNES ---
+# Toutes les sessions dans quatre colonnes array (utilisateur, spot, début,
+# durée) : ~20 octets par session au lieu d'un CheckInLog complet. Les id
+# d'utilisateurs et de spots (et les noms de spots) sont internés dans des
+# tables, et chaque timestamp ISO n'est parsé qu'une fois, à l'ajout.
+# Le début est en secondes "heure locale" depuis 1970 (timestamps naïfs) :
+# l'heure du jour se lit directement, sans fuseau.
+# Durée 0 = session ouverte (ou vide) : ignorée par les requêtes.
+
+def epoch_of(timestamp) -> float:
+    if isinstance(timestamp, datetime): dt = timestamp
+    else:
+        try: dt = datetime.fromisoformat(timestamp)
+        except (TypeError, ValueError): return float("nan")  # Hors de toute fenêtre
+    return (dt.replace(tzinfo=None) - EPOCH).total_seconds()
+
+def hour_of_day(start: float) -> int: return int(start // 3600) % 24
+
+def weekday_of(start: float) -> int: return (int(start // 86400) + 3) % 7  # 01/01/1970 : jeudi
+
+class Interner:
+    def __init__(self):
+        self.keys: List[str] = []
+        self.index: Dict[str, int] = {}
+
+    def __len__(self): return len(self.keys)
+
+    def get(self, key) -> int:
+        i = self.index.get(key)
+        if i is None:
+            i = self.index[key] = len(self.keys)
+            self.keys.append(key)
+        return i
+
+class SessionLog:
+    def __init__(self):
+        self.users = Interner()
+        self.spots = Interner()
+        self.spot_names: List[str] = []
+        self.user_col = array("i")
+        self.spot_col = array("i")
+        self.start_col = array("d")
+        self.duration_col = array("i")
+        self.open_rows: Dict[int, int] = {}  # utilisateur -> ligne de la session en cours
+
+    def __len__(self): return len(self.user_col)
+
+    @property
+    def nbytes(self) -> int: return sum(c.itemsize * len(c) for c in (self.user_col, self.spot_col, self.start_col, self.duration_col))
+
+    # --- CONSTRUCTION ---
+    def build(self, db):
+        self.__init__()
+        # Utilisateurs internés dans l'ordre d'inscription (départage des classements)
+        for u in db.users: self.users.get(u.id)
+        for s in db.spots: self._spot(s.id, s.name)
+        for u in db.users:
+            for log in u.history: self.add(u.id, log.spotId, log.spotName, log.timestamp, log.durationSeconds)
+        return self
+
+    def _spot(self, spot_id, name) -> int:
+        i = self.spots.get(spot_id)
+        if i == len(self.spot_names): self.spot_names.append(name)
+        return i
+
+    def add(self, user_id, spot_id, spot_name, timestamp, duration) -> int:
+        u = self.users.get(user_id)
+        self.user_col.append(u)
+        self.spot_col.append(self._spot(spot_id, spot_name))
+        self.start_col.append(epoch_of(timestamp))
+        self.duration_col.append(duration or 0)
+        row = len(self.user_col) - 1
+        if not duration: self.open_rows[u] = row
+        else: self.open_rows.pop(u, None)
+        return row
+
+    def on_event(self, op, d):
+        if op == "add_user": self.users.get(d["id"])
+        elif op == "add_spot": self._spot(d["id"], d["name"])
+        elif op == "open_log":
+            log = d["log"]
+            self.add(d["userId"], log["spotId"], log["spotName"], log["timestamp"], log["durationSeconds"])
+        elif op == "close_log": self.close(d["userId"], d["spotId"], d["timestamp"], d["durationSeconds"])
+
+    def close(self, user_id, spot_id, timestamp, duration):
+        u, s, start = self.users.get(user_id), self.spots.get(spot_id), epoch_of(timestamp)
+        row = self.open_rows.get(u)
+        if row is None or self.spot_col[row] != s or self.start_col[row] != start:
+            # Session qui n'est plus la dernière : recherche depuis la fin
+            row = next((r for r in range(len(self.user_col) - 1, -1, -1)
+                        if self.user_col[r] == u and self.spot_col[r] == s and self.start_col[r] == start), None)
+            if row is None: return
+        self.duration_col[row] = duration or 0
+        if duration and self.open_rows.get(u) == row: del self.open_rows[u]
+
+    # (user_id, spot_id, début, durée) dans l'ordre d'ajout (chronologique par utilisateur)
+    def rows(self):
+        users, spots = self.users.keys, self.spots.keys
+        for u, s, start, dur in zip(self.user_col, self.spot_col, self.start_col, self.duration_col):
+            yield users[u], spots[s], start, dur
+
+    # --- REQUÊTES VECTORISÉES ---
+    # Vues NumPy sans copie sur les colonnes : à ne jamais garder au-delà de la
+    # requête (une colonne exportée ne peut plus grandir).
+    def _views(self):
+        n = len(self.user_col)
+        return (np.frombuffer(self.user_col, dtype=np.intc, count=n), np.frombuffer(self.spot_col, dtype=np.intc, count=n),
+                np.frombuffer(self.start_col, dtype=np.float64, count=n), np.frombuffer(self.duration_col, dtype=np.intc, count=n))
+
+    # dated : exclure les timestamps illisibles (requêtes par heure)
+    def _mask(self, start, dur, since, until, dated=False):
+        m = dur > 0
+        if dated: m &= ~np.isnan(start)
+        if since is not None: m &= start >= epoch_of(since)
+        if until is not None: m &= start < epoch_of(until)
+        return m
+
+    def _selected(self, since, until, dated=False):
+        lo = epoch_of(since) if since is not None else None
+        hi = epoch_of(until) if until is not None else None
+        for u, s, start, dur in zip(self.user_col, self.spot_col, self.start_col, self.duration_col):
+            if dur <= 0 or (dated and start != start): continue  # NaN != NaN
+            if (lo is None or start >= lo) and (hi is None or start < hi): yield u, s, start, dur
+
+    # Secondes cumulées par utilisateur sur [since, until)
+    def user_totals(self, since=None, until=None) -> Dict[str, int]:
+        if np is not None:
+            u, _, start, dur = self._views()
+            m = self._mask(start, dur, since, until)
+            totals = np.bincount(u[m], weights=dur[m], minlength=len(self.users))
+            return {self.users.keys[i]: int(totals[i]) for i in np.flatnonzero(totals)}
+        totals: Dict[int, int] = {}
+        for u, _, _, dur in self._selected(since, until): totals[u] = totals.get(u, 0) + dur
+        return {self.users.keys[u]: t for u, t in totals.items()}
+
+    # Sessions et secondes d'occupation par spot sur [since, until)
+    def spot_occupancy(self, since=None, until=None) -> Dict[str, dict]:
+        if np is not None:
+            _, s, start, dur = self._views()
+            m = self._mask(start, dur, since, until)
+            counts = np.bincount(s[m], minlength=len(self.spots))
+            seconds = np.bincount(s[m], weights=dur[m], minlength=len(self.spots))
+            return {self.spots.keys[i]: {"sessions": int(counts[i]), "seconds": int(seconds[i])} for i in np.flatnonzero(counts)}
+        occ: Dict[int, List[int]] = {}
+        for _, s, _, dur in self._selected(since, until):
+            o = occ.setdefault(s, [0, 0])
+            o[0] += 1
+            o[1] += dur
+        return {self.spots.keys[s]: {"sessions": o[0], "seconds": o[1]} for s, o in occ.items()}
+
+    # Histogramme des débuts de session par heure (0-23) et par spot
+    def spot_hour_histogram(self, since=None, until=None) -> Dict[str, List[int]]:
+        if np is not None:
+            _, s, start, dur = self._views()
+            m = self._mask(start, dur, since, until, dated=True)
+            hours = (start[m] // 3600).astype(np.int64) % 24
+            grid = np.bincount(s[m].astype(np.int64) * 24 + hours, minlength=len(self.spots) * 24).reshape(-1, 24)
+            return {self.spots.keys[i]: grid[i].tolist() for i in np.flatnonzero(grid.any(axis=1))}
+        hist: Dict[int, List[int]] = {}
+        for _, s, start, _ in self._selected(since, until, dated=True): hist.setdefault(s, [0] * 24)[hour_of_day(start)] += 1
+        return {self.spots.keys[s]: h for s, h in hist.items()}
+
+    # Nombre de sessions par heure de début (0-23), éventuellement pour un spot ou un utilisateur
+    def hour_counts(self, since=None, until=None, spot_id=None, user_id=None) -> List[int]:
+        si = self.spots.index.get(spot_id) if spot_id is not None else None
+        ui = self.users.index.get(user_id) if user_id is not None else None
+        if (spot_id is not None and si is None) or (user_id is not None and ui is None): return [0] * 24
+        if np is not None:
+            u, s, start, dur = self._views()
+            m = self._mask(start, dur, since, until, dated=True)
+            if si is not None: m &= s == si
+            if ui is not None: m &= u == ui
+            return np.bincount((start[m] // 3600).astype(np.int64) % 24, minlength=24).tolist()
+        counts = [0] * 24
+        for u, s, start, _ in self._selected(since, until, dated=True):
+            if (si is None or s == si) and (ui is None or u == ui): counts[hour_of_day(start)] += 1
+        return counts
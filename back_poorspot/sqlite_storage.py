@@ -0,0 +1,422 @@
+import json
+import sqlite3
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+from uuid import uuid4
+
+from metrics import timed
+from models import CheckInLog, User, Review, Spot, SpotSummary, ReviewPage, Database
+from storage import FileLock, Storage, read_database
+
+# --- MOTEUR SQLITE (stdlib uniquement) ---
+# Même interface que JsonStore, mais chaque lecture est une requête indexée
+# au lieu d'un parcours complet des listes.
+# L'ordre des listes (history, reviews : plus récent en tête) est porté par
+# le rowid : on relit en ORDER BY rowid DESC.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    name_lower TEXT NOT NULL,
+    password_hash TEXT NOT NULL,
+    attributes TEXT NOT NULL DEFAULT '[]',
+    favorites TEXT NOT NULL DEFAULT '[]',
+    createdAt TEXT NOT NULL,
+    points INTEGER NOT NULL DEFAULT 0,
+    achievements TEXT NOT NULL DEFAULT '[]'
+);
+CREATE INDEX IF NOT EXISTS idx_users_name_lower ON users(name_lower);
+
+CREATE TABLE IF NOT EXISTS spots (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    description TEXT NOT NULL,
+    latitude REAL NOT NULL,
+    longitude REAL NOT NULL,
+    category TEXT NOT NULL,
+    createdAt TEXT NOT NULL,
+    createdBy TEXT NOT NULL,
+    currentActiveUsers INTEGER NOT NULL DEFAULT 0,
+    review_count INTEGER NOT NULL DEFAULT 0,
+    sum_revenue REAL NOT NULL DEFAULT 0,
+    sum_security REAL NOT NULL DEFAULT 0,
+    sum_traffic REAL NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS reviews (
+    spot_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    authorName TEXT NOT NULL,
+    ratingRevenue REAL NOT NULL,
+    ratingSecurity REAL NOT NULL,
+    ratingTraffic REAL NOT NULL,
+    attribute TEXT NOT NULL,
+    comment TEXT NOT NULL,
+    createdAt TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_reviews_spot ON reviews(spot_id);
+CREATE INDEX IF NOT EXISTS idx_reviews_author ON reviews(authorName);
+
+CREATE TABLE IF NOT EXISTS logs (
+    user_id TEXT NOT NULL,
+    spotId TEXT NOT NULL,
+    spotName TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    durationSeconds INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_logs_user ON logs(user_id);
+CREATE INDEX IF NOT EXISTS idx_logs_timestamp ON logs(timestamp);
+
+CREATE TABLE IF NOT EXISTS changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    origin TEXT NOT NULL,
+    op TEXT NOT NULL,
+    data TEXT NOT NULL,
+    at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+USER_COLS = "id, name, password_hash, attributes, favorites, createdAt, points, achievements"
+SPOT_COLS = "id, name, description, latitude, longitude, category, createdAt, createdBy, currentActiveUsers"
+REVIEW_COLS = "id, authorName, ratingRevenue, ratingSecurity, ratingTraffic, attribute, comment, createdAt"
+LOG_COLS = "spotId, spotName, timestamp, durationSeconds"
+# Agrégats de notes tenus dans la table spots (pour /spots/summary sans lire les avis)
+RATING_COLS = {"review_count": "COUNT(*)", "sum_revenue": "SUM(ratingRevenue)", "sum_security": "SUM(ratingSecurity)", "sum_traffic": "SUM(ratingTraffic)"}
+
+# Mode partagé (plusieurs workers sur la même base, voir cluster.py) :
+# - chaque lot de l'écrivain prend d'abord un flock (db.sqlite3.lock) puis
+#   BEGIN IMMEDIATE, relâchés au commit : un seul processus écrit à la fois,
+#   sans que l'attente bloque la boucle (le flock s'attend dans un thread) ;
+# - chaque mutation ajoute (op, data) à la table changes dans sa transaction :
+#   les autres workers la rejouent sur leurs index en mémoire, dans l'ordre seq.
+BUSY_TIMEOUT = 30.0
+
+class SqliteStore(Storage):
+    transactional = True
+
+    def __init__(self, path: str, shared: bool = False):
+        super().__init__()
+        self.path = path
+        self.shared = shared
+        self.origin = uuid4().hex  # Ce processus, dans la table changes
+        self.write_lock = FileLock(path + ".lock") if shared else None
+        self.data_version = None
+        self.last_seq = 0  # Dernier changement du journal partagé appliqué aux index (écrit ici ou rejoué)
+        self.conn: Optional[sqlite3.Connection] = None
+
+    def load(self):
+        self.conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._upgrade_schema()
+        return self
+
+    def _upgrade_schema(self):
+        # Bases créées avant les colonnes d'agrégats : ajout + recalcul unique
+        cols = {r["name"] for r in self.conn.execute("PRAGMA table_info(spots)")}
+        missing = [c for c in RATING_COLS if c not in cols]
+        if not missing: return
+        with self.conn:
+            for c in missing: self.conn.execute(f"ALTER TABLE spots ADD COLUMN {c} {'INTEGER' if c == 'review_count' else 'REAL'} NOT NULL DEFAULT 0")
+            sets = ", ".join(f"{c} = (SELECT COALESCE({agg}, 0) FROM reviews WHERE spot_id = spots.id)" for c, agg in RATING_COLS.items())
+            self.conn.execute(f"UPDATE spots SET {sets}")
+
+    def close(self):
+        if self.conn:
+            self.flush()
+            self.conn.close()
+            self.conn = None
+
+    # Hors lot : une transaction par mutation. En lot : un point de sauvegarde
+    # par mutation (annulable seule) dans une transaction validée au flush().
+    @contextmanager
+    def _tx(self):
+        if not self.grouped:
+            with self.conn: yield
+            return
+        if not self.conn.in_transaction: self.conn.execute("BEGIN")
+        self.conn.execute("SAVEPOINT op")
+        try: yield
+        except BaseException:
+            self.conn.execute("ROLLBACK TO op")
+            self.conn.execute("RELEASE op")
+            raise
+        self.conn.execute("RELEASE op")
+
+    # Commit du lot ; en échec, tout le lot est annulé (l'écrivain reconstruit les index)
+    @timed("store.flush")
+    def flush(self):
+        try:
+            with self.lock:
+                if self.conn and self.conn.in_transaction:
+                    try: self.conn.commit()
+                    except BaseException:
+                        if self.conn.in_transaction: self.conn.rollback()
+                        raise
+        finally:
+            if self.write_lock: self.write_lock.release()
+
+    # Appelé dans un thread par l'écrivain : l'attente du flock ne bloque pas la boucle
+    def begin(self):
+        if not self.shared: return
+        self.write_lock.acquire()
+        with self.lock:
+            if not self.conn.in_transaction: self.conn.execute("BEGIN IMMEDIATE")
+
+    # Point de sauvegarde autour d'un job : une exception après quelques mutations
+    # les annule toutes, les points "op" de chaque mutation y sont imbriqués
+    def begin_job(self):
+        if not self.grouped: return
+        with self.lock:
+            if not self.conn.in_transaction: self.conn.execute("BEGIN")
+            self.conn.execute("SAVEPOINT job")
+
+    def end_job(self, ok: bool):
+        if not self.grouped: return
+        with self.lock:
+            if not ok: self.conn.execute("ROLLBACK TO job")
+            self.conn.execute("RELEASE job")
+
+    def record(self, op, data):
+        if not self.shared: return
+        with self.lock, self._tx(): self._append_change(op, data)
+        self.mutations += 1
+
+    def _append_change(self, op, data):
+        self.last_seq = self.conn.execute("INSERT INTO changes (origin, op, data, at) VALUES (?, ?, ?, ?)", (self.origin, op, json.dumps(data), time.time())).lastrowid
+
+    # --- JOURNAL PARTAGÉ (mode partagé) ---
+    def change_head(self) -> int:
+        with self.lock: return self.conn.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+
+    # Changements des autres processus après seq : (nouveau seq, [(seq, op, data)]).
+    # PRAGMA data_version ne bouge que si une autre connexion a validé : le cas
+    # courant (rien de neuf) ne coûte aucune lecture de table.
+    def changes_since(self, seq: int):
+        with self.lock:
+            version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+            if version == self.data_version and not self.conn.in_transaction: return seq, []
+            rows = self.conn.execute("SELECT seq, origin, op, data FROM changes WHERE seq > ? ORDER BY seq", (seq,)).fetchall()
+            self.data_version = version
+        if rows: seq = rows[-1]["seq"]
+        return seq, [(r["seq"], r["op"], json.loads(r["data"])) for r in rows if r["origin"] != self.origin]
+
+    # Changement d'un autre processus : déjà en base, seuls les index abonnés sont à jour
+    def replay(self, op, data):
+        with self.lock: self._emit(op, data)
+
+    def prune_changes(self, before: float):
+        with self.lock, self._tx(): self.conn.execute("DELETE FROM changes WHERE at < ?", (before,))
+
+    # Valeur partagée entre processus, créée par le premier qui la demande
+    def setting(self, key, make) -> str:
+        with self.lock, self._tx():
+            self.conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES (?, ?)", (key, make()))
+            return self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()[0]
+
+    def put_setting(self, key, value):
+        with self.lock, self._tx(): self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def database(self) -> Database:
+        with self.lock:
+            return Database.model_construct(users=self.users, spots=self.spots)
+
+    # --- LECTURES ---
+    # Lignes filles (historique, avis) groupées par parent : une requête pour
+    # toute la table (listes complètes) ou pour un seul parent.
+    # rowid DESC = ordre JSON (plus récent en tête) : le modèle le remet en chronologique
+    def _children(self, table, cols, key, parent=None) -> Dict[str, List[dict]]:
+        where, args = (f"WHERE {key} = ?", (parent,)) if parent is not None else ("", ())
+        groups = defaultdict(list)
+        for r in self.conn.execute(f"SELECT {key}, {cols} FROM {table} {where} ORDER BY rowid DESC", args):
+            d = dict(r)
+            groups[d.pop(key)].append(d)
+        return groups
+
+    def _user(self, row, logs: List[dict]) -> User:
+        return User(
+            id=row["id"], name=row["name"], password_hash=row["password_hash"],
+            attributes=json.loads(row["attributes"]), favorites=json.loads(row["favorites"]),
+            history=[CheckInLog(**l) for l in logs],
+            createdAt=row["createdAt"], points=row["points"], achievements=json.loads(row["achievements"]),
+        )
+
+    def _spot(self, row, reviews: List[dict]) -> Spot:
+        return Spot(**dict(row), reviews=[Review(**r) for r in reviews])
+
+    def _one_user(self, row) -> Optional[User]:
+        if not row: return None
+        return self._user(row, self._children("logs", LOG_COLS, "user_id", row["id"])[row["id"]])
+
+    @property
+    def users(self) -> List[User]:
+        with self.lock:
+            logs = self._children("logs", LOG_COLS, "user_id")
+            return [self._user(r, logs[r["id"]]) for r in self.conn.execute(f"SELECT {USER_COLS} FROM users ORDER BY rowid")]
+
+    @property
+    def spots(self) -> List[Spot]:
+        with self.lock:
+            reviews = self._children("reviews", REVIEW_COLS, "spot_id")
+            return [self._spot(r, reviews[r["id"]]) for r in self.conn.execute(f"SELECT {SPOT_COLS} FROM spots ORDER BY rowid")]
+
+    def get_user(self, user_id) -> Optional[User]:
+        with self.lock:
+            return self._one_user(self.conn.execute(f"SELECT {USER_COLS} FROM users WHERE id = ?", (user_id,)).fetchone())
+
+    def get_spot(self, spot_id) -> Optional[Spot]:
+        with self.lock:
+            row = self.conn.execute(f"SELECT {SPOT_COLS} FROM spots WHERE id = ?", (spot_id,)).fetchone()
+            return self._spot(row, self._children("reviews", REVIEW_COLS, "spot_id", spot_id)[spot_id]) if row else None
+
+    def find_user_by_name(self, name) -> Optional[User]:
+        with self.lock:
+            return self._one_user(self.conn.execute(f"SELECT {USER_COLS} FROM users WHERE name_lower = ? LIMIT 1", (name.lower(),)).fetchone())
+
+    def open_session(self, user_id) -> Optional[CheckInLog]:
+        with self.lock:
+            row = self.conn.execute(f"SELECT {LOG_COLS} FROM logs WHERE user_id = ? ORDER BY rowid DESC LIMIT 1", (user_id,)).fetchone()
+            return CheckInLog(**dict(row)) if row and not row["durationSeconds"] else None
+
+    def spot_summaries(self) -> List[SpotSummary]:
+        with self.lock:
+            rows = self.conn.execute("SELECT id, name, latitude, longitude, category, review_count, sum_revenue, sum_security, sum_traffic FROM spots ORDER BY rowid")
+            return [SpotSummary(
+                id=r["id"], name=r["name"], latitude=r["latitude"], longitude=r["longitude"], category=r["category"], reviewCount=r["review_count"],
+                avgRevenue=r["sum_revenue"] / r["review_count"] if r["review_count"] else 0,
+                avgSecurity=r["sum_security"] / r["review_count"] if r["review_count"] else 0,
+                avgTraffic=r["sum_traffic"] / r["review_count"] if r["review_count"] else 0,
+            ) for r in rows]
+
+    def reviews_page(self, spot_id, cursor: Optional[str], limit: int) -> Optional[ReviewPage]:
+        with self.lock:
+            row = self.conn.execute("SELECT review_count FROM spots WHERE id = ?", (spot_id,)).fetchone()
+            if not row: return None
+            # Curseur = rowid du dernier avis renvoyé (index idx_reviews_spot + rowid).
+            # Une ligne de plus que demandé : sans elle, pas de page suivante (même règle qu'en JSON)
+            rows = self.conn.execute(
+                f"SELECT rowid, {REVIEW_COLS} FROM reviews WHERE spot_id = ? AND rowid < ? ORDER BY rowid DESC LIMIT ?",
+                (spot_id, int(cursor) if cursor else sys.maxsize, limit + 1),
+            ).fetchall()
+            more = len(rows) > limit
+            rows = rows[:limit]
+            items = [Review(**{k: r[k] for k in r.keys() if k != "rowid"}) for r in rows]
+            nxt = str(rows[-1]["rowid"]) if more else None
+            return ReviewPage(items=items, nextCursor=nxt, total=row["review_count"])
+
+    # --- MUTATIONS ---
+    def _insert_user(self, u: User):
+        self.conn.execute(
+            "INSERT INTO users (id, name, name_lower, password_hash, attributes, favorites, createdAt, points, achievements) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (u.id, u.name, u.name.lower(), u.password_hash, json.dumps(u.attributes), json.dumps(u.favorites), u.createdAt, u.points, json.dumps(u.achievements)),
+        )
+        # Stockés du plus ancien au plus récent (ordre de u.history) : rowid DESC redonne l'ordre de l'API
+        self.conn.executemany(
+            f"INSERT INTO logs (user_id, {LOG_COLS}) VALUES (?, ?, ?, ?, ?)",
+            [(u.id, l.spotId, l.spotName, l.timestamp, l.durationSeconds) for l in u.history],
+        )
+
+    def _insert_spot(self, s: Spot):
+        self.conn.execute(
+            f"INSERT INTO spots ({SPOT_COLS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (s.id, s.name, s.description, s.latitude, s.longitude, s.category, s.createdAt, s.createdBy, s.currentActiveUsers),
+        )
+        for r in reversed(s.reviews): self._insert_review(s.id, r)
+
+    def _insert_review(self, spot_id, r: Review):
+        self.conn.execute(
+            f"INSERT INTO reviews (spot_id, {REVIEW_COLS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (spot_id, r.id, r.authorName, r.ratingRevenue, r.ratingSecurity, r.ratingTraffic, r.attribute, r.comment, r.createdAt),
+        )
+        self.conn.execute(
+            "UPDATE spots SET review_count = review_count + 1, sum_revenue = sum_revenue + ?, sum_security = sum_security + ?, sum_traffic = sum_traffic + ? WHERE id = ?",
+            (r.ratingRevenue, r.ratingSecurity, r.ratingTraffic, spot_id),
+        )
+
+    def _update_list(self, user_id, column, fn):
+        row = self.conn.execute(f"SELECT {column} FROM users WHERE id = ?", (user_id,)).fetchone()
+        if row: self.conn.execute(f"UPDATE users SET {column} = ? WHERE id = ?", (json.dumps(fn(json.loads(row[0]))), user_id))
+
+    # Écriture + entrée du journal partagé dans la même transaction, puis index abonnés
+    def _mutate(self, op, data, write):
+        with self.lock:
+            with self._tx():
+                write()
+                if self.shared: self._append_change(op, data)
+            self._emit(op, data)
+
+    def add_user(self, user: User) -> User:
+        self._mutate("add_user", user.model_dump(), lambda: self._insert_user(user))
+        return user
+
+    def set_attributes(self, user_id, attributes):
+        self._mutate("set_attributes", {"userId": user_id, "attributes": attributes},
+                     lambda: self.conn.execute("UPDATE users SET attributes = ? WHERE id = ?", (json.dumps(attributes), user_id)))
+
+    def add_favorite(self, user_id, spot_id):
+        self._mutate("add_favorite", {"userId": user_id, "spotId": spot_id},
+                     lambda: self._update_list(user_id, "favorites", lambda favs: favs if spot_id in favs else favs + [spot_id]))
+
+    def remove_favorite(self, user_id, spot_id):
+        self._mutate("remove_favorite", {"userId": user_id, "spotId": spot_id},
+                     lambda: self._update_list(user_id, "favorites", lambda favs: [f for f in favs if f != spot_id]))
+
+    def open_log(self, user_id, log: CheckInLog):
+        self._mutate("open_log", {"userId": user_id, "log": log.model_dump()},
+                     lambda: self.conn.execute(f"INSERT INTO logs (user_id, {LOG_COLS}) VALUES (?, ?, ?, ?, ?)", (user_id, log.spotId, log.spotName, log.timestamp, log.durationSeconds)))
+
+    def close_log(self, user_id, log: CheckInLog, duration: int):
+        self._mutate("close_log", {"userId": user_id, "spotId": log.spotId, "timestamp": log.timestamp, "durationSeconds": duration},
+                     lambda: self.conn.execute(
+                         "UPDATE logs SET durationSeconds = ? WHERE rowid = (SELECT rowid FROM logs WHERE user_id = ? AND spotId = ? AND timestamp = ? ORDER BY rowid DESC LIMIT 1)",
+                         (duration, user_id, log.spotId, log.timestamp)))
+
+    def unlock(self, user_id, ids: List[str], points: int):
+        def write():
+            self._update_list(user_id, "achievements", lambda achs: achs + ids)
+            self.conn.execute("UPDATE users SET points = points + ? WHERE id = ?", (points, user_id))
+        self._mutate("unlock", {"userId": user_id, "ids": ids, "points": points}, write)
+
+    def add_spot(self, spot: Spot) -> Spot:
+        self._mutate("add_spot", spot.model_dump(), lambda: self._insert_spot(spot))
+        return spot
+
+    def add_review(self, spot_id, review: Review):
+        self._mutate("add_review", {"spotId": spot_id, "review": review.model_dump()}, lambda: self._insert_review(spot_id, review))
+
+    def write_all(self, db: Database):
+        with self.lock, self.conn:
+            for table in ("logs", "reviews", "users", "spots"): self.conn.execute(f"DELETE FROM {table}")
+            for u in db.users: self._insert_user(u)
+            for s in db.spots: self._insert_spot(s)
+
+    # Import en flux (gen_data.py) : itérables consommés au fil de l'eau, une seule transaction
+    def bulk_insert(self, users=(), spots=()):
+        with self.lock, self.conn:
+            for u in users: self._insert_user(u)
+            for s in spots: self._insert_spot(s)
+
+# --- MIGRATION db.json -> SQLite ---
+def migrate_json_to_sqlite(json_path, sqlite_path):
+    db = read_database(json_path)
+    store = SqliteStore(sqlite_path).load()
+    store.write_all(db)
+    store.close()
+    return len(db.users), len(db.spots)
+
+if __name__ == "__main__":
+    src = sys.argv[1] if len(sys.argv) > 1 else "db.json"
+    dst = sys.argv[2] if len(sys.argv) > 2 else "db.sqlite3"
+    nb_users, nb_spots = migrate_json_to_sqlite(src, dst)
+    print(f"Migration terminée : {nb_users} utilisateurs, {nb_spots} spots -> {dst}")
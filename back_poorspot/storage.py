@@ -0,0 +1,444 @@
+import gzip
+import os
+import sys
+import threading
+from typing import Dict, List, Optional
+
+from models import CheckInLog, User, Review, Spot, SpotSummary, ReviewPage, Database
+from metrics import timed
+from fastjson import dumps, dumps_models, loads
+
+try: import fcntl
+except ImportError: fcntl = None  # Hors Unix : pas de verrou inter-processus (un seul worker)
+
+# --- STOCKAGE : SNAPSHOT JSON + JOURNAL (WAL) ---
+# db.json reste le snapshot de référence (même format qu'avant, plus "walSeq").
+# Chaque mutation est ajoutée en une ligne à db.json.wal, puis la compaction
+# (en tâche de fond) réécrit le snapshot et vide le journal.
+# Le coût d'une requête dépend donc de la taille du changement, pas de la base.
+
+WAL_SUFFIX = ".wal"
+COMPACT_EVERY = 500        # Nb d'entrées du journal avant compaction
+COMPACT_INTERVAL = 30      # Secondes entre deux vérifications
+
+# Format du snapshot : "compact" (JSON sans espaces), "gzip" (compact compressé)
+# ou "pretty" (ancien format indenté, lisible). La lecture reconnaît les trois.
+SNAPSHOT_FORMAT = os.environ.get("POORSPOT_SNAPSHOT", "compact")
+GZIP_LEVEL = 3
+GZIP_MAGIC = b"\x1f\x8b"
+
+@timed("load_db.parse")
+def load_db_data(path):
+    if not os.path.exists(path): return {"users": [], "spots": []}
+    try:
+        with open(path, "rb") as f: raw = f.read()
+        if raw[:2] == GZIP_MAGIC: raw = gzip.decompress(raw)
+        return loads(raw)
+    except: return {"users": [], "spots": []}
+
+# data peut contenir des modèles (User, Spot) : encodés directement, sans model_dump
+@timed("save_db.encode")
+def encode_snapshot(data, fmt=None) -> bytes:
+    return dumps_models(data, indent=4 if (fmt or SNAPSHOT_FORMAT) == "pretty" else None)
+
+# Un rename n'est durable qu'une fois son dossier synchronisé (sans effet hors Unix)
+def fsync_dir(path):
+    if os.name == "nt": return
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try: os.fsync(fd)
+    finally: os.close(fd)
+
+@timed("save_db.write")
+def write_snapshot(path, raw: bytes, fmt=None):
+    if (fmt or SNAPSHOT_FORMAT) == "gzip": raw = gzip.compress(raw, compresslevel=GZIP_LEVEL, mtime=0)
+    # Écriture atomique : un crash ne laisse jamais un db.json à moitié écrit
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(raw)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    fsync_dir(path)
+
+def save_db_data(path, data, fmt=None): write_snapshot(path, encode_snapshot(data, fmt), fmt)
+
+@timed("load_db.validate")
+def to_database(data) -> Database:
+    for u in data.get("users", []):
+        if "points" not in u: u["points"] = 0
+        if "achievements" not in u: u["achievements"] = []
+    return Database(users=data.get("users", []), spots=data.get("spots", []))
+
+def read_wal(path):
+    if not os.path.exists(path): return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try: yield loads(line)
+            except ValueError: break  # Dernière ligne tronquée par un crash
+
+# --- VERROU INTER-PROCESSUS ---
+# flock sur un fichier voisin de la base : libéré par le noyau si le processus
+# meurt, même sur un kill -9. Un verrou par FileLock (pas réentrant entre threads).
+class FileLock:
+    def __init__(self, path: str):
+        self.path = path
+        self.fd: Optional[int] = None
+
+    @property
+    def held(self) -> bool: return self.fd is not None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        if self.fd is not None: return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        if fcntl is not None:
+            try: fcntl.flock(fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            except OSError:
+                os.close(fd)
+                return False
+        self.fd = fd
+        return True
+
+    def release(self):
+        if self.fd is None: return
+        os.close(self.fd)  # Fermer le descripteur relâche le flock
+        self.fd = None
+
+# --- INTERFACE COMMUNE AUX MOTEURS ---
+# Les routes ne parlent qu'à cette interface : JsonStore (ci-dessous) ou
+# SqliteStore (sqlite_storage.py). Les objets renvoyés sont des lectures :
+# toute modification passe par une méthode de mutation, puis on relit.
+class Storage:
+    wal_entries = 0
+    # Validation groupée (writer.py) : les mutations ne sont rendues durables
+    # qu'au flush() de fin de lot, au lieu d'une écriture disque chacune
+    grouped = False
+    # Base partagée entre plusieurs processus (workers) : voir cluster.py
+    shared = False
+    # Mutations annulables (SQLite) : un job ou un lot en échec est défait en base.
+    # En JSON, les mutations déjà faites restent (journal et index d'accord).
+    transactional = False
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.listeners = []
+        self.mutations = 0  # Mutations notifiées ou transmises : l'écrivain sait si un échec a touché aux index
+
+    # Les index dérivés (succès, classements...) s'abonnent aux mutations :
+    # fn(op, data) est appelé sous verrou, avec le même format que le journal.
+    def subscribe(self, fn): self.listeners.append(fn)
+
+    def _emit(self, op, data):
+        self.mutations += 1
+        for fn in self.listeners: fn(op, data)
+
+    def open(self): return self.load()
+    def load(self): raise NotImplementedError
+    def close(self): pass
+    def flush(self): pass
+    # Début d'un lot de l'écrivain (verrou inter-processus en mode partagé), relâché au flush()
+    def begin(self): pass
+    # Job de l'écrivain : ses mutations sont validées (ok) ou annulées ensemble
+    def begin_job(self): pass
+    def end_job(self, ok: bool): pass
+    # Événement hors données (occupations) transmis aux autres workers en mode partagé
+    def record(self, op, data): pass
+    def compact(self): pass
+    def database(self) -> Database: raise NotImplementedError
+    def write_all(self, db: Database): raise NotImplementedError
+
+    # Lectures
+    @property
+    def users(self) -> List[User]: raise NotImplementedError
+    @property
+    def spots(self) -> List[Spot]: raise NotImplementedError
+    def get_user(self, user_id) -> Optional[User]: raise NotImplementedError
+    def get_spot(self, spot_id) -> Optional[Spot]: raise NotImplementedError
+    def find_user_by_name(self, name) -> Optional[User]: raise NotImplementedError
+    # Session en cours de l'utilisateur (dernier check-in sans durée), sans parcourir l'historique
+    def open_session(self, user_id) -> Optional[CheckInLog]: raise NotImplementedError
+    def spot_summaries(self) -> List[SpotSummary]: raise NotImplementedError
+    # Avis du plus récent au plus ancien ; le curseur est opaque pour le client
+    def reviews_page(self, spot_id, cursor: Optional[str], limit: int) -> Optional[ReviewPage]: raise NotImplementedError
+
+    # Mutations
+    def add_user(self, user: User) -> User: raise NotImplementedError
+    def set_attributes(self, user_id, attributes): raise NotImplementedError
+    def add_favorite(self, user_id, spot_id): raise NotImplementedError
+    def remove_favorite(self, user_id, spot_id): raise NotImplementedError
+    def open_log(self, user_id, log: CheckInLog): raise NotImplementedError
+    def close_log(self, user_id, log: CheckInLog, duration: int): raise NotImplementedError
+    def unlock(self, user_id, ids: List[str], points: int): raise NotImplementedError
+    def add_spot(self, spot: Spot) -> Spot: raise NotImplementedError
+    def add_review(self, spot_id, review: Review): raise NotImplementedError
+
+class JsonStore(Storage):
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self.wal_path = path + WAL_SUFFIX
+        self.users_by_id: Dict[str, User] = {}
+        self.users_by_name: Dict[str, User] = {}    # pseudo en minuscules -> user
+        self.spots_by_id: Dict[str, Spot] = {}
+        self.open_logs: Dict[str, CheckInLog] = {}  # user -> session en cours
+        self.seq = 0
+        self.wal_entries = 0
+        self._wal = None
+        self._dirty = False
+        self._copied: Optional[set] = None           # Pendant l'encodage d'un snapshot : objets déjà recopiés
+        self.process_lock = FileLock(path + ".lock")
+
+    # --- CHARGEMENT ---
+    def open(self):
+        # Un seul processus par db.json : deux workers y feraient des écritures concurrentes
+        if not self.process_lock.acquire(blocking=False):
+            raise RuntimeError(f"{self.path} est déjà ouvert par un autre processus (plusieurs workers : POORSPOT_STORAGE=sqlite)")
+        self.load()
+        # Journal rejoué : on repart d'un snapshot propre (et d'un journal sans ligne tronquée)
+        if self.wal_entries: self._write_snapshot()
+        if os.path.exists(self.wal_path): os.remove(self.wal_path)
+        self.wal_entries = 0
+        self._wal = open(self.wal_path, "ab")
+        return self
+
+    def load(self):
+        data = load_db_data(self.path)
+        db = to_database(data)
+        self.users_by_id = {u.id: u for u in db.users}
+        self.users_by_name = {}
+        for u in db.users: self.users_by_name.setdefault(u.name.lower(), u)  # Premier inscrit prioritaire, comme avant
+        self.spots_by_id = {s.id: s for s in db.spots}
+        self.open_logs = {u.id: u.history[-1] for u in db.users if u.history and not u.history[-1].durationSeconds}
+        self.seq = data.get("walSeq", 0)
+        for rec in read_wal(self.wal_path):
+            if rec["seq"] <= self.seq: continue
+            self._apply(rec["op"], rec["data"])
+            self.seq = rec["seq"]
+            self.wal_entries += 1
+        return self
+
+    def close(self):
+        self.flush()
+        if self._wal:
+            self._wal.close()
+            self._wal = None
+        self.process_lock.release()
+
+    @timed("store.flush")
+    def flush(self):
+        with self.lock:
+            if not self._wal or not self._dirty: return
+            self._wal.flush()
+            os.fsync(self._wal.fileno())
+            self._dirty = False
+
+    def database(self) -> Database:
+        with self.lock:
+            return Database.model_construct(users=list(self.users_by_id.values()), spots=list(self.spots_by_id.values()))
+
+    # Scripts hors-ligne : un serveur en cours continuerait d'écrire dans le journal
+    # supprimé ici, et sa prochaine compaction écraserait le snapshot
+    def write_all(self, db: Database):
+        held = self.process_lock.held
+        if not self.process_lock.acquire(blocking=False):
+            raise RuntimeError(f"{self.path} est ouvert par un serveur : l'arrêter avant d'écrire la base hors-ligne")
+        try: write_database(self.path, db)
+        finally:
+            if not held: self.process_lock.release()
+
+    # --- LECTURES ---
+    @property
+    def users(self) -> List[User]: return list(self.users_by_id.values())
+
+    @property
+    def spots(self) -> List[Spot]: return list(self.spots_by_id.values())
+
+    def get_user(self, user_id) -> Optional[User]: return self.users_by_id.get(user_id)
+
+    def get_spot(self, spot_id) -> Optional[Spot]: return self.spots_by_id.get(spot_id)
+
+    def find_user_by_name(self, name) -> Optional[User]: return self.users_by_name.get(name.lower())
+
+    def open_session(self, user_id) -> Optional[CheckInLog]: return self.open_logs.get(user_id)
+
+    def spot_summaries(self) -> List[SpotSummary]: return [SpotSummary.of(s) for s in self.spots]
+
+    def reviews_page(self, spot_id, cursor: Optional[str], limit: int) -> Optional[ReviewPage]:
+        spot = self.get_spot(spot_id)
+        if not spot: return None
+        with self.lock:
+            # Curseur = position comptée depuis l'avis le plus ancien : stable quand
+            # de nouveaux avis arrivent en tête de liste
+            reviews = spot.reviews
+            end = min(max(int(cursor), 0), len(reviews)) if cursor else len(reviews)
+            start = len(reviews) - end
+            items = reviews[start:start + limit]
+            nxt = end - len(items)
+            return ReviewPage(items=items, nextCursor=str(nxt) if items and nxt > 0 else None, total=len(reviews))
+
+    # --- MUTATIONS (journalisées) ---
+    def add_user(self, user: User) -> User:
+        self._commit("add_user", user.model_dump())
+        return self.users_by_id[user.id]
+
+    def set_attributes(self, user_id, attributes): self._commit("set_attributes", {"userId": user_id, "attributes": attributes})
+
+    def add_favorite(self, user_id, spot_id): self._commit("add_favorite", {"userId": user_id, "spotId": spot_id})
+
+    def remove_favorite(self, user_id, spot_id): self._commit("remove_favorite", {"userId": user_id, "spotId": spot_id})
+
+    def open_log(self, user_id, log: CheckInLog): self._commit("open_log", {"userId": user_id, "log": log.model_dump()})
+
+    def close_log(self, user_id, log: CheckInLog, duration: int):
+        self._commit("close_log", {"userId": user_id, "spotId": log.spotId, "timestamp": log.timestamp, "durationSeconds": duration})
+
+    def unlock(self, user_id, ids: List[str], points: int): self._commit("unlock", {"userId": user_id, "ids": ids, "points": points})
+
+    def add_spot(self, spot: Spot) -> Spot:
+        self._commit("add_spot", spot.model_dump())
+        return self.spots_by_id[spot.id]
+
+    def add_review(self, spot_id, review: Review): self._commit("add_review", {"spotId": spot_id, "review": review.model_dump()})
+
+    def _commit(self, op, data):
+        with self.lock:
+            self._apply(op, data)
+            self.seq += 1
+            self.wal_entries += 1
+            if self._wal:
+                self._wal.write(dumps({"seq": self.seq, "op": op, "data": data}) + b"\n")
+                if self.grouped: self._dirty = True
+                else: self._wal.flush()
+            self._emit(op, data)
+
+    # --- APPLICATION (live et replay du journal) ---
+    def _apply(self, op, d):
+        getattr(self, "_op_" + op)(d)
+
+    # --- COPIE SUR ÉCRITURE ---
+    # La compaction encode hors verrou les objets capturés : tant qu'elle tourne,
+    # une mutation ne les modifie plus en place, elle remplace l'objet par une
+    # copie (une fois par objet). Les routes relisent déjà après une mutation.
+    def _user(self, user_id) -> User:
+        u = self.users_by_id[user_id]
+        if self._copied is None or ("user", user_id) in self._copied: return u
+        self._copied.add(("user", user_id))
+        c = u.model_copy(update={"favorites": list(u.favorites), "history": list(u.history), "achievements": list(u.achievements)})
+        self.users_by_id[user_id] = c
+        if self.users_by_name.get(u.name.lower()) is u: self.users_by_name[u.name.lower()] = c
+        return c
+
+    def _spot(self, spot_id) -> Spot:
+        s = self.spots_by_id[spot_id]
+        if self._copied is None or ("spot", spot_id) in self._copied: return s
+        self._copied.add(("spot", spot_id))
+        r = s.ratings
+        ratings = r.model_copy(update={"histRevenue": list(r.histRevenue), "histSecurity": list(r.histSecurity), "histTraffic": list(r.histTraffic)})
+        c = s.model_copy(update={"reviews": list(s.reviews), "ratings": ratings})
+        self.spots_by_id[spot_id] = c
+        return c
+
+    def _op_add_user(self, d):
+        u = User(**d)
+        self.users_by_id[u.id] = u
+        self.users_by_name.setdefault(u.name.lower(), u)
+
+    def _op_set_attributes(self, d): self._user(d["userId"]).attributes = d["attributes"]
+
+    def _op_add_favorite(self, d):
+        favs = self._user(d["userId"]).favorites
+        if d["spotId"] not in favs: favs.append(d["spotId"])
+
+    def _op_remove_favorite(self, d):
+        favs = self._user(d["userId"]).favorites
+        if d["spotId"] in favs: favs.remove(d["spotId"])
+
+    def _op_open_log(self, d):
+        log = CheckInLog(**d["log"])
+        self._user(d["userId"]).history.append(log)
+        if not log.durationSeconds: self.open_logs[d["userId"]] = log
+        else: self.open_logs.pop(d["userId"], None)
+
+    def _op_close_log(self, d):
+        history = self._user(d["userId"]).history
+        log = self.open_logs.get(d["userId"])
+        if not log or log.spotId != d["spotId"] or log.timestamp != d["timestamp"]:
+            # Session qui n'est plus la dernière : recherche depuis la fin
+            log = next((l for l in reversed(history) if l.spotId == d["spotId"] and l.timestamp == d["timestamp"]), None)
+            if not log: return
+        if self._copied is not None:
+            # Le check-in peut appartenir au snapshot en cours : remplacé par une copie
+            i = next(i for i in range(len(history) - 1, -1, -1) if history[i] is log)
+            old, log = log, log.model_copy()
+            history[i] = log
+            if self.open_logs.get(d["userId"]) is old: self.open_logs[d["userId"]] = log
+        log.durationSeconds = d["durationSeconds"]
+        # Une durée nulle laisse la session ouverte (même règle qu'au chargement)
+        if log.durationSeconds and self.open_logs.get(d["userId"]) is log: del self.open_logs[d["userId"]]
+
+    def _op_unlock(self, d):
+        u = self._user(d["userId"])
+        u.achievements.extend(d["ids"])
+        u.points += d["points"]
+
+    def _op_add_spot(self, d):
+        s = Spot(**d)
+        self.spots_by_id[s.id] = s
+
+    def _op_add_review(self, d): self._spot(d["spotId"]).add_review(Review(**d["review"]))
+
+    # --- COMPACTION ---
+    @timed("store.compact")
+    def compact(self):
+        # 1. Capture cohérente de l'état sous verrou : les listes d'objets seulement,
+        # figés ensuite par la copie sur écriture
+        with self.lock:
+            if not self.wal_entries: return
+            snap_seq = self.seq
+            offset = self._wal.tell() if self._wal else 0
+            data = self._snapshot_data()
+            self._copied = set()
+        # 2. Encodage, compression et écriture hors verrou : les mutations continuent
+        try: write_snapshot(self.path, encode_snapshot(data))
+        finally:
+            with self.lock: self._copied = None
+        # 3. On ne garde du journal que ce qui a été écrit pendant la compaction
+        with self.lock:
+            if not self._wal: return
+            self._wal.flush()
+            with open(self.wal_path, "rb") as f:
+                f.seek(offset)
+                tail = f.read()
+            # Entrées déjà acquittées : synchronisées avant le rename, comme le snapshot
+            tmp = self.wal_path + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(tail)
+                f.flush()
+                os.fsync(f.fileno())
+            self._wal.close()
+            os.replace(tmp, self.wal_path)
+            fsync_dir(self.wal_path)
+            self._wal = open(self.wal_path, "ab")
+            self.wal_entries = self.seq - snap_seq
+
+    def _snapshot_data(self):
+        return {"users": list(self.users_by_id.values()), "spots": list(self.spots_by_id.values()), "walSeq": self.seq}
+
+    def _write_snapshot(self): save_db_data(self.path, self._snapshot_data())
+
+def read_database(path) -> Database:
+    return JsonStore(path).load().database()
+
+def write_database(path, db: Database):
+    # Pour les scripts hors-ligne : snapshot complet, journal absorbé
+    seq = max([load_db_data(path).get("walSeq", 0)] + [rec["seq"] for rec in read_wal(path + WAL_SUFFIX)])
+    save_db_data(path, {"users": db.users, "spots": db.spots, "walSeq": seq})
+    if os.path.exists(path + WAL_SUFFIX): os.remove(path + WAL_SUFFIX)
+
+# Export lisible (ancien format indenté), journal compris
+def export_pretty(path, out):
+    save_db_data(out, JsonStore(path).load()._snapshot_data(), "pretty")
+
+if __name__ == "__main__":
+    # python storage.py export db.json db.pretty.json
+    if len(sys.argv) != 4 or sys.argv[1] != "export": sys.exit("usage: python storage.py export <db.json> <sortie.json>")
+    export_pretty(sys.argv[2], sys.argv[3])
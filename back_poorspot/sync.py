@@ -0,0 +1,82 @@
+from collections import deque
+from typing import Optional
+from uuid import uuid4
+
+MAX_ENTRIES = 10000
+
+# --- VERSIONS & SYNCHRO DELTA ---
+# Compteur monotone partagé par les spots/avis et les occupations. Chaque
+# changement est noté (version, type, spot) dans un journal borné : un client
+# qui envoie ?since=<version> ne reçoit que ce qui a bougé depuis, et
+# If-None-Match renvoie 304 si rien n'a changé.
+# L'epoch (tiré au démarrage) invalide les versions d'un serveur précédent.
+# Plusieurs workers : clock() donne le seq du journal partagé (cluster.py) et
+# l'epoch est gardé en base, une version vaut alors sur tous les workers.
+
+def new_epoch() -> str: return uuid4().hex[:8]
+
+class ChangeFeed:
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.clock = None  # Versions imposées (seq partagé), sinon compteur local
+        self.entries = deque(maxlen=max_entries)  # (version, kind, spot_id, review)
+        self.restart(new_epoch(), 0)
+
+    # Nouvelle origine des versions : un client plus ancien que version, ou
+    # d'un autre epoch, repart d'une synchro complète
+    def restart(self, epoch, version):
+        self.epoch = epoch
+        self.version = self.spots_version = self.occupations_version = version
+        self.floor = version  # Plus ancienne version servie en delta
+        self.entries.clear()
+
+    # Changements annulés après coup (lot défait) : les clients repartent d'une synchro complète
+    def reset(self): self.restart(new_epoch(), self.version)
+
+    def token(self, version) -> str: return f"{self.epoch}-{version}"
+
+    def etag(self, version) -> str: return f'W/"{self.token(version)}"'
+
+    # Version du client si elle est exploitable, sinon None (resynchro complète)
+    def parse(self, token) -> Optional[int]:
+        epoch, _, version = (token or "").partition("-")
+        if epoch != self.epoch or not version.isdigit(): return None
+        version = int(version)
+        return version if self.floor <= version <= self.version else None
+
+    def bump(self, kind, spot_id, review=None):
+        self.version = self.clock() if self.clock else self.version + 1
+        # Journal plein : les changements jusqu'à la version évincée sortent du delta
+        if len(self.entries) == self.entries.maxlen: self.floor = self.entries[0][0]
+        if kind == "occupation": self.occupations_version = self.version
+        else: self.spots_version = self.version
+        self.entries.append((self.version, kind, spot_id, review))
+
+    def on_event(self, op, d):
+        if op == "add_spot": self.bump("spot", d["id"])
+        elif op == "add_review": self.bump("review", d["spotId"], d["review"])
+
+    # Parcours depuis la fin : coût proportionnel au nombre de changements
+    def since(self, version, kinds):
+        found = []
+        for e in reversed(self.entries):
+            if e[0] <= version: break
+            if e[1] in kinds: found.append(e)
+        found.reverse()
+        return found
+
+    # --- DELTAS ---
+    def spots_delta(self, version, get_spot):
+        new_spots, reviews = {}, []
+        for _, kind, spot_id, review in self.since(version, ("spot", "review")):
+            if kind == "spot": new_spots[spot_id] = True
+            elif spot_id not in new_spots: reviews.append({"spotId": spot_id, "review": review})
+        # Un spot créé depuis arrive complet, avec ses avis : pas de doublon dans "reviews"
+        spots = [s for s in map(get_spot, new_spots) if s]
+        return {"version": self.token(self.version), "full": False, "spots": spots, "reviews": reviews}
+
+    def occupations_delta(self, version, occupations):
+        changed, removed = {}, []
+        for spot_id in dict.fromkeys(e[2] for e in self.since(version, ("occupation",))):
+            if spot_id in occupations: changed[spot_id] = occupations[spot_id]
+            else: removed.append(spot_id)
+        return {"version": self.token(self.version), "full": False, "changed": changed, "removed": removed}
@@ -1,8 +1,11 @@
-import json
+import argparse
 import os
 import random
+import sys
 from datetime import datetime, timedelta
-from main import load_db, save_db, check_new_achievements, CheckInLog
+from main import load_db, save_db, CheckInLog
+from achievements import ACHIEVEMENTS_BY_ID, BATCH_CHUNK, batch_new_achievements
+from sessions import SessionLog
 
 # Configuration
 MIN_DURATION_MINUTES = 15
@@ -72,10 +75,13 @@ def populate_recent_activity(db):
 def fix_history_from_reviews(db):
     print("\n--- ÉTAPE 2 : COHÉRENCE AVIS <-> HISTORIQUE ---")
     logs_created = 0
+    # Index construit une fois (au lieu d'un parcours des utilisateurs par avis)
+    users_by_name = {}
+    for u in db.users: users_by_name.setdefault(u.name, u)
     
     for spot in db.spots:
         for review in spot.reviews:
-            user = next((u for u in db.users if u.name == review.authorName), None)
+            user = users_by_name.get(review.authorName)
             if user:
                 review_date = datetime.fromisoformat(review.createdAt)
                 has_history = False
@@ -106,11 +112,11 @@ def cleanup_and_sort(db):
     users_fixed = 0
     for user in db.users:
         if user.history:
-            # Tri du plus récent au plus vieux
-            user.history.sort(key=lambda x: datetime.fromisoformat(x.timestamp), reverse=True)
+            # Tri chronologique (l'API le renvoie du plus récent au plus vieux)
+            user.history.sort(key=lambda x: datetime.fromisoformat(x.timestamp))
             
             # Correction Date de création
-            oldest_log = user.history[-1]
+            oldest_log = user.history[0]
             try:
                 created_at = datetime.fromisoformat(user.createdAt)
                 first_visit = datetime.fromisoformat(oldest_log.timestamp)
@@ -121,8 +127,15 @@ def cleanup_and_sort(db):
             except: pass
     print(f"Dates corrigées pour {users_fixed} utilisateurs.")
 
-def sync_all_users():
+def show_progress(done, total):
+    sys.stdout.write(f"\r  {done}/{total} utilisateurs évalués")
+    if done == total: sys.stdout.write("\n")
+    sys.stdout.flush()
+
+def sync_all_users(reset=False, workers=None, chunk_size=BATCH_CHUNK, seed=None):
     print("=== DÉMARRAGE DE LA GÉNÉRATION DE DONNÉES ===")
+    # Graine fixée : même activité simulée d'une exécution à l'autre (à date égale)
+    if seed is not None: random.seed(seed)
     try:
         db = load_db()
     except Exception as e:
@@ -141,28 +154,46 @@ def sync_all_users():
     # 4. Recalculer les succès (Points & Badges)
     print("\n--- ÉTAPE 4 : CALCUL DES SCORES & SUCCÈS ---")
     users_updated = 0
+    if reset:
+        # Reset total : points et succès recalculés de zéro
+        for user in db.users:
+            if user.points or user.achievements: users_updated += 1
+            user.points = 0
+            user.achievements = []
+        print(f"Reset des scores de {len(db.users)} utilisateurs.")
+
+    # Sessions en colonnes + agrégats partagés construits une seule fois,
+    # utilisateurs évalués en parallèle par paquets
+    sessions = SessionLog().build(db)
+    print(f"{len(sessions)} sessions ({sessions.nbytes // max(len(sessions), 1)} octets/session en colonnes)")
+    found = batch_new_achievements(db, sessions, workers, chunk_size, show_progress)
+
     for user in db.users:
-        # Reset des points pour recalculer propre
-        # user.points = 0 
-        # user.achievements = [] 
-        # (Optionnel : Décommenter ci-dessus si tu veux un reset total des scores, 
-        # sinon on ajoute juste ce qui manque)
-        
-        start_pts = user.points
-        check_new_achievements(user, db)
-        if user.points != start_pts:
-            users_updated += 1
-            # print(f"  -> {user.name} : {user.points} pts")
+        ids = found.get(user.id)
+        if not ids: continue
+        user.achievements.extend(ids)
+        user.points += sum(ACHIEVEMENTS_BY_ID[aid]["points"] for aid in ids)
+        users_updated += 1
 
     if changed_1 or changed_2 or users_updated > 0:
-        save_db(db)
+        # Une seule écriture pour tout le lot
+        try: save_db(db)
+        except RuntimeError as e:
+            print(f"\nErreur : {e}")
+            return
         print("\n✅ SUCCÈS : Base de données mise à jour et sauvegardée !")
         print("Les classements 24h, 7 jours et 30 jours devraient maintenant être cohérents.")
     else:
         print("\nAucun changement nécessaire.")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Génère de l'activité récente et recalcule les succès")
+    parser.add_argument("--reset", action="store_true", help="remettre points et succès à zéro avant recalcul")
+    parser.add_argument("--workers", type=int, default=None, help="nombre de processus (1 = sans parallélisme)")
+    parser.add_argument("--chunk-size", type=int, default=BATCH_CHUNK, help="utilisateurs par paquet")
+    parser.add_argument("--seed", type=int, default=None, help="graine du générateur d'activité")
+    args = parser.parse_args()
     if not os.path.exists("db.json"):
         print("Erreur: db.json introuvable.")
     else:
-        sync_all_users()
\ No newline at end of file
+        sync_all_users(args.reset, args.workers, args.chunk_size, args.seed)
\ No newline at end of file
@@ -0,0 +1,200 @@
+from datetime import datetime, timedelta
+
+from achievements import ACHIEVEMENTS_DEF
+from models import Database, User
+
+# --- IMPLÉMENTATIONS D'ORIGINE (RÉFÉRENCE DES TESTS) ---
+# Copies du main.py d'avant les index incrémentaux, à l'identique : les tests
+# comparent les nouveaux index à ces calculs complets. L'historique attendu
+# est celui de l'API (du plus récent au plus ancien), voir newest_first().
+# Seul changement : la base et l'heure sont passées en paramètres au lieu de
+# load_db() / datetime.now().
+
+def newest_first(user):
+    return user.model_copy(update={"history": user.history[::-1], "achievements": list(user.achievements)})
+
+# --- LOGIQUE DE DÉBLOCAGE (Mise à jour) ---
+def check_new_achievements(user: User, db: Database):
+    new_unlocks = []
+    def has(aid): return aid in user.achievements
+
+    # Données agrégées
+    history = [h for h in user.history if h.durationSeconds and h.durationSeconds > 0]
+    total_seconds = sum(h.durationSeconds for h in history)
+    distinct_spots = set(h.spotId for h in history)
+    
+    # Données Spots créés / Avis
+    created_count = sum(1 for s in db.spots if s.createdBy == user.id)
+    reviews_count = sum(sum(1 for r in s.reviews if r.authorName == user.name) for s in db.spots)
+
+    # Maps et Compteurs
+    spots_map = {s.id: s for s in db.spots}
+    cat_visits = {}
+    spot_visits_count = {}
+    
+    # Compteurs contextuels
+    afterwork_count = 0
+    insomnia_count = 0
+    high_rev_count = 0
+    low_rev_count = 0
+    low_sec_count = 0
+    low_traf_count = 0
+    flash_count = 0
+
+    for h in history:
+        s = spots_map.get(h.spotId)
+        spot_visits_count[h.spotId] = spot_visits_count.get(h.spotId, 0) + 1
+        
+        # Check durée courte
+        if h.durationSeconds < 300: flash_count += 1
+
+        # Check horaire
+        try:
+            dt = datetime.fromisoformat(h.timestamp)
+            if 17 <= dt.hour < 20: afterwork_count += 1
+            if 0 <= dt.hour < 4: insomnia_count += 1
+        except: pass
+
+        if s:
+            cat_visits.setdefault(s.category, set()).add(s.id)
+            
+            # Calcul moyennes spot
+            if s.reviews:
+                avg_rev = sum(r.ratingRevenue for r in s.reviews)/len(s.reviews)
+                avg_sec = sum(r.ratingSecurity for r in s.reviews) / len(s.reviews)
+                avg_traf = sum(r.ratingTraffic for r in s.reviews) / len(s.reviews)
+                
+                if avg_rev > 4.5: high_rev_count += 1
+                if avg_rev < 2.0: low_rev_count += 1
+                if avg_sec < 2.0: low_sec_count += 1
+                if avg_traf < 2.0: low_traf_count += 1
+
+    # --- CHECK DES CONDITIONS ---
+
+    # 1. Démarrage
+    if has("welcome") is False: new_unlocks.append("welcome")
+    if len(history) >= 1 and not has("first_step"): new_unlocks.append("first_step")
+
+    # 2. Temps
+    if total_seconds >= 3600 and not has("time_1h"): new_unlocks.append("time_1h")
+    if total_seconds >= 18000 and not has("time_5h"): new_unlocks.append("time_5h")
+    if total_seconds >= 36000 and not has("time_10h"): new_unlocks.append("time_10h")
+    if total_seconds >= 86400 and not has("time_24h"): new_unlocks.append("time_24h")
+    if total_seconds >= 360000 and not has("time_100h"): new_unlocks.append("time_100h")
+
+    # 3. Exploration
+    if len(distinct_spots) >= 3 and not has("explorer_3"): new_unlocks.append("explorer_3")
+    if len(distinct_spots) >= 10 and not has("explorer_10"): new_unlocks.append("explorer_10")
+    if len(distinct_spots) >= 15 and not has("explorer_15"): new_unlocks.append("explorer_15")
+    if len(distinct_spots) >= 20 and not has("explorer_20"): new_unlocks.append("explorer_20")
+    
+    # 4. Catégories
+    all_cats = ["Tourisme", "Business", "Nightlife", "Shopping", "Transport"]
+    if all(len(cat_visits.get(c, [])) >= 1 for c in all_cats) and not has("jack_of_all"): new_unlocks.append("jack_of_all")
+
+    if len(cat_visits.get("Business", [])) >= 3 and not has("biz_man"): new_unlocks.append("biz_man")
+    if len(cat_visits.get("Tourisme", [])) >= 3 and not has("tourist"): new_unlocks.append("tourist")
+    if len(cat_visits.get("Nightlife", [])) >= 3 and not has("party_animal"): new_unlocks.append("party_animal")
+    if len(cat_visits.get("Shopping", [])) >= 3 and not has("shopper"): new_unlocks.append("shopper")
+    if len(cat_visits.get("Transport", [])) >= 3 and not has("commuter"): new_unlocks.append("commuter")
+    
+    if len(cat_visits.get("Culture", [])) >= 3 and not has("culture_fan"): new_unlocks.append("culture_fan")
+    if len(cat_visits.get("Market", [])) >= 3 and not has("market_trader"): new_unlocks.append("market_trader")
+    if len(cat_visits.get("Event", [])) >= 3 and not has("festival_goer"): new_unlocks.append("festival_goer")
+    # Nature + Parc combinés
+    nature_count = len(cat_visits.get("Nature", [])) + len(cat_visits.get("Parc", []))
+    if nature_count >= 3 and not has("nature_lover"): new_unlocks.append("nature_lover")
+
+    # 5. Contribution
+    if created_count >= 1 and not has("creator_1"): new_unlocks.append("creator_1")
+    if created_count >= 5 and not has("creator_5"): new_unlocks.append("creator_5")
+    if created_count >= 10 and not has("urban_planner"): new_unlocks.append("urban_planner")
+    
+    if reviews_count >= 1 and not has("reviewer_1"): new_unlocks.append("reviewer_1")
+    if reviews_count >= 5 and not has("reviewer_5"): new_unlocks.append("reviewer_5")
+    if reviews_count >= 20 and not has("reviewer_20"): new_unlocks.append("reviewer_20")
+
+    # 6. Fidélité / Style (Compteurs globaux)
+    if any(c >= 5 for c in spot_visits_count.values()) and not has("loyal_5"): new_unlocks.append("loyal_5")
+    if any(c >= 10 for c in spot_visits_count.values()) and not has("loyal_10"): new_unlocks.append("loyal_10")
+    
+    if flash_count >= 10 and not has("flash"): new_unlocks.append("flash")
+    if afterwork_count >= 5 and not has("afterwork"): new_unlocks.append("afterwork")
+    if insomnia_count >= 5 and not has("insomniac"): new_unlocks.append("insomniac")
+    if high_rev_count >= 5 and not has("gourmet"): new_unlocks.append("gourmet")
+    if low_rev_count >= 5 and not has("penny_pincher"): new_unlocks.append("penny_pincher")
+    if low_sec_count >= 5 and not has("survivor"): new_unlocks.append("survivor")
+    if low_traf_count >= 5 and not has("hermit"): new_unlocks.append("hermit")
+
+    # 7. Contextuel (Session Actuelle - last log)
+    if history:
+        last = history[0] 
+        # Duration
+        if last.durationSeconds >= 10800 and not has("marathon"): new_unlocks.append("marathon") # 3h
+        if last.durationSeconds >= 18000 and not has("camping"): new_unlocks.append("camping") # 5h
+        if last.durationSeconds < 300 and not has("sprint"): new_unlocks.append("sprint") # 5 min
+
+        # Time
+        dt = datetime.fromisoformat(last.timestamp)
+        if 5 <= dt.hour < 8 and not has("early_bird"): new_unlocks.append("early_bird")
+        if 12 <= dt.hour < 14 and not has("lunch_time"): new_unlocks.append("lunch_time")
+        if 2 <= dt.hour < 5 and not has("night_owl"): new_unlocks.append("night_owl")
+        if dt.weekday() >= 5 and not has("weekender"): new_unlocks.append("weekender")
+
+        # Spot Quality
+        s = spots_map.get(last.spotId)
+        if s and s.reviews:
+            # Calcul stats instantané pour ce spot précis
+            rev = [r.ratingRevenue for r in s.reviews]
+            sec = [r.ratingSecurity for r in s.reviews]
+            traf = [r.ratingTraffic for r in s.reviews]
+            
+            avg_rev = sum(rev)/len(rev)
+            avg_sec = sum(sec)/len(sec)
+            avg_traf = sum(traf)/len(traf)
+
+            if avg_rev >= 4.8 and not has("rich_zone"): new_unlocks.append("rich_zone")
+            if avg_sec >= 4.8 and not has("safe_zone"): new_unlocks.append("safe_zone")
+            if avg_traf >= 4.8 and not has("busy_zone"): new_unlocks.append("busy_zone")
+            
+            # Badges Spéciaux uniques
+            if avg_sec < 2.5 and not has("risk_taker"): new_unlocks.append("risk_taker")
+            if avg_traf < 1.5 and not has("ghost"): new_unlocks.append("ghost")
+            if avg_rev > 4.0 and avg_traf > 4.0 and not has("star"): new_unlocks.append("star")
+            if avg_sec < 1.5 and avg_traf > 4.0 and not has("kamikaze"): new_unlocks.append("kamikaze")
+
+    # Appliquer changements
+    result = []
+    for aid in new_unlocks:
+        defi = next((d for d in ACHIEVEMENTS_DEF if d["id"] == aid), None)
+        if defi:
+            user.achievements.append(aid)
+            user.points += defi["points"]
+            result.append(defi)
+    
+    return result
+
+# --- CLASSEMENT (/users/top) ---
+def get_top_users(db: Database, period: str = "forever", sort_by: str = "time", now: datetime = None):
+    if sort_by == "points":
+        lb = [{"userId": u.id, "name": u.name, "score": u.points, "attributes": u.attributes} for u in db.users if u.points > 0]
+        lb.sort(key=lambda x: x["score"], reverse=True)
+        return lb[:50]
+
+    cutoff = None
+    if period == "daily": cutoff = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    elif period == "weekly": cutoff = now - timedelta(days=7)
+    elif period == "monthly": cutoff = now - timedelta(days=30)
+
+    lb = []
+    for user in db.users:
+        secs = 0
+        for log in user.history:
+            if log.durationSeconds:
+                if cutoff is None or datetime.fromisoformat(log.timestamp) >= cutoff:
+                    secs += log.durationSeconds
+        if secs > 0:
+            lb.append({"userId": user.id, "name": user.name, "score": secs, "attributes": user.attributes})
+    
+    lb.sort(key=lambda x: x["score"], reverse=True)
+    return lb[:50]
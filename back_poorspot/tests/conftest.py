@@ -0,0 +1,33 @@
+import os
+import sys
+
+import pytest
+
+# Modules à plat dans back_poorspot/ (import main, import storage...)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gen_data import Generator, write_json
+from storage import JsonStore
+
+# Petite base synthétique (gen_data.py) chargée dans un JsonStore sans journal
+@pytest.fixture
+def make_store(tmp_path):
+    def make(users=40, spots=60, reviews=150, sessions=600, seed=0, now=None):
+        path = str(tmp_path / f"db-{seed}.json")
+        write_json(path, Generator(users, spots, reviews, sessions, days=60, seed=seed, now=now), lambda done: None)
+        return JsonStore(path).load()
+    return make
+
+# Application complète (lifespan compris) sur une base générée dans un dossier
+# temporaire : main lit db.json et occupations.sqlite3 dans le dossier courant
+@pytest.fixture(scope="session")
+def client(tmp_path_factory):
+    from fastapi.testclient import TestClient
+    work = tmp_path_factory.mktemp("server")
+    write_json(str(work / "db.json"), Generator(30, 40, 80, 300, days=60, seed=1), lambda done: None)
+    cwd = os.getcwd()
+    os.chdir(work)
+    try:
+        import main
+        with TestClient(main.app) as c: yield c
+    finally: os.chdir(cwd)
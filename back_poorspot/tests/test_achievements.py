@@ -0,0 +1,67 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from achievements import AchievementEngine, batch_new_achievements
+from baseline import check_new_achievements, newest_first
+from models import CheckInLog, Database, Review, Spot
+from sessions import SessionLog
+
+CATEGORIES = ["Tourisme", "Business", "Nightlife", "Shopping", "Transport", "Culture", "Market", "Nature", "Parc", "Event"]
+
+def rating(rng): return rng.choice([0.5, 1.0, 1.5, 2.0, 3.0, 4.0, 4.5, 5.0, 5.0, 5.0])
+
+def review(rng, author, i):
+    return Review(id=f"r{i}", authorName=author, ratingRevenue=rating(rng), ratingSecurity=rating(rng),
+                  ratingTraffic=rating(rng), attribute="x", comment="", createdAt="2026-01-01T00:00:00")
+
+def spot(spot_id, rng, created_by):
+    return Spot(id=spot_id, name=spot_id, description="", latitude=50.85, longitude=4.35, category=rng.choice(CATEGORIES),
+                createdAt="2026-01-01T00:00:00", createdBy=created_by, currentActiveUsers=0)
+
+# Suite aléatoire de releases (durées nulles comprises), d'avis et de spots créés
+# (parfois déjà visités), comme les routes : chaque release est évaluée par le
+# moteur et par le calcul complet d'origine, qui doivent débloquer la même chose.
+@pytest.mark.parametrize("seed", range(4))
+def test_release_unlocks_match_baseline(make_store, seed):
+    store = make_store(seed=seed)
+    engine = AchievementEngine().build(store.database())
+    store.subscribe(engine.on_event)
+    rng = random.Random(seed)
+    users = [u.id for u in store.users]
+    future = [f"new-{seed}-{i}" for i in range(15)]  # Spots visités avant d'être créés
+    clock = datetime(2026, 3, 1)
+    releases = 0
+    for i in range(1500):
+        k = rng.random()
+        if k < 0.25:
+            spots = [s.id for s in store.spots]
+            store.add_review(rng.choice(spots), review(rng, store.get_user(rng.choice(users)).name, i))
+            continue
+        if k < 0.3 and future:
+            store.add_spot(spot(future.pop(), rng, rng.choice(users)))
+            continue
+        user_id = rng.choice(users)
+        spot_id = rng.choice([s.id for s in store.spots] + future[:3])
+        clock += timedelta(minutes=rng.randrange(1, 600))
+        store.open_log(user_id, CheckInLog(spotId=spot_id, spotName=spot_id, timestamp=clock.isoformat()))
+        duration = rng.choice([0, 0, rng.randrange(1, 300), rng.randrange(300, 4 * 3600), rng.randrange(3 * 3600, 6 * 3600)])
+        store.close_log(user_id, store.open_session(user_id), duration)
+
+        user = store.get_user(user_id)
+        db = Database.model_construct(users=store.users, spots=store.spots)
+        expected = [d["id"] for d in check_new_achievements(newest_first(user), db)]
+        found = engine.evaluate(user)
+        assert [d["id"] for d in found] == expected, f"release {releases} ({duration} s)"
+        if found: store.unlock(user_id, [d["id"] for d in found], sum(d["points"] for d in found))
+        releases += 1
+    assert releases > 1000
+
+def test_batch_matches_baseline(make_store):
+    store = make_store(users=60, seed=7)
+    db = store.database()
+    found = batch_new_achievements(db, SessionLog().build(db), workers=1, chunk_size=16)
+    for user in db.users:
+        expected = [d["id"] for d in check_new_achievements(newest_first(user), db)]
+        assert found.get(user.id, []) == expected
@@ -0,0 +1,34 @@
+import hashlib
+
+import pytest
+
+from auth import Tokens, hash_password, verify_password
+
+def test_token_roundtrip_and_expiry():
+    tokens = Tokens(secret=b"s", ttl=60)
+    issued = tokens.issue("user-é", now=1000)
+    assert tokens.verify(issued["token"], now=1030) == "user-é"
+    assert tokens.verify(issued["token"], now=1061) is None
+    assert Tokens(secret=b"autre").verify(issued["token"], now=1030) is None
+
+# Un en-tête Authorization arbitraire passe par le limiteur à chaque requête :
+# aucun jeton, même non ASCII, ne doit lever
+@pytest.mark.parametrize("token", ["", "a", "a.1.é", "é.é.é", "a.b.c.d", "YQ.x.sig", "\x00.1.\udcff"])
+def test_forged_tokens_are_rejected(token):
+    assert Tokens(secret=b"s").verify(token) is None
+
+def test_tampered_signature():
+    tokens = Tokens(secret=b"s")
+    token = tokens.issue("u1")["token"]
+    assert tokens.verify(token[:-1] + ("A" if token[-1] != "A" else "B")) is None
+
+def test_passwords():
+    stored = hash_password("mdp")
+    assert verify_password("mdp", stored) and not verify_password("autre", stored)
+    legacy = hashlib.sha256(b"mdp").hexdigest()
+    assert verify_password("mdp", legacy) and not verify_password("autre", legacy)
+
+def test_non_ascii_bearer_is_anonymous(client):
+    headers = {"Authorization": "Bearer a.1.é".encode()}
+    assert client.get("/users/me", headers=headers).status_code == 401
+    assert client.get("/achievements/list", headers=headers).status_code == 200
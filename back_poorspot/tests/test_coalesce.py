@@ -0,0 +1,72 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import coalesce
+from coalesce import ResponseCache
+
+class Clock:
+    def __init__(self): self.now = 0.0
+    def __call__(self): return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = Clock()
+    monkeypatch.setattr(coalesce, "time", SimpleNamespace(monotonic=c))  # Pas l'horloge de la boucle
+    return c
+
+def test_hits_until_version_or_ttl(clock):
+    cache, builds = ResponseCache(ttl=1.0), []
+    def build(): builds.append(1); return b"%d" % len(builds)
+    async def run():
+        assert await cache.get("k", 1, build) == b"1"
+        assert await cache.get("k", 1, build) == b"1"
+        assert await cache.get("k", 2, build) == b"2"    # Écriture : nouvelle version
+        clock.now = 1.5
+        assert await cache.get("k", 2, build) == b"3"    # Expiré
+        assert await cache.get("autre", 2, build) == b"4"
+    asyncio.run(run())
+    assert (cache.hits, cache.misses) == (1, 4)
+
+def test_lru_and_ttl_zero(clock):
+    cache = ResponseCache(ttl=1.0, size=2)
+    async def run():
+        for key in "abca": await cache.get(key, 0, lambda: key.encode())
+        assert list(cache.entries) == ["c", "a"]
+        off = ResponseCache(ttl=0)
+        await off.get("k", 0, lambda: b"x")
+        await off.get("k", 0, lambda: b"x")
+        assert off.misses == 2 and not off.entries
+    asyncio.run(run())
+
+# Requêtes identiques pendant un build asynchrone : un seul calcul, même corps
+# (ou même exception) pour tous ; une autre version ne l'attend pas
+def test_coalesces_inflight_builds(clock):
+    cache, builds = ResponseCache(ttl=1.0), []
+    async def build(fail=False):
+        builds.append(1)
+        await asyncio.sleep(0.01)
+        if fail: raise ValueError("build")
+        return b"body"
+    async def run():
+        bodies = await asyncio.gather(*(cache.get("k", 1, build) for _ in range(10)), cache.get("k", 2, build))
+        assert bodies == [b"body"] * 11 and len(builds) == 2 and cache.coalesced == 9
+        failed = await asyncio.gather(*(cache.get("f", 1, lambda: build(True)) for _ in range(5)), return_exceptions=True)
+        assert all(isinstance(e, ValueError) for e in failed) and len(builds) == 3
+        assert not cache.inflight and "f" not in cache.entries
+    asyncio.run(run())
+
+def test_cancelled_build_is_not_cached(clock):
+    cache = ResponseCache(ttl=1.0)
+    async def slow():
+        await asyncio.sleep(10)
+        return b"never"
+    async def run():
+        task = asyncio.ensure_future(cache.get("k", 1, slow))
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError): await task
+        assert not cache.inflight and not cache.entries
+        assert await cache.get("k", 1, lambda: b"ok") == b"ok"
+    asyncio.run(run())
@@ -0,0 +1,55 @@
+import random
+
+import pytest
+
+from geo import SpotGrid, distance_m
+
+CATEGORIES = ["Tourisme", "Business", "Nightlife"]
+
+def points(rng, n):
+    # Centre-ville dense, quelques spots isolés, des doublons de position
+    pts = [(f"s{i}", rng.gauss(50.85, 0.02), rng.gauss(4.35, 0.03), rng.choice(CATEGORIES)) for i in range(n)]
+    pts += [(f"far{i}", rng.uniform(50.6, 51.1), rng.uniform(4.0, 4.7), rng.choice(CATEGORIES)) for i in range(10)]
+    pts += [(f"dup{i}", pts[0][1], pts[0][2], pts[0][3]) for i in range(3)]
+    return pts
+
+def query(rng):
+    if rng.random() < 0.1: return rng.uniform(50, 52), rng.uniform(3, 6)  # Hors de la ville
+    return rng.gauss(50.85, 0.03), rng.gauss(4.35, 0.04)
+
+# Grille construite d'un coup puis complétée par add_spot : mêmes résultats
+# qu'un parcours complet des spots
+@pytest.mark.parametrize("seed", range(3))
+def test_queries_match_brute_force(seed):
+    rng = random.Random(seed)
+    pts = points(rng, 400)
+    grid = SpotGrid().build([])
+    for sid, lat, lon, cat in pts[:300]: grid.add(sid, lat, lon, cat)
+    for sid, lat, lon, cat in pts[300:]:
+        grid.on_event("add_spot", {"id": sid, "latitude": lat, "longitude": lon, "category": cat})
+    for _ in range(200):
+        lat, lon = query(rng)
+        cats = rng.choice([None, {"Tourisme"}, {"Business", "Nightlife"}])
+        keep = [p for p in pts if not cats or p[3] in cats]
+
+        d = rng.choice([0.001, 0.01, 0.05, 3])
+        box = (lat - d, lon - d, lat + d, lon + d)
+        expected = {sid for sid, la, lo, _ in keep if box[0] <= la <= box[2] and box[1] <= lo <= box[3]}
+        found = grid.bbox(*box, cats)
+        assert sorted(found) == sorted(expected)
+
+        radius = rng.choice([50, 500, 3000, 200000])
+        expected = sorted((distance_m(lat, lon, la, lo), sid) for sid, la, lo, _ in keep)
+        assert grid.radius(lat, lon, radius, cats) == [h for h in expected if h[0] <= radius]
+
+        # Égalités de distance à la k-ième place (doublons) : n'importe lequel
+        k = rng.choice([1, 5, 20, 1000])
+        found = grid.nearest(lat, lon, k, cats)
+        assert [h[0] for h in found] == [h[0] for h in expected[:k]]
+        assert set(found) <= set(expected)
+
+def test_empty_grid():
+    grid = SpotGrid()
+    assert grid.bbox(50, 4, 51, 5) == []
+    assert grid.radius(50.85, 4.35, 1000) == []
+    assert grid.nearest(50.85, 4.35, 3) == []
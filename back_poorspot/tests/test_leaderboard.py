@@ -0,0 +1,57 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from baseline import get_top_users
+from leaderboard import PERIODS, Leaderboards
+from models import CheckInLog, Database, User
+
+NOW = datetime(2026, 3, 10, 14, 30)
+
+def top(lb, db, period, sort_by, now):
+    return lb.top(period, sort_by, now=now), get_top_users(db, period, sort_by, now)
+
+# Sessions fermées, inscriptions, points et attributs au fil d'une horloge qui
+# avance : chaque fenêtre glissante doit rendre le classement du calcul complet.
+@pytest.mark.parametrize("seed", range(3))
+def test_top_matches_baseline(make_store, seed):
+    store = make_store(users=80, sessions=1500, seed=seed, now=NOW)
+    lb = Leaderboards(k=50).build(store.database(), now=NOW)
+    store.subscribe(lb.on_event)
+    rng = random.Random(seed)
+    spots = [s.id for s in store.spots]
+    clock = NOW
+    for i in range(400):
+        users = [u.id for u in store.users]
+        k = rng.random()
+        if k < 0.05:
+            store.add_user(User(id=f"u{seed}-{i}", name=f"new{i}", password_hash="x", createdAt=clock.isoformat()))
+        elif k < 0.15:
+            user_id = rng.choice(users)
+            store.unlock(user_id, [f"a{i}"], rng.randrange(5, 100))
+        elif k < 0.2:
+            store.set_attributes(rng.choice(users), rng.sample(["chien", "guitare", "enfant"], rng.randrange(3)))
+        else:
+            # Débuts parfois anciens (fenêtres déjà glissées) ou à cheval sur une coupure
+            user_id = rng.choice(users)
+            start = clock - timedelta(hours=rng.choice([0, 1, 20, 24 * 6, 24 * 29, 24 * 40]), minutes=rng.randrange(60))
+            store.open_log(user_id, CheckInLog(spotId=rng.choice(spots), spotName="", timestamp=start.isoformat()))
+            store.close_log(user_id, store.open_session(user_id), rng.choice([0, rng.randrange(1, 300), rng.randrange(300, 20000)]))
+        clock += timedelta(minutes=rng.choice([1, 17, 90, 600]))
+        if i % 20: continue
+        db = Database.model_construct(users=store.users, spots=store.spots)
+        for period in ("forever",) + PERIODS:
+            found, expected = top(lb, db, period, "time", clock)
+            assert found == expected, (i, period)
+        found, expected = top(lb, db, "forever", "points", clock)
+        assert found == expected, i
+
+def test_rebuild_matches_incremental(make_store):
+    store = make_store(users=60, sessions=1200, seed=5, now=NOW)
+    db = store.database()
+    lb = Leaderboards().build(db, now=NOW - timedelta(days=3))
+    later = NOW + timedelta(days=2, hours=5)
+    for period in ("forever",) + PERIODS:
+        assert lb.top(period, now=later) == Leaderboards().build(db, now=later).top(period, now=later)
+        assert lb.top(period, now=later) == get_top_users(db, period, now=later)
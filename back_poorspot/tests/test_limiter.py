@@ -0,0 +1,53 @@
+import asyncio
+
+from limiter import RateLimitMiddleware, TokenBuckets
+from metrics import Metrics
+
+def test_bucket_refills_at_rate():
+    b = TokenBuckets(rate=2, burst=3)
+    assert [b.take("a", now=0) for _ in range(3)] == [0, 0, 0]
+    assert b.take("a", now=0) == 0.5
+    assert b.take("a", now=0.25) == 0.25   # Un demi-jeton de plus
+    assert b.take("a", now=0.5) == 0
+    assert b.take("b", now=0.5) == 0       # Seaux indépendants par client
+    assert b.take("a", now=100) == 0       # Plafonné à la rafale
+    assert [b.take("a", now=100) for _ in range(3)][-1] > 0
+    assert b.limited == 3
+
+def test_prune_keeps_active_clients():
+    b = TokenBuckets(rate=1, burst=2, max_clients=4)
+    for key in "abc": b.take(key, now=0)
+    b.take("d", now=0.5)
+    b.take("d", now=0.5)
+    b.take("e", now=1.5)                   # Plein : a, b, c remplis depuis, purgés
+    assert set(b.buckets) == {"d", "e"}
+    assert b.take("d", now=1.5) == 0 and b.take("d", now=1.5) > 0  # d garde son état
+
+async def app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+def call(mw, path="/spots", type="http", client=("1.2.3.4", 1)):
+    sent = []
+    async def send(message): sent.append(message)
+    asyncio.run(mw({"type": type, "path": path, "headers": [], "client": client}, None, send))
+    return sent[0]
+
+# Clients identifiés par key(), les autres par IP dans un seau plus large ;
+# /metrics et les flux ne sont jamais limités
+def test_middleware():
+    registry = Metrics()
+    users, ips = TokenBuckets(rate=1, burst=1), TokenBuckets(rate=1, burst=2)
+    key = lambda scope: dict(scope["headers"]).get(b"user")
+    mw = RateLimitMiddleware(app, users, key=key, ip_buckets=ips, registry=registry)
+    assert [call(mw)["status"] for _ in range(3)] == [200, 200, 429]
+    assert call(mw, client=("5.6.7.8", 1))["status"] == 200
+    for path in ("/metrics", "/occupations/stream"): assert call(mw, path)["status"] == 200
+    assert call(mw, type="websocket")["status"] == 200
+    limited = call(mw)
+    assert limited["status"] == 429 and (b"retry-after", b"1") in limited["headers"]
+    assert "http_rate_limited_total 2" in registry.render()
+
+def test_disabled_by_rate_zero():
+    mw = RateLimitMiddleware(app, TokenBuckets(rate=0, burst=1))
+    assert [call(mw)["status"] for _ in range(5)] == [200] * 5
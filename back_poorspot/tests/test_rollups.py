@@ -0,0 +1,91 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+import rollups as rollups_module
+from geo import geohash, geohash_bounds
+from models import CheckInLog, Spot
+from rollups import TILE_PRECISION, WEEK_HOURS, Rollups
+from sessions import SessionLog
+
+# Référence : chaque session parcourue heure par heure en datetime
+def naive(db):
+    spots = {s.id: s for s in db.spots}
+    table = {}
+    for u in db.users:
+        for h in u.history:
+            if not h.durationSeconds or h.durationSeconds <= 0: continue
+            r = table.setdefault(h.spotId, {"sessions": 0, "seconds": 0, "started": [0] * WEEK_HOURS, "occupied": [0.0] * WEEK_HOURS})
+            r["sessions"] += 1
+            r["seconds"] += h.durationSeconds
+            t = datetime.fromisoformat(h.timestamp)
+            r["started"][t.weekday() * 24 + t.hour] += 1
+            end = t + timedelta(seconds=h.durationSeconds)
+            while t < end:
+                nxt = min(end, t.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1))
+                r["occupied"][t.weekday() * 24 + t.hour] += (nxt - t).total_seconds()
+                t = nxt
+    groups = {}
+    for spot_id, r in table.items():
+        s = spots[spot_id]
+        for key in (s.category, (geohash(s.latitude, s.longitude, TILE_PRECISION), s.category)):
+            g = groups.setdefault(key, {"sessions": 0, "seconds": 0, "started": [0] * WEEK_HOURS, "occupied": [0.0] * WEEK_HOURS})
+            g["sessions"] += r["sessions"]
+            g["seconds"] += r["seconds"]
+            g["started"] = [a + b for a, b in zip(g["started"], r["started"])]
+            g["occupied"] = [a + b for a, b in zip(g["occupied"], r["occupied"])]
+    return table, groups
+
+def as_dict(r):
+    return {"sessions": r.sessions, "seconds": r.seconds, "started": list(r.started), "occupied": list(r.occupied)}
+
+def check(ro, db):
+    table, groups = naive(db)
+    assert {k: as_dict(r) for k, r in ro.spots.items() if r.sessions} == table
+    assert {k: as_dict(r) for k, r in ro.categories.items() if r.sessions} == {k: v for k, v in groups.items() if isinstance(k, str)}
+    assert {k: as_dict(r) for k, r in ro.tiles.items() if r.sessions} == {k: v for k, v in groups.items() if isinstance(k, tuple)}
+
+@pytest.mark.parametrize("vectorized", [True, False])
+def test_build_matches_naive(make_store, monkeypatch, vectorized):
+    if not vectorized: monkeypatch.setattr(rollups_module, "np", None)
+    elif rollups_module.np is None: pytest.skip("numpy absent")
+    db = make_store(sessions=2000, seed=3).database()
+    check(Rollups().build(db, SessionLog().build(db)), db)
+
+# Build puis close_log / add_spot au fil de l'eau (sessions sur plusieurs heures,
+# jours, semaines) : mêmes compteurs qu'un recalcul complet
+def test_events_match_naive(make_store):
+    store = make_store(sessions=300, seed=4)
+    ro = Rollups().build(store.database())
+    store.subscribe(ro.on_event)
+    rng = random.Random(4)
+    users = [u.id for u in store.users]
+    clock = datetime(2026, 2, 1, 6, 0)
+    for i in range(300):
+        if i % 50 == 0:
+            store.add_spot(Spot(id=f"new{i}", name="n", description="", latitude=50.85 + rng.random() / 50, longitude=4.35,
+                                category=rng.choice(["Tourisme", "Parc"]), createdAt=clock.isoformat(), createdBy=users[0],
+                                currentActiveUsers=0))
+        user_id = rng.choice(users)
+        clock += timedelta(seconds=rng.randrange(1, 20000))
+        store.open_log(user_id, CheckInLog(spotId=rng.choice(store.spots).id, spotName="", timestamp=clock.isoformat()))
+        duration = rng.choice([0, rng.randrange(1, 3600), rng.randrange(3600, 86400), rng.randrange(7 * 86400, 16 * 86400)])
+        store.close_log(user_id, store.open_session(user_id), duration)
+    db = store.database()
+    check(ro, db)
+    rebuilt = Rollups().build(db)
+    assert rebuilt.weeks == ro.weeks
+    assert rebuilt.heatmap(5) == ro.heatmap(5)
+    assert rebuilt.heatmap(6, ["Parc"], day=2) == ro.heatmap(6, ["Parc"], day=2)
+    assert rebuilt.category_busy_hours("Tourisme") == ro.category_busy_hours("Tourisme")
+
+def test_geohash_bounds_contain_point():
+    rng = random.Random(0)
+    for _ in range(200):
+        lat, lon = rng.uniform(-90, 90), rng.uniform(-180, 180)
+        code = geohash(lat, lon, 7)
+        lat0, lon0, lat1, lon1 = geohash_bounds(code)
+        assert lat0 <= lat <= lat1 and lon0 <= lon <= lon1
+        assert geohash(lat, lon, 5) == code[:5]
+    assert geohash(57.64911, 10.40744, 11) == "u4pruydqqvj"
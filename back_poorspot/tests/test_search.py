@@ -0,0 +1,93 @@
+import math
+import random
+
+import pytest
+
+from models import Review, Spot
+from search import FIELD_WEIGHTS, PREFIX_DISCOUNT, PREFIX_EXPANSION, REVIEW_WEIGHT, SearchIndex
+
+WORDS = ["Église", "eglise", "gare", "Midi", "marché", "Sablon", "parc", "royal", "bourse", "métro", "cœur", "place",
+         "grand", "mont", "arts", "nord", "porte", "Namur", "Louise", "chapelle", "station", "café", "théâtre", "gardien",
+         "garage", "margot", "de", "la", "du", "et", "a"]
+CATEGORIES = ["Tourisme", "Business", "Nightlife", "Transport"]
+
+def text(rng, lo, hi): return " ".join(rng.choice(WORDS) for _ in range(rng.randint(lo, hi)))
+
+def spot(rng, i):
+    reviews = [Review(id=f"r{i}-{j}", authorName="a", ratingRevenue=3, ratingSecurity=3, ratingTraffic=3, attribute="x",
+                      comment=text(rng, 0, 6), createdAt="2026-01-01T00:00:00") for j in range(rng.randrange(4))]
+    return Spot(id=f"s{i}", name=text(rng, 1, 3), description=text(rng, 0, 10), latitude=50.85, longitude=4.35,
+                category=rng.choice(CATEGORIES), createdAt="2026-01-01T00:00:00", createdBy="u", currentActiveUsers=0,
+                reviews=reviews)
+
+# Référence : chaque spot noté en entier depuis ses textes (mêmes poids, même tokenisation)
+def brute(spots, q, limit=20, categories=None, prefix=True):
+    tokens = SearchIndex().tokens
+    fields, reviews = [], []
+    for s in spots:
+        f = {}
+        for field, value in (("name", s.name), ("category", s.category), ("description", s.description)):
+            for t in tokens(value): f[t] = f.get(t, 0) + FIELD_WEIGHTS[field]
+        r = {}
+        for rv in s.reviews:
+            for t in tokens(rv.comment): r[t] = r.get(t, 0) + 1
+        fields.append(f)
+        reviews.append(r)
+    vocab = set().union(*fields, *reviews)
+    # Fréquence comme l'index : spots qui ont le terme dans leurs champs + dans leurs avis
+    df = {t: sum(t in f for f in fields) + sum(t in r for r in reviews) for t in vocab}
+    impact = lambda t, i: fields[i].get(t, 0) + REVIEW_WEIGHT * math.log1p(reviews[i].get(t, 0))
+    terms = tokens(q)
+    if not terms: return []
+    groups = []
+    for i, term in enumerate(terms):
+        group = [(term, 1.0)] if term in vocab else []
+        if prefix and i == len(terms) - 1:
+            completions = sorted((t for t in vocab if t.startswith(term)), key=lambda t: (-df[t], t))[:PREFIX_EXPANSION]
+            group += [(t, PREFIX_DISCOUNT) for t in completions if t != term]
+        if not group: return []
+        groups.append([(t, w * math.log(1 + len(spots) / df[t])) for t, w in group])
+    scored = []
+    for i, s in enumerate(spots):
+        if categories and s.category not in categories: continue
+        parts = [max(w * impact(t, i) for t, w in g) for g in groups]
+        if all(parts): scored.append((-sum(parts), i))
+    return [{"spotId": spots[i].id, "score": round(-neg, 4)} for neg, i in sorted(scored)[:limit]]
+
+def query(rng):
+    words = [rng.choice(WORDS + ["zzz", "ÉGLISE", "Gâre"]) for _ in range(rng.randint(1, 3))]
+    if rng.random() < 0.5: words[-1] = words[-1][:rng.randint(1, len(words[-1]))]
+    return " ".join(words)
+
+# Index construit sur une partie des spots puis complété par événements (avis,
+# nouveaux spots), requêtes entre deux : mêmes résultats qu'un parcours complet
+@pytest.mark.parametrize("seed", range(3))
+def test_search_matches_brute_force(seed):
+    rng = random.Random(seed)
+    spots = [spot(rng, i) for i in range(100)]
+    index = SearchIndex().build(spots)
+    for step in range(300):
+        if step % 3 == 0:
+            new = spot(rng, len(spots))
+            spots.append(new)
+            index.on_event("add_spot", new.model_dump())
+        elif step % 3 == 1:
+            s = rng.choice(spots[:-1])
+            rv = Review(id=f"e{step}", authorName="a", ratingRevenue=3, ratingSecurity=3, ratingTraffic=3, attribute="x",
+                        comment=text(rng, 1, 5), createdAt="2026-01-01T00:00:00")
+            s.reviews.append(rv)
+            index.on_event("add_review", {"spotId": s.id, "review": rv.model_dump()})
+        q, limit = query(rng), rng.choice([1, 5, 20])
+        categories = rng.choice([None, ["Tourisme"], ["Business", "Transport"]])
+        prefix = rng.random() < 0.8
+        found = [{"spotId": r["spotId"], "score": r["score"]} for r in index.search(q, limit, categories, prefix)]
+        assert found == brute(spots, q, limit, categories, prefix), q
+
+def test_folding_and_autocomplete():
+    s = Spot(id="s1", name="Église Sainte-Catherine", description="Cœur de la ville", latitude=50.85, longitude=4.35,
+             category="Culture", createdAt="2026-01-01T00:00:00", createdBy="u", currentActiveUsers=0)
+    index = SearchIndex().build([s])
+    assert [r["spotId"] for r in index.search("EGLISE coeur")] == ["s1"]
+    assert [r["spotId"] for r in index.search("eglise sainte-cath")] == ["s1"]
+    assert index.search("de la") == []
+    assert index.autocomplete("grande égl") == ["grande église"]
@@ -0,0 +1,41 @@
+import os
+import stat
+
+import storage
+from models import CheckInLog
+from sqlite_storage import SqliteStore, migrate_json_to_sqlite
+
+# Compaction : le snapshot puis la queue du journal sont synchronisés avant
+# leur rename, et le dossier après (sinon un journal acquitté peut se perdre)
+def test_compact_syncs_before_and_after_rename(make_store, monkeypatch):
+    store = make_store(sessions=50)
+    store.open()
+    user = store.users[0]
+    store.open_log(user.id, CheckInLog(spotId=store.spots[0].id, spotName="", timestamp="2026-03-01T10:00:00"))
+    calls = []
+    real_fsync, real_replace = os.fsync, os.replace
+    monkeypatch.setattr(storage.os, "fsync", lambda fd: (calls.append(("fsync", stat.S_ISDIR(os.fstat(fd).st_mode))), real_fsync(fd)))
+    monkeypatch.setattr(storage.os, "replace", lambda a, b: (calls.append(("replace", os.path.basename(b))), real_replace(a, b)))
+    store.compact()
+    store.close()
+    snapshot, wal = os.path.basename(store.path), os.path.basename(store.wal_path)
+    assert calls == [("fsync", False), ("replace", snapshot), ("fsync", True),
+                     ("fsync", False), ("replace", wal), ("fsync", True)]
+
+# Listes complètes SQLite (une requête par table) : mêmes modèles que le JSON
+# d'origine et que les lectures unitaires, historiques et avis dans l'ordre
+def test_sqlite_lists_match_json_and_single_reads(make_store, tmp_path):
+    source = make_store(users=30, spots=20, reviews=120, sessions=400)
+    migrate_json_to_sqlite(source.path, str(tmp_path / "db.sqlite3"))
+    store = SqliteStore(str(tmp_path / "db.sqlite3")).load()
+    queries = []
+    store.conn.set_trace_callback(queries.append)
+    users, spots = store.users, store.spots
+    store.conn.set_trace_callback(None)
+    assert len(queries) == 4  # users + logs, spots + reviews
+    assert [u.model_dump() for u in users] == [u.model_dump() for u in source.users]
+    assert [s.model_dump() for s in spots] == [s.model_dump() for s in source.spots]
+    assert all(store.get_user(u.id) == u and store.find_user_by_name(u.name) == u for u in users)
+    assert all(store.get_spot(s.id) == s for s in spots)
+    assert any(not u.history for u in users) and any(len(s.reviews) > 1 for s in spots)
+    store.close()
@@ -0,0 +1,102 @@
+import pytest
+
+from cluster import Cluster
+from gen_data import Generator, write_json
+from models import Review
+from sqlite_storage import SqliteStore, migrate_json_to_sqlite
+from sync import ChangeFeed, new_epoch
+
+def review(i):
+    return Review(id=f"s{i}", authorName="a", ratingRevenue=3, ratingSecurity=3, ratingTraffic=3, attribute="x",
+                  comment="", createdAt="2026-01-01T00:00:00")
+
+# Un worker comme main.py en multi-workers : store partagé, fil sur le seq du journal
+class Worker:
+    def __init__(self, path):
+        self.store = SqliteStore(path, shared=True).load()
+        self.store.grouped = True
+        self.feed = ChangeFeed()
+        self.feed.clock = lambda: self.store.last_seq
+        self.store.subscribe(self.feed.on_event)
+        self.cluster = Cluster(self.store, path + ".leader")
+        self.cluster.on("epoch", lambda d: self.feed.restart(d["epoch"], self.store.last_seq))
+        self.store.begin()
+        self.cluster.start()
+        self.feed.restart(self.store.setting("feed_epoch", new_epoch), self.store.last_seq)
+        self.store.flush()
+
+    def write(self, fn):
+        self.store.begin()
+        self.cluster.catch_up()
+        fn()
+        self.store.flush()
+
+    def rotate(self):
+        epoch = new_epoch()
+        self.write(lambda: (self.store.put_setting("feed_epoch", epoch), self.store.record("epoch", {"epoch": epoch})))
+        self.feed.restart(epoch, self.store.last_seq)
+
+    def delta(self, token):
+        version = self.feed.parse(token)
+        if version is None: return None
+        return [r["review"]["id"] for r in self.feed.spots_delta(version, self.store.get_spot)["reviews"]]
+
+@pytest.fixture
+def workers(tmp_path):
+    write_json(str(tmp_path / "db.json"), Generator(10, 5, 10, 20, days=10, seed=0), lambda done: None)
+    path = str(tmp_path / "db.sqlite3")
+    migrate_json_to_sqlite(str(tmp_path / "db.json"), path)
+    started = []
+    def start():
+        started.append(Worker(path))
+        return started[-1]
+    yield start
+    for w in started: w.store.close()
+
+# Une version servie par un worker vaut sur les autres : même ETag, même delta
+def test_versions_are_shared_between_workers(workers):
+    a, b = workers(), workers()
+    spot_id = a.store.spots[0].id
+    assert a.feed.token(a.feed.version) == b.feed.token(b.feed.version)
+    a.write(lambda: a.store.add_review(spot_id, review(1)))
+    seen = a.feed.token(a.feed.version)
+    a.write(lambda: a.store.record("note", {}))  # Changement hors fil : trou dans les seq
+    a.write(lambda: a.store.add_review(spot_id, review(2)))
+    b.cluster.catch_up()
+    assert b.feed.etag(b.feed.spots_version) == a.feed.etag(a.feed.spots_version)
+    assert a.delta(seen) == b.delta(seen) == ["s2"]
+    b.write(lambda: b.store.add_review(spot_id, review(3)))
+    a.cluster.catch_up()
+    assert a.delta(seen) == b.delta(seen) == ["s2", "s3"]
+    assert a.delta(b.feed.token(b.feed.version)) == []
+
+# Worker redémarré : pas de journal avant son démarrage, les versions plus
+# anciennes repartent d'une synchro complète, la version courante reste bonne
+def test_restarted_worker_serves_current_versions_only(workers):
+    a = workers()
+    spot_id = a.store.spots[0].id
+    old = a.feed.token(a.feed.version)
+    a.write(lambda: a.store.add_review(spot_id, review(1)))
+    c = workers()
+    assert c.delta(old) is None
+    assert c.delta(a.feed.token(a.feed.version)) == []
+    assert a.delta(old) == ["s1"]
+
+# Lot défait (reconstruction des index) : nouvel epoch pour tous les workers
+def test_epoch_rotation_reaches_other_workers(workers):
+    a, b = workers(), workers()
+    token = a.feed.token(a.feed.version)
+    a.rotate()
+    b.cluster.catch_up()
+    assert a.feed.epoch == b.feed.epoch != token.split("-")[0]
+    assert a.delta(token) is b.delta(token) is None
+    assert workers().feed.epoch == a.feed.epoch
+
+# Journal plein : la version évincée reste servie, les plus anciennes non (versions à trous)
+def test_floor_follows_evicted_entries():
+    feed = ChangeFeed(max_entries=2)
+    seqs = iter([3, 7, 8, 12])
+    feed.clock = lambda: next(seqs)
+    for i in range(4): feed.bump("spot", f"p{i}")
+    assert feed.parse(feed.token(6)) is None
+    assert [e[2] for e in feed.since(feed.parse(feed.token(7)), ("spot",))] == ["p2", "p3"]
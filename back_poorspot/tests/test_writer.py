@@ -0,0 +1,86 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from gen_data import Generator, write_json
+from models import Review
+from sqlite_storage import SqliteStore, migrate_json_to_sqlite
+from writer import Writer
+
+def review(i):
+    return Review(id=f"w{i}", authorName="a", ratingRevenue=3, ratingSecurity=3, ratingTraffic=3, attribute="x",
+                  comment="", createdAt="2026-01-01T00:00:00")
+
+# Index minimal : les avis vus, reconstruit depuis la base par le hook de l'écrivain
+class Reviews:
+    def __init__(self, store):
+        self.store = store
+        self.rebuilds = 0
+        self.build()
+
+    def build(self): self.ids = {r.id for s in self.store.spots for r in s.reviews}
+
+    def on_event(self, op, d):
+        if op == "add_review": self.ids.add(d["review"]["id"])
+
+    def rebuild(self):
+        self.rebuilds += 1
+        self.build()
+
+@pytest.fixture
+def sqlite_store(tmp_path):
+    write_json(str(tmp_path / "db.json"), Generator(10, 5, 10, 20, days=10, seed=0), lambda done: None)
+    migrate_json_to_sqlite(str(tmp_path / "db.json"), str(tmp_path / "db.sqlite3"))
+    store = SqliteStore(str(tmp_path / "db.sqlite3")).load()
+    index = Reviews(store)
+    store.subscribe(index.on_event)
+    yield store, index
+    store.close()
+
+def run(store, index, jobs):
+    async def main():
+        writer = Writer(store)
+        writer.rebuild = index.rebuild
+        writer.start()
+        results = await asyncio.gather(*(writer.submit(job) for job in jobs), return_exceptions=True)
+        await writer.stop()
+        return results
+    return asyncio.run(main())
+
+def stored(store): return {r.id for s in store.spots for r in s.reviews}
+
+# Job en échec après une première mutation : défait seul, le reste du lot validé
+def test_failed_job_is_rolled_back(sqlite_store):
+    store, index = sqlite_store
+    spot_id = store.spots[0].id
+    def half():
+        store.add_review(spot_id, review(2))
+        raise ValueError("après la première mutation")
+    results = run(store, index, [lambda: store.add_review(spot_id, review(1)), half, lambda: store.add_review(spot_id, review(3))])
+    assert isinstance(results[1], ValueError) and results[0] is None and results[2] is None
+    assert {"w1", "w3"} <= stored(store) and "w2" not in stored(store)
+    assert index.rebuilds == 1 and index.ids == stored(store)
+
+def test_failed_job_without_mutation_keeps_indexes(sqlite_store):
+    store, index = sqlite_store
+    def refuse(): raise ValueError("validation")
+    assert isinstance(run(store, index, [refuse])[0], ValueError)
+    assert index.rebuilds == 0
+
+class FailingCommit:
+    def __init__(self, conn): self.conn = conn
+    def __getattr__(self, name): return getattr(self.conn, name)
+    def commit(self): raise sqlite3.OperationalError("disk I/O error")
+
+# Commit du lot raté : tout le lot est défait et les index reconstruits
+def test_failed_flush_rolls_back_batch(sqlite_store):
+    store, index = sqlite_store
+    spot_id = store.spots[0].id
+    conn = store.conn
+    store.conn = FailingCommit(conn)
+    results = run(store, index, [lambda: store.add_review(spot_id, review(4))])
+    store.conn = conn
+    assert isinstance(results[0], sqlite3.OperationalError)
+    assert "w4" not in stored(store)
+    assert index.rebuilds == 1 and index.ids == stored(store)
@@ -0,0 +1,107 @@
+import asyncio
+import inspect
+import logging
+from typing import Optional
+
+from metrics import span
+
+MAX_BATCH = 256
+
+log = logging.getLogger("poorspot.writer")
+
+# --- ÉCRIVAIN UNIQUE (GROUP COMMIT) ---
+# Toutes les mutations passent par une file et sont appliquées une à une, dans
+# l'ordre d'arrivée, par une seule tâche asyncio : plus de lecture-modification-
+# écriture concurrente. Les lectures se servent directement de l'état en mémoire
+# sur la boucle, sans attendre l'écrivain.
+# Pendant le flush d'un lot (dans un thread), les requêtes suivantes s'accumulent
+# et forment le lot suivant : un seul fsync pour tout le lot, et chaque requête
+# n'est acquittée qu'une fois son lot durable.
+# Base partagée entre workers : chaque lot commence par store.begin() (verrou
+# inter-processus, attendu dans un thread) puis catch_up() rejoue ce que les
+# autres workers ont validé entre-temps : les mutations du lot voient l'état à jour.
+# Chaque job est atomique en base (point de sauvegarde, SQLite) : une exception
+# défait ses mutations, un commit raté défait tout le lot. Les index en mémoire
+# ont déjà vu ces mutations (un job relit ce qu'il vient d'écrire, ex. succès
+# après close_log) : ils sont alors reconstruits depuis la base (rebuild).
+
+async def settle(result): return await result if inspect.isawaitable(result) else result
+
+class Writer:
+    def __init__(self, store, max_batch: int = MAX_BATCH):
+        self.store = store
+        self.max_batch = max_batch
+        self.queue: Optional[asyncio.Queue] = None
+        self.task: Optional[asyncio.Task] = None
+        self.catch_up = None  # Rattrapage des autres workers (cluster.py)
+        self.rebuild = None   # Reconstruction des index après une annulation (main.py)
+        self.batches = 0
+        self.jobs = 0
+
+    def start(self):
+        self.queue = asyncio.Queue()
+        self.store.grouped = True
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        # Les mutations déjà en file sont appliquées avant l'arrêt
+        if not self.task: return
+        self.queue.put_nowait(None)
+        await self.task
+        self.task = None
+        self.store.grouped = False
+        self.store.flush()
+
+    # fn lit l'état, valide (HTTPException...) puis mute. Synchrone, ou coroutine
+    # quand elle attend une E/S bloquante dans un thread (occupations) : l'écrivain
+    # l'attend avant le job suivant, l'ordre des mutations est le même
+    async def submit(self, fn):
+        if not self.task: return await settle(fn())  # Hors serveur (scripts) : application directe
+        fut = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((fn, fut))
+        return await fut
+
+    async def run(self):
+        stopping = False
+        while not stopping:
+            jobs = [await self.queue.get()]
+            while len(jobs) < self.max_batch and not self.queue.empty(): jobs.append(self.queue.get_nowait())
+            if None in jobs:
+                stopping = True
+                jobs = [j for j in jobs if j is not None]
+            done = []
+            stale = False  # Index en avance sur la base (mutations annulées)
+            batch = self.store.mutations
+            try:
+                if self.store.shared and jobs:
+                    await asyncio.to_thread(self.store.begin)
+                    if self.catch_up: self.catch_up()
+            except Exception as e: done = [(fut, None, e) for _, fut in jobs]
+            else:
+                batch = self.store.mutations  # Après les rejeux des autres workers
+                with span("writer.apply"):
+                    for fn, fut in jobs:
+                        before = self.store.mutations
+                        self.store.begin_job()
+                        try: result = await settle(fn())
+                        except Exception as e:
+                            self.store.end_job(False)
+                            stale = stale or self.store.mutations != before
+                            done.append((fut, None, e))
+                        else:
+                            self.store.end_job(True)
+                            done.append((fut, result, None))
+            try: await asyncio.to_thread(self.store.flush)
+            except Exception as e:
+                stale = stale or (bool(done) and self.store.mutations != batch)
+                done = [(fut, None, e) for fut, _, _ in done]
+            if stale and self.store.transactional and self.rebuild:
+                try:
+                    with span("writer.rebuild"): await settle(self.rebuild())
+                except Exception as e: log.error("Reconstruction des index impossible : %r", e)
+            self.batches += 1
+            self.jobs += len(done)
+            for fut, result, error in done:
+                if fut.done(): continue  # Client parti : la mutation reste appliquée
+                if error: fut.set_exception(error)
+                else: fut.set_result(result)
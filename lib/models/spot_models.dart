@@ -22,6 +22,7 @@ class Spot {
   final DateTime createdAt;
   final String createdBy;
   int currentActiveUsers; 
+  final RatingStats? ratings; // Moyennes pré-calculées par le serveur
 
   Spot({
     required this.id,
@@ -33,6 +34,7 @@ class Spot {
     required this.createdAt,
     required this.createdBy,
     this.currentActiveUsers = 0,
+    this.ratings,
   });
 
   // --- JSON SERIALIZATION ---
@@ -68,14 +70,18 @@ class Spot {
       reviews: List<Review>.from(
         (json['reviews'] as List<dynamic>? ?? []).map((x) => Review.fromJson(x)),
       ),
+      ratings: json['ratings'] != null ? RatingStats.fromJson(json['ratings']) : null,
     );
   }
 
   // --- CALCULS MÉTIER ---
 
-  double get avgRevenue => _calcAvg((r) => r.ratingRevenue);
-  double get avgSecurity => _calcAvg((r) => r.ratingSecurity);
-  double get avgTraffic => _calcAvg((r) => r.ratingTraffic);
+  // Agrégats serveur tant qu'aucun avis n'a été ajouté localement depuis le chargement
+  bool get _hasFreshRatings => ratings != null && ratings!.count == reviews.length;
+
+  double get avgRevenue => _hasFreshRatings ? ratings!.avgRevenue : _calcAvg((r) => r.ratingRevenue);
+  double get avgSecurity => _hasFreshRatings ? ratings!.avgSecurity : _calcAvg((r) => r.ratingSecurity);
+  double get avgTraffic => _hasFreshRatings ? ratings!.avgTraffic : _calcAvg((r) => r.ratingTraffic);
 
   double get globalRating {
     if (reviews.isEmpty) return 0.0;
@@ -128,6 +134,29 @@ class Spot {
   }
 }
 
+class RatingStats {
+  final int count;
+  final double avgRevenue;
+  final double avgSecurity;
+  final double avgTraffic;
+
+  RatingStats({
+    required this.count,
+    required this.avgRevenue,
+    required this.avgSecurity,
+    required this.avgTraffic,
+  });
+
+  factory RatingStats.fromJson(Map<String, dynamic> json) {
+    return RatingStats(
+      count: json['count'] ?? 0,
+      avgRevenue: (json['avgRevenue'] as num? ?? 0).toDouble(),
+      avgSecurity: (json['avgSecurity'] as num? ?? 0).toDouble(),
+      avgTraffic: (json['avgTraffic'] as num? ?? 0).toDouble(),
+    );
+  }
+}
+
 class Review {
   final String id;
   final String authorName;